@@ -0,0 +1,62 @@
+import argparse
+import time
+
+from src.BatchProcessor import find_inputs, run_batch, output_formats
+
+# processes recordings without opening a window
+# python batch_process.py data --output-dir data/processed
+# python batch_process.py "captures/**/*.bin" --recursive --format columnar --fusion mahony
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("inputs", nargs='+', help="directories, files or globs of csv or binary recordings")
+    parser.add_argument("--output-dir", default="data/processed")
+    parser.add_argument("--format", default="binary", choices=list(output_formats), help="binary (N,25) rows or an npz with one array per column")
+    parser.add_argument("--recursive", action='store_true', help="search directories and ** globs recursively")
+    parser.add_argument("--workers", default=None, type=int, help="process pool size, 1 runs in this process")
+    parser.add_argument("--force", action='store_true', help="reprocess files even if their outputs are up to date")
+    parser.add_argument("--alpha", default=0.96, type=float)
+    parser.add_argument("--accel-cutoff", default=20, type=float)
+    parser.add_argument("--gyro-cutoff", default=100, type=float)
+    parser.add_argument("--calibration-samples", default=200, type=int)
+    parser.add_argument("--fusion", default=None, choices=["madgwick", "mahony"], help="quaternion filter instead of the complementary filter")
+    parser.add_argument("--reconstruct-time", action='store_true', help="smooth the 1 ms tick timestamps with a fitted sample clock")
+    parser.add_argument("--resample-rate", default=None, type=float, help="Hz, interpolate calibrated readings onto a fixed rate")
+
+    args = parser.parse_args()
+
+    inputs = find_inputs(args.inputs, recursive=args.recursive)
+    if len(inputs) == 0:
+        print("No recordings found")
+        return
+
+    config = {
+        "alpha": args.alpha,
+        "accel_cutoff": args.accel_cutoff,
+        "gyro_cutoff": args.gyro_cutoff,
+        "calibration_samples": args.calibration_samples,
+    }
+    if args.fusion is not None:
+        config["fusion"] = args.fusion
+    if args.reconstruct_time:
+        config["reconstruct_time"] = True
+    if args.resample_rate is not None:
+        config["resample_rate"] = args.resample_rate
+
+    print(f"Processing {len(inputs)} recordings into {args.output_dir}")
+    start = time.perf_counter()
+    results = run_batch(inputs, args.output_dir, config, args.format, args.workers, args.force)
+    elapsed = time.perf_counter() - start
+
+    for result in results:
+        if result["status"] == "failed":
+            print(f"failed {result['input']}: {result['error']}")
+        elif result["status"] == "skipped":
+            print(f"skipped {result['input']}, {result['output']} is up to date")
+        else:
+            print(f"processed {result['input']} -> {result['output']} ({result['rows']} rows)")
+
+    totals = {status: sum(result["status"] == status for result in results) for status in ("processed", "skipped", "failed")}
+    print(" ".join(f"{status}={total}" for status, total in totals.items()) + f" in {elapsed:.2f}s")
+
+if __name__ == '__main__':
+    main()
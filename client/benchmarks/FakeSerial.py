@@ -0,0 +1,119 @@
+import time
+import numpy as np
+
+from src.PacketFramer import packet_dtypes, stm32_crc32_block
+
+# load a recording saved by save_data.py as (time, accel, gyro) rows
+def load_recording(filename):
+    return np.loadtxt(filename, skiprows=1, ndmin=2)
+
+# encode (N,7) sensor rows into the big endian stream sent by TransmitPacket
+# garbage bytes are inserted before a fraction of the packets
+# version 1 is the original packet without a sequence counter or crc
+# returns the stream and the offset of the end of each packet
+def encode_packets(sensor_data, garbage_rate=0.0, max_garbage=8, seed=0, version=2):
+    total = len(sensor_data)
+    packet_dtype = packet_dtypes[version]
+    packets = np.zeros(total, dtype=packet_dtype)
+    packets["header"] = 0xba41
+    packets["time"] = sensor_data[:,0].astype(np.int64) & 0xFFFFFFFF
+    packets["accel"] = sensor_data[:,1:4]
+    packets["gyro"] = sensor_data[:,4:7]
+
+    if version > 1:
+        packets["version"] = version
+        packets["sequence"] = np.arange(total, dtype=np.uint32)
+        size = packet_dtype.itemsize
+        packets["crc"] = stm32_crc32_block(packets.tobytes(), size, size-4)
+
+    packet_size = packet_dtype.itemsize
+    rng = np.random.default_rng(seed)
+    garbage_sizes = np.where(
+        rng.random(total) < garbage_rate,
+        rng.integers(1, max_garbage+1, total), 0)
+
+    # garbage never contains the first header byte so the packet count is exact
+    garbage = rng.integers(0, 0xba, garbage_sizes.sum(), dtype=np.uint8).tobytes()
+    packet_bytes = packets.tobytes()
+
+    chunks = []
+    offset = 0
+    for i, size in enumerate(garbage_sizes):
+        if size > 0:
+            chunks.append(garbage[offset:offset+size])
+            offset += size
+        chunks.append(packet_bytes[i*packet_size:(i+1)*packet_size])
+
+    packet_ends = np.cumsum(garbage_sizes + packet_size)
+    return b"".join(chunks), packet_ends
+
+# stands in for serial.Serial, replaying a byte stream through read_all
+# with rate=None reads return random sized chunks as fast as they are asked for
+# otherwise bytes become available at rate bytes per second like a real port
+class FakeSerial:
+    def __init__(self, stream, rate=None, min_read=1, max_read=512, seed=0):
+        self.stream = stream
+        self.rate = rate
+        self.min_read = min_read
+        self.max_read = max_read
+        self.rng = np.random.default_rng(seed)
+
+        self.position = 0
+        self.start_time = None
+        self.is_open = True
+        self.timeout = None
+
+        # (stream offset after read, perf_counter) for each non empty read
+        self.read_offsets = []
+        self.read_times = []
+
+    def isOpen(self):
+        return self.is_open and self.position < len(self.stream)
+
+    def close(self):
+        self.is_open = False
+
+    def get_available(self, now):
+        if self.start_time is None:
+            self.start_time = now
+
+        remaining = len(self.stream) - self.position
+        if self.rate is None:
+            return min(remaining, int(self.rng.integers(self.min_read, self.max_read+1)))
+
+        return max(0, min(remaining, int((now - self.start_time) * self.rate) - self.position))
+
+    def take(self, size, now):
+        data = self.stream[self.position:self.position+size]
+        self.position += size
+
+        if size > 0:
+            self.read_offsets.append(self.position)
+            self.read_times.append(now)
+        return data
+
+    def read_all(self):
+        now = time.perf_counter()
+        return self.take(self.get_available(now), now)
+
+    @property
+    def in_waiting(self):
+        return self.get_available(time.perf_counter())
+
+    # like serial.Serial.read, waits up to timeout for the first byte
+    def read(self, size=1):
+        now = time.perf_counter()
+        available = self.get_available(now)
+
+        if available == 0 and self.rate is not None and self.timeout:
+            time.sleep(min(self.timeout, 1/self.rate))
+            now = time.perf_counter()
+            available = self.get_available(now)
+
+        return self.take(min(size, available), now)
+
+    # time each packet became readable given the offsets of the end of each packet
+    def get_arrival_times(self, packet_ends):
+        index = np.searchsorted(self.read_offsets, packet_ends, side='left')
+        index = np.minimum(index, len(self.read_times)-1)
+        return np.array(self.read_times)[index]
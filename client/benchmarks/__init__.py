@@ -0,0 +1 @@
+from .FakeSerial import FakeSerial, encode_packets, load_recording
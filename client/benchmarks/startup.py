@@ -0,0 +1,191 @@
+import argparse
+import json
+import platform
+import statistics
+import subprocess
+import sys
+import time
+
+from .throughput import get_commit
+
+# run from the client folder
+# python -m benchmarks.startup --output startup.json
+# each entry point is imported in a fresh interpreter, then the pipeline it runs is fed
+# until the first imu output, serial ports are replaced by FakeSerial
+#   serial: per sample Reader
+#   serial-block: block mode Reader as in live_preview.py, save_data.py and publish_data.py
+#   file: whole recording as one block as in view_data.py
+entry_points = {
+    "live_preview": "serial-block",
+    "save_data": "serial-block",
+    "publish_data": "serial-block",
+    "view_data": "file",
+    "batch_process": "file",
+    "sweep": "file",
+    "convert_data": "file",
+}
+
+gui_modules = ("matplotlib", "pyqtgraph", "PyQt5", "PyQt6", "PySide2", "PySide6")
+
+# the entry point is imported before anything else so its import time is not hidden
+# by modules the benchmark itself needs
+child_template = """
+import time
+start = time.time()
+try:
+    import {module}
+    error = None
+except ImportError as ex:
+    error = str(ex)
+imported = time.time()
+from benchmarks.startup import run_child
+run_child({mode!r}, start, imported, error, {options!r})
+"""
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--entry-points", default=list(entry_points), nargs='+', choices=list(entry_points))
+    parser.add_argument("--input", default="data/data_0.csv")
+    parser.add_argument("--output", default="startup.json")
+    parser.add_argument("--repeat", default=5, type=int, help="fresh interpreters per entry point")
+    parser.add_argument("--baudrate", default=None, type=int, help="pace the fake port, unpaced if not set")
+    parser.add_argument("--packet-version", default=2, type=int, choices=[1, 2])
+    parser.add_argument("--calibration-samples", default=200, type=int)
+
+    args = parser.parse_args()
+
+    options = {
+        "input": args.input,
+        "baudrate": args.baudrate,
+        "packet_version": args.packet_version,
+        "calibration_samples": args.calibration_samples,
+    }
+
+    results = {
+        "commit": get_commit(),
+        "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "args": vars(args),
+        "interpreter_seconds": summarise([run_interpreter() for _ in range(args.repeat)]),
+        "entry_points": {},
+    }
+    print(f"python startup {1000*results['interpreter_seconds']['min']:.1f} ms")
+
+    for name in args.entry_points:
+        runs = [run_entry_point(name, entry_points[name], options) for _ in range(args.repeat)]
+        result = {
+            "mode": entry_points[name],
+            "error": runs[0]["error"],
+            "modules": runs[0]["modules"],
+            "gui_modules": runs[0]["gui_modules"],
+            "import_seconds": summarise([run["import_seconds"] for run in runs]),
+        }
+        if runs[0]["error"] is None:
+            result["first_sample_seconds"] = summarise([run["first_sample_seconds"] for run in runs])
+
+        results["entry_points"][name] = result
+        print_result(name, result)
+
+    with open(args.output, "w+") as fp:
+        json.dump(results, fp, indent=4)
+    print(f"Saved results to {args.output}")
+
+def summarise(values):
+    return {"min": min(values), "median": statistics.median(values), "max": max(values)}
+
+def run_interpreter():
+    launched = time.time()
+    subprocess.run([sys.executable, "-c", "pass"], check=True)
+    return time.time() - launched
+
+# times are from launching the interpreter
+def run_entry_point(name, mode, options):
+    code = child_template.format(module=name, mode=mode, options=options)
+    launched = time.time()
+    output = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True)
+    result = json.loads(output.stdout.strip().splitlines()[-1])
+
+    result["import_seconds"] = result.pop("imported") - launched
+    if result["first_sample"] is not None:
+        result["first_sample_seconds"] = result.pop("first_sample") - launched
+    return result
+
+# runs in the child after importing the entry point, prints the result as a json line
+def run_child(mode, start, imported, error, options):
+    modules = len(sys.modules)
+    loaded_gui_modules = [name for name in gui_modules if name in sys.modules]
+
+    first_sample = None
+    if error is None:
+        if mode == "file":
+            first_sample = run_file(options)
+        else:
+            first_sample = run_serial(options, block_mode=(mode == "serial-block"))
+
+    print(json.dumps({
+        "start": start,
+        "imported": imported,
+        "first_sample": first_sample,
+        "error": error,
+        "modules": modules,
+        "gui_modules": loaded_gui_modules,
+    }))
+
+def run_file(options):
+    from src.Calibrator import Calibrator
+    from src.IMU import IMU
+    from src.Recording import load_sensor_data
+
+    sensor_data = load_sensor_data(options["input"])
+    calibrator = Calibrator(options["calibration_samples"])
+    imu = IMU()
+    times, accel, gyro = calibrator.filter_block(sensor_data[:,0], sensor_data[:,1:4], sensor_data[:,4:7])
+    imu.update_block(times, accel, gyro)
+    return time.time()
+
+def run_serial(options, block_mode):
+    from src.Calibrator import Calibrator
+    from src.IMU import IMU
+    from src.Reader import Reader
+    from src.Recording import load_sensor_data
+    from .FakeSerial import FakeSerial, encode_packets
+
+    sensor_data = load_sensor_data(options["input"])
+    stream, _ = encode_packets(sensor_data, version=options["packet_version"])
+    rate = None if options["baudrate"] is None else options["baudrate"] / 10
+
+    reader = Reader(FakeSerial(stream, rate=rate), block_mode=block_mode, version=options["packet_version"])
+    calibrator = Calibrator(options["calibration_samples"])
+    imu = IMU()
+
+    first_sample = None
+    reader.start()
+    try:
+        if block_mode:
+            for block in reader.get_readings():
+                times, accel, gyro = calibrator.filter_block(block["time"], block["accel"], block["gyro"])
+                if len(imu.update_block(times, accel, gyro)) > 0:
+                    first_sample = time.time()
+                    break
+        else:
+            for data in calibrator.filter_data(reader.get_readings()):
+                imu.update(data)
+                if next(imu.read_data(), None) is not None:
+                    first_sample = time.time()
+                    break
+    finally:
+        reader.stop()
+    return first_sample
+
+def print_result(name, result):
+    if result["error"] is not None:
+        print(f"{name}: import failed, {result['error']}")
+        return
+
+    gui = ", ".join(result["gui_modules"]) or "none"
+    print(f"{name}: import {1000*result['import_seconds']['min']:.1f} ms, "
+          f"first sample {1000*result['first_sample_seconds']['min']:.1f} ms, "
+          f"{result['modules']} modules, gui modules {gui}")
+
+if __name__ == '__main__':
+    main()
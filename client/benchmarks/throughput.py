@@ -0,0 +1,230 @@
+import argparse
+import json
+import platform
+import subprocess
+import time
+import tracemalloc
+import numpy as np
+
+from src.Calibrator import Calibrator
+from src.DataBuffer import DataBuffer
+from src.IMU import IMU
+from src.PacketFramer import PacketFramer
+from src.Reader import Reader
+from src.Vector3D import Vector3D
+
+from .FakeSerial import FakeSerial, encode_packets, load_recording
+
+# run from the client folder
+# python -m benchmarks.throughput --input data/data_1.csv --output benchmark.json
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--input", default=["data/data_0.csv", "data/data_1.csv"], nargs='+')
+    parser.add_argument("--output", default="benchmark.json")
+    parser.add_argument("--garbage-rate", default=0.01, type=float, help="fraction of packets preceded by garbage bytes")
+    parser.add_argument("--max-read", default=512, type=int, help="largest chunk returned by read_all")
+    parser.add_argument("--baudrate", default=None, type=int, help="pace the fake port, unpaced if not set")
+    parser.add_argument("--blocking-reads", action='store_true', help="read with in_waiting/read instead of read_all")
+    parser.add_argument("--packet-version", default=2, type=int, choices=[1, 2])
+    parser.add_argument("--calibration-samples", default=200, type=int)
+    parser.add_argument("--preview-window", default=5.0, type=float)
+
+    args = parser.parse_args()
+
+    results = {
+        "commit": get_commit(),
+        "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "args": vars(args),
+        "recordings": {},
+    }
+
+    for filename in args.input:
+        sensor_data = load_recording(filename)
+        stream, packet_ends = encode_packets(sensor_data, garbage_rate=args.garbage_rate, version=args.packet_version)
+
+        result = {
+            "samples": len(sensor_data),
+            "bytes": len(stream),
+            "stages": run_stages(stream, args),
+            "blocks": run_blocks(stream, args),
+            "pipeline": run_pipeline(stream, packet_ends, args),
+            "peak_memory_bytes": measure_peak_memory(stream, args),
+        }
+        results["recordings"][filename] = result
+        print_result(filename, result)
+
+    with open(args.output, "w+") as fp:
+        json.dump(results, fp, indent=4)
+    print(f"Saved results to {args.output}")
+
+def get_commit():
+    try:
+        output = subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True)
+        return output.stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def split_stream(stream, max_read, seed=0):
+    rng = np.random.default_rng(seed)
+    chunks = []
+    i = 0
+    while i < len(stream):
+        size = int(rng.integers(1, max_read+1))
+        chunks.append(stream[i:i+size])
+        i += size
+    return chunks
+
+def timed(timings, name, start):
+    timings[name] = timings.get(name, 0.0) + (time.perf_counter() - start)
+
+def summarise(timings, total):
+    return {
+        name: {"seconds": seconds, "us_per_sample": 1e6*seconds/max(total, 1)}
+        for name, seconds in timings.items()
+    }
+
+# time each per sample stage on its own, single threaded
+def run_stages(stream, args):
+    chunks = split_stream(stream, args.max_read)
+    timings = {}
+
+    start = time.perf_counter()
+    framer = PacketFramer(version=args.packet_version)
+    readings = []
+    for chunk in chunks:
+        framer.feed(chunk)
+        readings.extend(framer.read_packets())
+    timed(timings, "decode", start)
+
+    # Reader builds the vectors as part of decoding
+    start = time.perf_counter()
+    readings = [(r[0], Vector3D(*r[1:4]), Vector3D(*r[4:7])) for r in readings]
+    timed(timings, "decode", start)
+
+    start = time.perf_counter()
+    calibrator = Calibrator(args.calibration_samples)
+    calibrated = list(calibrator.filter_data(readings))
+    timed(timings, "calibrate", start)
+
+    start = time.perf_counter()
+    imu = IMU()
+    outputs = []
+    for data in calibrated:
+        imu.update(data)
+        outputs.extend(imu.read_data())
+    timed(timings, "imu", start)
+
+    start = time.perf_counter()
+    buffer = DataBuffer(time_window=args.preview_window)
+    for data in outputs:
+        buffer.append(data)
+    timed(timings, "buffer", start)
+
+    return {
+        "packets": len(readings),
+        "skipped_bytes": framer.skipped_bytes,
+        "stages": summarise(timings, len(readings)),
+        "packets_per_second": len(readings) / sum(timings.values()),
+    }
+
+# same stages using the block paths
+def run_blocks(stream, args):
+    chunks = split_stream(stream, args.max_read)
+    timings = {}
+    total = 0
+
+    framer = PacketFramer(version=args.packet_version)
+    calibrator = Calibrator(args.calibration_samples)
+    imu = IMU()
+    buffer = DataBuffer(time_window=args.preview_window)
+
+    for chunk in chunks:
+        start = time.perf_counter()
+        framer.feed(chunk)
+        block = framer.read_block()
+        timed(timings, "decode", start)
+        total += len(block)
+
+        start = time.perf_counter()
+        times, accel, gyro = calibrator.filter_block(block["time"], block["accel"], block["gyro"])
+        timed(timings, "calibrate", start)
+
+        start = time.perf_counter()
+        outputs = imu.update_block(times, accel, gyro)
+        timed(timings, "imu", start)
+
+        start = time.perf_counter()
+        buffer.append_block(outputs)
+        timed(timings, "buffer", start)
+
+    return {
+        "packets": total,
+        "stages": summarise(timings, total),
+        "packets_per_second": total / sum(timings.values()),
+    }
+
+# Reader thread on a fake port feeding the consumer, as in live_preview.py
+def run_pipeline(stream, packet_ends, args):
+    rate = None if args.baudrate is None else args.baudrate / 10
+    com = FakeSerial(stream, rate=rate, max_read=args.max_read)
+    reader = Reader(com, blocking_reads=args.blocking_reads, version=args.packet_version)
+
+    calibrator = Calibrator(args.calibration_samples)
+    imu = IMU()
+    buffer = DataBuffer(time_window=args.preview_window)
+    output_times = []
+
+    start = time.perf_counter()
+    reader.start()
+    try:
+        for data in calibrator.filter_data(reader.get_readings()):
+            imu.update(data)
+            for imu_data in imu.read_data():
+                buffer.append(imu_data)
+                output_times.append(time.perf_counter())
+    finally:
+        reader.stop()
+    elapsed = time.perf_counter() - start
+
+    result = reader.get_stats()
+    result["seconds"] = elapsed
+    result["packets_per_second"] = result["packets"] / elapsed
+
+    # calibration consumes the first samples so outputs line up with later packets
+    arrival_times = com.get_arrival_times(packet_ends)
+    arrival_times = arrival_times[calibrator.completed_samples:][:len(output_times)]
+    if len(output_times) > 0:
+        latency = (np.array(output_times[:len(arrival_times)]) - arrival_times) * 1000
+        result["latency_ms"] = {
+            f"p{p}": float(np.percentile(latency, p)) for p in (50, 90, 99, 100)
+        }
+
+    return result
+
+def measure_peak_memory(stream, args):
+    tracemalloc.start()
+    try:
+        run_stages(stream, args)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return peak
+
+def print_result(filename, result):
+    print(f"{filename}: {result['samples']} samples, {result['bytes']} bytes")
+    for mode in ("stages", "blocks"):
+        mode_result = result[mode]
+        print(f"  {mode}: {mode_result['packets_per_second']:.0f} packets/s")
+        for name, timing in mode_result["stages"].items():
+            print(f"    {name:<10} {timing['us_per_sample']:8.2f} us/sample")
+
+    pipeline = result["pipeline"]
+    print(f"  pipeline: {pipeline['packets_per_second']:.0f} packets/s")
+    for name, value in pipeline.get("latency_ms", {}).items():
+        print(f"    latency {name:<4} {value:8.2f} ms")
+    print(f"  peak memory: {result['peak_memory_bytes']/1e6:.1f} MB")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,31 @@
+import argparse
+
+from src.Recording import RecordingHeader, is_recording, load_sensor_data, read_recording, write_recording
+from src.Recording import records_to_rows, rows_to_records, save_csv
+
+# converts between csv files from older versions of save_data.py and binary recordings
+# python convert_data.py data/data_0.csv data/data_0.bin
+# python convert_data.py data/data_0.bin data/data_0.csv
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("input")
+    parser.add_argument("output")
+    parser.add_argument("--sample-rate", default=500.0, type=float, help="nominal sample rate stored in the header (Hz)")
+    parser.add_argument("--accel-range", default=16.0, type=float, help="accelerometer full scale stored in the header (g)")
+    parser.add_argument("--gyro-range", default=2000.0, type=float, help="gyroscope full scale stored in the header (deg/s)")
+
+    args = parser.parse_args()
+
+    if is_recording(args.input):
+        header, records = read_recording(args.input)
+        save_csv(args.output, records_to_rows(records))
+        print(f"Exported {len(records)} readings to {args.output}")
+        return
+
+    rows = load_sensor_data(args.input)
+    header = RecordingHeader(args.sample_rate, args.accel_range, args.gyro_range)
+    write_recording(args.output, rows_to_records(rows), header)
+    print(f"Imported {len(rows)} readings to {args.output}")
+
+if __name__ == '__main__':
+    main()
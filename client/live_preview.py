@@ -1,36 +1,141 @@
 import serial
 import threading
 import argparse
+import asyncio
+import functools
+import time
 
-from src import Reader, QtVisualiser, Calibrator, IMU, DataBuffer
+from src.Reader import Reader
+from src.AsyncReader import AsyncReader
+from src.AsyncPipeline import AsyncPipeline, buffer_sink, analyser_sink
+from src.MultiDeviceReader import MultiDeviceReader
+from src.ProcessPipeline import ProcessPipeline
+from src.QtVisualiser import QtVisualiser
+from src.Calibrator import Calibrator
+from src.IMU import IMU
+from src.DataBuffer import DataBuffer
+from src.Fusion import make_fusion
+from src.Metrics import enable_metrics
+from src.Telemetry import TelemetrySubscriber
+from src.SpectrumAnalyser import SpectrumAnalyser
+from src.SampleClock import SampleClock
+from src.Resampler import Resampler
 
 def main():
     parser = argparse.ArgumentParser()
-    parser.add_argument("--port", default="COM11")
+    parser.add_argument("--port", default=["COM11"], nargs='+', help="several ports read every device concurrently")
     parser.add_argument("--baudrate", default=1000000, type=int)
+    parser.add_argument("--source", default=None, help="view a publish_data.py stream, e.g. tcp://127.0.0.1:5760, instead of the serial port")
     parser.add_argument("--preview-window", default=5.0, type=float)
     parser.add_argument("--calibration-samples", default=500, type=int)
+    parser.add_argument("--fusion", default=None, choices=["madgwick", "mahony"], help="quaternion filter instead of the complementary filter")
+    parser.add_argument("--track-gyro-bias", action='store_true', help="keep updating the gyro bias while the sensor is still")
+    parser.add_argument("--packet-version", default=None, type=int, choices=[1, 2], help="1 for firmware without sequence numbers and crc, detected from the stream if not set")
+    parser.add_argument("--blocking-reads", action='store_true', help="wait on the serial port instead of polling")
+    parser.add_argument("--max-queued", default=None, type=int, help="bound on readings waiting to be processed")
+    parser.add_argument("--overflow", default="block", choices=["block", "drop-oldest", "drop-newest"])
+    parser.add_argument("--device-mode", default="thread", choices=["thread", "process"], help="how to run each device with several ports")
+    parser.add_argument("--display-device", default=0, type=int, help="device shown with several ports")
+    parser.add_argument("--asyncio", action='store_true', help="run reader, calibrator and imu as an asyncio pipeline")
+    parser.add_argument("--processes", action='store_true', help="read and process in separate processes connected by shared memory")
+    parser.add_argument("--stats-interval", default=5.0, type=float, help="seconds between queue depth reports with --processes")
+    parser.add_argument("--panels", default=None, type=int, nargs='+', help="indices of the live panels (0-7)")
+    parser.add_argument("--full-render", action='store_true', help="redraw every sample instead of min/max decimation")
+    parser.add_argument("--reconstruct-time", action='store_true', help="smooth the 1 ms tick timestamps with a fitted sample clock, not with --source, several ports, --asyncio or --processes")
+    parser.add_argument("--resample-rate", default=None, type=float, help="Hz, interpolate calibrated readings onto a fixed rate, not with --source, several ports, --asyncio or --processes")
+    parser.add_argument("--spectrum", action='store_true', help="show sliding window spectra, rms and peak frequency of the readings")
+    parser.add_argument("--spectrum-window", default=512, type=int, help="samples per fft window")
+    parser.add_argument("--spectrum-overlap", default=0.5, type=float, help="fraction of each window shared with the next")
+    parser.add_argument("--spectrum-averages", default=4, type=int, help="windows averaged into each spectrum")
+    parser.add_argument("--spectrum-interval", default=0.2, type=float, help="seconds between spectrum updates")
+    parser.add_argument("--metrics", action='store_true', help="time each stage and show the results in the window")
+    parser.add_argument("--metrics-file", default=None, help="append json snapshots of the metrics to this file")
+    parser.add_argument("--metrics-interval", default=1.0, type=float, help="seconds between metrics snapshots")
 
     args = parser.parse_args()
+    # only the per sample pipeline has the clock and resampler stages
+    if (args.reconstruct_time or args.resample_rate is not None) and (args.source is not None or len(args.port) > 1 or args.asyncio or args.processes):
+        parser.error("--reconstruct-time and --resample-rate need a single port without --source, --asyncio or --processes")
+    if args.metrics or args.metrics_file is not None:
+        enable_metrics(args.metrics_file, args.metrics_interval)
 
-    com = serial.Serial(port=args.port, baudrate=args.baudrate)
-    reader = Reader(com)
+    # analysis runs on its own thread fed with copies of the calibrated readings
+    analyser = None
+    if args.spectrum:
+        analyser = SpectrumAnalyser(args.spectrum_window, args.spectrum_overlap, args.spectrum_averages, publish_interval=args.spectrum_interval)
+        analyser.start()
 
     buffer = DataBuffer(time_window=args.preview_window)
-    visualiser = QtVisualiser(buffer)
-    calibrator = Calibrator(args.calibration_samples)
+    visualiser = QtVisualiser(buffer, decimate=not args.full_render, live_panels=args.panels, show_metrics=args.metrics, analyser=analyser)
 
-    imu = IMU()
+    if args.source is not None:
+        run_source(args, buffer, visualiser, analyser)
+        return
 
+    if len(args.port) > 1:
+        run_multi_device(args, buffer, visualiser, analyser)
+        return
+
+    if args.processes:
+        run_processes(args, buffer, visualiser, analyser)
+        return
+
+    com = serial.Serial(port=args.port[0], baudrate=args.baudrate)
+    calibrator = Calibrator(args.calibration_samples, track_bias=args.track_gyro_bias)
+
+    imu = IMU(fusion=None if args.fusion is None else make_fusion(args.fusion))
+
+    if args.asyncio:
+        run_async(com, calibrator, imu, buffer, visualiser, analyser, args.packet_version)
+        return
+
+    reader = Reader(com, block_mode=True, blocking_reads=args.blocking_reads, max_queued=args.max_queued, overflow=args.overflow, version=args.packet_version)
+    clock = SampleClock() if args.reconstruct_time else None
+    resampler = Resampler(args.resample_rate) if args.resample_rate is not None else None
+
+    # each decoded block goes through every stage at once
     def data_listener():
-        raw_readings = reader.get_readings()
-        calibrated_readings = calibrator.filter_data(raw_readings)
+        for block in reader.get_readings():
+            times, accel, gyro = block["time"], block["accel"], block["gyro"]
+            if clock is not None:
+                times, accel, gyro = clock.filter_block(times, accel, gyro)
+            times, accel, gyro = calibrator.filter_block(times, accel, gyro)
+            if resampler is not None:
+                times, accel, gyro = resampler.filter_block(times, accel, gyro)
+            if len(times) == 0:
+                continue
+            if analyser is not None:
+                analyser.filter_block(times, accel, gyro)
+
+            buffer.append_block(imu.update_block(times, accel, gyro))
+
+    data_listener_thread = threading.Thread(target=data_listener)
+
+    try:
+        reader.start()
+        data_listener_thread.start()
+        # this blocks
+        visualiser.start_threaded()
+    except KeyboardInterrupt as ex:
+        print(ex)
+    finally:
+        reader.stop()
+        data_listener_thread.join()
+        print_stats(reader.get_stats())
 
-        for i, data in enumerate(calibrated_readings):
-            imu.update(data)
+# each device is read and processed on its own thread or process
+# the merged stream is time aligned, only the display device is shown
+def run_multi_device(args, buffer, visualiser, analyser=None):
+    open_coms = [functools.partial(serial.Serial, port=port, baudrate=args.baudrate) for port in args.port]
+    reader = MultiDeviceReader(
+        open_coms, mode=args.device_mode, calibration_samples=args.calibration_samples,
+        version=args.packet_version, fusion=args.fusion, track_bias=args.track_gyro_bias)
 
-            for imu_data in imu.read_data():
-                visualiser.push_data(imu_data)
+    def data_listener():
+        for block in reader.get_blocks():
+            rows = block[block[:,1] == args.display_device]
+            buffer.append_block(rows[:,2:])
+            analyse_rows(analyser, rows[:,2:])
 
     data_listener_thread = threading.Thread(target=data_listener)
 
@@ -44,6 +149,90 @@ def main():
     finally:
         reader.stop()
         data_listener_thread.join()
+        if reader.late_samples > 0:
+            print(f"{reader.late_samples} samples arrived too late to merge in order")
+
+# reader and imu each run in their own process, this process only renders
+# queue depths are printed so a slow gui can be told apart from slow ingest
+def run_processes(args, buffer, visualiser, analyser=None):
+    open_com = functools.partial(serial.Serial, port=args.port[0], baudrate=args.baudrate)
+    pipeline = ProcessPipeline(
+        open_com, calibration_samples=args.calibration_samples,
+        version=args.packet_version, fusion=args.fusion, track_bias=args.track_gyro_bias)
+
+    def data_listener():
+        last_report = time.monotonic()
+        for block in pipeline.get_blocks():
+            buffer.append_block(block)
+            analyse_rows(analyser, block)
+            if time.monotonic() - last_report > args.stats_interval:
+                print_stats(pipeline.get_stats())
+                last_report = time.monotonic()
+
+    data_listener_thread = threading.Thread(target=data_listener)
+
+    try:
+        pipeline.start()
+        data_listener_thread.start()
+        # this blocks
+        visualiser.start_threaded()
+    except KeyboardInterrupt as ex:
+        print(ex)
+    finally:
+        pipeline.stop_event.set()
+        data_listener_thread.join()
+        print_stats(pipeline.get_stats())
+        pipeline.stop()
+
+# fused blocks come from publish_data.py which owns the serial port
+def run_source(args, buffer, visualiser, analyser=None):
+    subscriber = TelemetrySubscriber(args.source)
+    subscriber.connect()
+
+    def data_listener():
+        for rows in subscriber.get_blocks():
+            buffer.append_block(rows)
+            analyse_rows(analyser, rows)
+
+    data_listener_thread = threading.Thread(target=data_listener)
+
+    try:
+        data_listener_thread.start()
+        # this blocks
+        visualiser.start_threaded()
+    except KeyboardInterrupt as ex:
+        print(ex)
+    finally:
+        subscriber.close()
+        data_listener_thread.join()
+        print(f"lost_messages={subscriber.lost_messages}")
+
+# imu output rows start with the calibrated time, accel and gyro
+def analyse_rows(analyser, rows):
+    if analyser is not None:
+        analyser.filter_block(rows[:,0], rows[:,1:4], rows[:,4:7])
+
+def print_stats(stats):
+    print(" ".join(f"{name}={value}" for name, value in stats.items()))
+
+# event loop runs on its own thread since Qt blocks the main thread
+def run_async(com, calibrator, imu, buffer, visualiser, analyser=None, version=None):
+    pipeline = AsyncPipeline(AsyncReader(com, version=version), calibrator, imu)
+    pipeline.add_sink(buffer_sink(buffer))
+    if analyser is not None:
+        pipeline.add_sink(analyser_sink(analyser))
+
+    pipeline_thread = threading.Thread(target=asyncio.run, args=(pipeline.run(),))
+
+    try:
+        pipeline_thread.start()
+        # this blocks
+        visualiser.start_threaded()
+    except KeyboardInterrupt as ex:
+        print(ex)
+    finally:
+        pipeline.stop()
+        pipeline_thread.join()
 
 if __name__ == '__main__':
     main()
\ No newline at end of file
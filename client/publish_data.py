@@ -0,0 +1,70 @@
+import serial
+import argparse
+import time
+
+from src.Reader import Reader
+from src.Calibrator import Calibrator
+from src.IMU import IMU
+from src.Fusion import make_fusion
+from src.Recording import records_to_rows
+from src.Telemetry import TelemetryPublisher
+
+# reads the serial port once and serves raw and fused blocks to any number of viewers
+# python publish_data.py --port COM11 --url tcp://127.0.0.1:5760 unix:///tmp/mpu6050.sock
+# python live_preview.py --source tcp://127.0.0.1:5760
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--port", default="COM11")
+    parser.add_argument("--baudrate", default=1000000, type=int)
+    parser.add_argument("--url", default=["tcp://127.0.0.1:5760"], nargs='+', help="tcp://host:port, udp://host:port or unix:///path")
+    parser.add_argument("--calibration-samples", default=500, type=int)
+    parser.add_argument("--fusion", default=None, choices=["madgwick", "mahony"], help="quaternion filter instead of the complementary filter")
+    parser.add_argument("--track-gyro-bias", action='store_true', help="keep updating the gyro bias while the sensor is still")
+    parser.add_argument("--packet-version", default=None, type=int, choices=[1, 2], help="1 for firmware without sequence numbers and crc, detected from the stream if not set")
+    parser.add_argument("--max-queued", default=64, type=int, help="blocks waiting to be sent to each subscriber")
+    parser.add_argument("--slow-subscriber", default="drop-oldest", choices=list(TelemetryPublisher.overflow_policies), help="what happens to a subscriber that falls behind")
+    parser.add_argument("--stats-interval", default=5.0, type=float, help="seconds between subscriber reports")
+
+    args = parser.parse_args()
+
+    publishers = [TelemetryPublisher(url, args.max_queued, args.slow_subscriber) for url in args.url]
+
+    com = serial.Serial(port=args.port, baudrate=args.baudrate)
+    reader = Reader(com, block_mode=True, version=args.packet_version)
+    calibrator = Calibrator(args.calibration_samples, track_bias=args.track_gyro_bias)
+    imu = IMU(fusion=None if args.fusion is None else make_fusion(args.fusion))
+
+    try:
+        for publisher in publishers:
+            publisher.start()
+            print(f"Publishing on {publisher.url}")
+        reader.start()
+
+        last_report = time.monotonic()
+        for block in reader.get_readings():
+            raw_rows = records_to_rows(block)
+            times, accel, gyro = calibrator.filter_block(raw_rows[:,0], raw_rows[:,1:4], raw_rows[:,4:7])
+            fused_rows = imu.update_block(times, accel, gyro)
+
+            for publisher in publishers:
+                publisher.publish_raw(raw_rows)
+                publisher.publish_fused(fused_rows)
+
+            if time.monotonic() - last_report > args.stats_interval:
+                print_stats(reader, publishers)
+                last_report = time.monotonic()
+    except KeyboardInterrupt as ex:
+        print(ex)
+    finally:
+        reader.stop()
+        for publisher in publishers:
+            publisher.stop()
+        print_stats(reader, publishers)
+
+def print_stats(reader, publishers):
+    print(" ".join(f"{name}={value}" for name, value in reader.get_stats().items()))
+    for publisher in publishers:
+        print(publisher.url, " ".join(f"{name}={value}" for name, value in publisher.get_stats().items()))
+
+if __name__ == '__main__':
+    main()
@@ -1,51 +1,60 @@
 import serial
 import threading
-import csv
 import argparse
 import numpy as np
 
-from src import Reader, QtVisualiser, Calibrator, IMU, DataBuffer
+from src.Reader import Reader
+from src.Calibrator import Calibrator
+from src.IMU import IMU
+from src.DataBuffer import DataBuffer
+from src.Metrics import enable_metrics
+from src.Recording import RecordingWriter, RecordingHeader
 
 def main():
     parser = argparse.ArgumentParser()
     parser.add_argument("--port", default="COM11")
     parser.add_argument("--baudrate", default=1000000, type=int)
-    parser.add_argument("--output", default="data/data.csv")
+    parser.add_argument("--output", default="data/data.bin", help="binary recording, see convert_data.py for csv")
     parser.add_argument("--sampling-time", default=10.0, type=float)
     parser.add_argument("--preview-window", default=5.0, type=float)
+    parser.add_argument("--headless", action='store_true', help="record without opening a preview window")
+    parser.add_argument("--packet-version", default=None, type=int, choices=[1, 2], help="1 for firmware without sequence numbers and crc, detected from the stream if not set")
+    parser.add_argument("--sample-rate", default=500.0, type=float, help="nominal sample rate stored in the header (Hz)")
+    parser.add_argument("--accel-range", default=16.0, type=float, help="accelerometer full scale stored in the header (g)")
+    parser.add_argument("--gyro-range", default=2000.0, type=float, help="gyroscope full scale stored in the header (deg/s)")
+    parser.add_argument("--metrics", action='store_true', help="time each stage and show the results in the window")
+    parser.add_argument("--metrics-file", default=None, help="append json snapshots of the metrics to this file")
+    parser.add_argument("--metrics-interval", default=1.0, type=float, help="seconds between metrics snapshots")
 
     args = parser.parse_args()
+    if args.metrics or args.metrics_file is not None:
+        enable_metrics(args.metrics_file, args.metrics_interval)
 
     com = serial.Serial(port=args.port, baudrate=args.baudrate)
-    reader = Reader(com)
-
-    buffer = DataBuffer(time_window=args.preview_window)
-    visualiser = QtVisualiser(buffer)
+    reader = Reader(com, block_mode=True, version=args.packet_version)
+
+    buffer = None
+    if not args.headless:
+        # Qt is only imported when there is a window to show
+        from src.QtVisualiser import QtVisualiser
+        buffer = DataBuffer(time_window=args.preview_window)
+        visualiser = QtVisualiser(buffer, show_metrics=args.metrics)
     calibrator = Calibrator(200)
 
     imu = IMU()
 
-    fp = open(args.output, "w+")
-    fp.write("time accel_x accel_y accel_z gyro_x gyro_y gyro_z\n")
-
-    import time
-
-    def reading_interceptor(raw_readings):
-        for data in raw_readings:
-            dt, accel, gyro = data
-            fp.write(f"{dt} {accel:+f} {gyro:+f}\n")
-            yield data
+    header = RecordingHeader(args.sample_rate, args.accel_range, args.gyro_range)
+    writer = RecordingWriter(args.output, header)
 
     def start_data_ingest():
-        raw_readings = reader.get_readings()
-        raw_readings = reading_interceptor(raw_readings)
-        calibrated_readings = calibrator.filter_data(raw_readings)
-
-        for data in calibrated_readings:
-            imu.update(data)
+        for block in reader.get_readings():
+            # raw readings are written on the writer's thread
+            writer.write_block(block)
 
-            for imu_data in imu.read_data():
-                visualiser.push_data(imu_data)
+            times, accel, gyro = calibrator.filter_block(block["time"], block["accel"], block["gyro"])
+            imu_data = imu.update_block(times, accel, gyro)
+            if buffer is not None:
+                buffer.append_block(imu_data)
 
             if imu.current_time/1000 > args.sampling_time:
                 break
@@ -59,15 +68,21 @@ def main():
         print("Starting")
         reader.start()
         data_ingester.start()
-        # this blocks
-        visualiser.start_threaded()
+        if args.headless:
+            data_ingester.join()
+        else:
+            # this blocks
+            visualiser.start_threaded()
     except KeyboardInterrupt as ex:
         print(ex)
     finally:
-        print("Writing data")            
+        print("Writing data")
         reader.stop()
         data_ingester.join()
-        fp.close()
+        print(" ".join(f"{name}={value}" for name, value in reader.get_stats().items()))
+        if calibrator.is_finished:
+            writer.set_calibration(calibrator.accel_offset, calibrator.gyro_offset)
+        writer.close()
 
 if __name__ == '__main__':
-    main()
\ No newline at end of file
+    main()
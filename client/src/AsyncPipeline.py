@@ -0,0 +1,120 @@
+import asyncio
+
+# reader -> calibrator -> imu -> sinks as coroutines on one event loop
+# each sink has its own bounded queue and task so a slow sink only stalls
+# the pipeline once its queue is full
+# sinks are async callables taking a block
+#   raw sinks get the structured array of packets from the reader
+#   other sinks get the (N,25) imu output
+# an exception in a sink stops the pipeline and is raised from run
+class AsyncPipeline:
+    def __init__(self, reader, calibrator, imu, max_queued=16):
+        self.reader = reader
+        self.calibrator = calibrator
+        self.imu = imu
+        self.max_queued = max_queued
+
+        self.sinks = []
+        self.raw_sinks = []
+        self.total_samples = 0
+        # set to the first sink exception while running
+        self.failed = None
+
+    def add_sink(self, sink, raw=False):
+        if raw:
+            self.raw_sinks.append(sink)
+        else:
+            self.sinks.append(sink)
+
+    def stop(self):
+        self.reader.stop()
+
+    async def run(self):
+        raw_queues = [asyncio.Queue(self.max_queued) for _ in self.raw_sinks]
+        queues = [asyncio.Queue(self.max_queued) for _ in self.sinks]
+
+        self.failed = asyncio.get_running_loop().create_future()
+        tasks = [
+            asyncio.create_task(run_sink(sink, queue))
+            for sink, queue in zip(self.raw_sinks + self.sinks, raw_queues + queues)
+        ]
+        for task in tasks:
+            task.add_done_callback(self.on_sink_done)
+
+        try:
+            async for block in self.reader:
+                self.check_sinks()
+                for queue in raw_queues:
+                    await self.put(queue, block)
+
+                times, accel, gyro = self.calibrator.filter_block(block["time"], block["accel"], block["gyro"])
+                if len(times) == 0:
+                    continue
+
+                outputs = self.imu.update_block(times, accel, gyro)
+                self.total_samples += len(outputs)
+                for queue in queues:
+                    await self.put(queue, outputs)
+
+            # let the sinks finish what is queued
+            for queue in raw_queues + queues:
+                await self.put(queue, None)
+            await asyncio.gather(*tasks)
+        finally:
+            for task in tasks:
+                task.cancel()
+            if self.failed.done():
+                # marks the exception as retrieved when gather raised it instead
+                self.failed.exception()
+            self.reader.close()
+
+    def on_sink_done(self, task):
+        if not task.cancelled() and task.exception() is not None and not self.failed.done():
+            self.failed.set_exception(task.exception())
+
+    def check_sinks(self):
+        if self.failed.done():
+            self.failed.result()
+
+    # a failed sink never empties its queue, so waiting on a full one also watches for failures
+    async def put(self, queue, block):
+        if not queue.full():
+            queue.put_nowait(block)
+            return
+
+        put = asyncio.ensure_future(queue.put(block))
+        await asyncio.wait((put, self.failed), return_when=asyncio.FIRST_COMPLETED)
+        if not put.done():
+            put.cancel()
+        self.check_sinks()
+
+async def run_sink(sink, queue):
+    while True:
+        block = await queue.get()
+        if block is None:
+            return
+        await sink(block)
+
+# sink that appends imu output to a DataBuffer read by a visualiser
+def buffer_sink(buffer):
+    async def sink(block):
+        buffer.append_block(block)
+    return sink
+
+# sink that hands the calibrated readings of imu output to a SpectrumAnalyser
+def analyser_sink(analyser):
+    async def sink(block):
+        analyser.filter_block(block[:,0], block[:,1:4], block[:,4:7])
+    return sink
+
+# sink that writes raw packets in the save_data.py text format
+# formatting and writing run on a worker thread to keep file io off the event loop
+def text_file_sink(fp):
+    def write(block):
+        fp.write("".join(
+            f"{read_time} {accel[0]:+f} {accel[1]:+f} {accel[2]:+f} {gyro[0]:+f} {gyro[1]:+f} {gyro[2]:+f}\n"
+            for read_time, accel, gyro in zip(block["time"], block["accel"], block["gyro"])))
+
+    async def sink(block):
+        await asyncio.to_thread(write, block)
+    return sink
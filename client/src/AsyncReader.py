@@ -0,0 +1,50 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+
+from .PacketFramer import PacketFramer
+
+# asyncio reader yielding structured arrays of packets, see PacketFramer.read_block
+# serial reads block for at most read_timeout on a dedicated thread
+#     async for block in reader:
+# version: packet version sent by the firmware, None detects it, see PacketFramer
+class AsyncReader:
+    def __init__(self, com, read_timeout=0.1, version=None):
+        self.com = com
+        self.read_timeout = read_timeout
+        self.running = False
+
+        self.framer = PacketFramer(version=version)
+        self.executor = ThreadPoolExecutor(max_workers=1)
+
+    def __aiter__(self):
+        self.running = True
+        self.com.timeout = self.read_timeout
+        return self
+
+    async def __anext__(self):
+        loop = asyncio.get_running_loop()
+
+        while self.running and self.com.isOpen():
+            data = await loop.run_in_executor(self.executor, self.read_data)
+            self.framer.feed(data)
+
+            block = self.framer.read_block()
+            if len(block) > 0:
+                return block
+
+        raise StopAsyncIteration
+
+    # safe to call from any thread, iteration ends after the current read
+    def stop(self):
+        self.running = False
+
+    def close(self):
+        self.stop()
+        self.executor.shutdown(wait=True)
+
+    def read_data(self):
+        data = self.com.read(1)
+        total_waiting = self.com.in_waiting
+        if total_waiting > 0:
+            data += self.com.read(total_waiting)
+        return data
@@ -0,0 +1,165 @@
+import glob
+import hashlib
+import json
+import os
+import struct
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+
+from .ParameterSweep import process
+from .Recording import load_sensor_data
+
+# headless processing of recordings into imu outputs, see batch_process.py
+
+# names of the 25 columns returned by IMU.update_block
+output_groups = (
+    "accel", "gyro", "orientation",
+    "unfiltered_orientation", "accel_orientation", "low_pass_gyro_orientation",
+    "filtered_accel", "filtered_gyro",
+)
+output_columns = ("time",) + tuple(f"{group}_{axis}" for group in output_groups for axis in "xyz")
+
+output_formats = {
+    "binary": ".out.bin",
+    "columnar": ".npz",
+}
+
+# binary outputs are a 64 byte header followed by little endian (N,25) float64 rows
+# key identifies the input contents and settings the output was made from
+output_magic = b"MPU6050O"
+output_version = 1
+output_header_struct = struct.Struct("<8sHHQ40s4x")
+
+input_extensions = (".bin", ".csv")
+
+# directories are searched for recordings, anything else is treated as a glob
+# only csv and binary recordings are kept, never outputs of an earlier batch
+def find_inputs(patterns, recursive=False):
+    filenames = set()
+    for pattern in patterns:
+        if os.path.isdir(pattern):
+            pattern = os.path.join(pattern, "**", "*") if recursive else os.path.join(pattern, "*")
+        filenames.update(glob.glob(pattern, recursive=recursive))
+    return sorted(
+        filename for filename in filenames
+        if filename.endswith(input_extensions) and not filename.endswith(output_formats["binary"])
+        and os.path.isfile(filename))
+
+def hash_file(filename, chunk_size=1 << 20):
+    digest = hashlib.sha1()
+    with open(filename, "rb") as fp:
+        for chunk in iter(lambda: fp.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+# outputs only match for the same input contents and processing config
+def get_output_key(file_hash, config):
+    return hashlib.sha1((file_hash + json.dumps(config, sort_keys=True)).encode()).hexdigest()
+
+# each input keeps its path below the common directory of all inputs, including its
+# extension so a csv and its converted binary recording do not share an output
+#     data/data_0.csv -> data_0.csv.out.bin, data/data_0.bin -> data_0.bin.out.bin
+def get_output_filenames(inputs, output_directory, output_format):
+    if len(inputs) == 0:
+        return []
+
+    root = os.path.commonpath([os.path.dirname(os.path.abspath(filename)) for filename in inputs])
+    outputs = []
+    for filename in inputs:
+        name = os.path.relpath(os.path.abspath(filename), root)
+        outputs.append(os.path.join(output_directory, name + output_formats[output_format]))
+    return outputs
+
+def write_output(filename, outputs, key, output_format):
+    outputs = np.ascontiguousarray(outputs, dtype="<f8")
+    # written next to the output then renamed so an interrupted run never leaves
+    # a partial file that looks up to date, the temporary name is unique per writer
+    fd, temp_filename = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(filename)), suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as fp:
+            if output_format == "binary":
+                fp.write(output_header_struct.pack(
+                    output_magic, output_version, len(output_columns), len(outputs), key.encode()))
+                fp.write(outputs.tobytes())
+            else:
+                columns = {name: outputs[:,i] for i, name in enumerate(output_columns)}
+                np.savez(fp, key=np.array(key), **columns)
+        os.replace(temp_filename, filename)
+    except BaseException:
+        os.remove(temp_filename)
+        raise
+
+def read_binary_header(fp):
+    data = fp.read(output_header_struct.size)
+    if len(data) < output_header_struct.size:
+        raise ValueError("Not an output file, header is truncated")
+
+    magic, version, total_columns, total_rows, key = output_header_struct.unpack(data)
+    if magic != output_magic:
+        raise ValueError("Not an output file, header magic does not match")
+    if version != output_version or total_columns != len(output_columns):
+        raise ValueError(f"Unsupported output version {version} with {total_columns} columns")
+    return total_rows, key.decode()
+
+# key of an existing output, or None if it is missing or unreadable
+def read_output_key(filename):
+    try:
+        if filename.endswith(output_formats["binary"]):
+            with open(filename, "rb") as fp:
+                return read_binary_header(fp)[1]
+        # members of an npz are only read when accessed
+        with np.load(filename) as data:
+            return str(data["key"])
+    except (OSError, ValueError, KeyError):
+        return None
+
+# (N,25) outputs in the layout of IMU.update_block
+def read_output(filename):
+    if filename.endswith(output_formats["binary"]):
+        with open(filename, "rb") as fp:
+            total_rows, _ = read_binary_header(fp)
+            outputs = np.fromfile(fp, dtype="<f8", count=total_rows*len(output_columns))
+        return outputs.reshape(-1, len(output_columns))
+
+    with np.load(filename) as data:
+        return np.stack([data[name] for name in output_columns], axis=1)
+
+# runs in a worker, any failure is reported instead of stopping the batch
+def process_file(task):
+    input_filename, output_filename, config, output_format, force = task
+    result = {"input": input_filename, "output": output_filename, "rows": 0}
+    try:
+        key = get_output_key(hash_file(input_filename), config)
+        if not force and read_output_key(output_filename) == key:
+            result["status"] = "skipped"
+            return result
+
+        outputs = process(load_sensor_data(input_filename), config)
+        os.makedirs(os.path.dirname(os.path.abspath(output_filename)), exist_ok=True)
+        write_output(output_filename, outputs, key, output_format)
+        result["status"] = "processed"
+        result["rows"] = len(outputs)
+    except Exception as ex:
+        result["status"] = "failed"
+        result["error"] = f"{type(ex).__name__}: {ex}"
+    return result
+
+# process every input into output_directory on a process pool
+# config is passed to ParameterSweep.process, e.g. {"alpha": 0.96, "fusion": "mahony"}
+# returns one dict per input with its output filename and status
+#   processed, skipped when the output is already up to date, or failed with an error
+def run_batch(inputs, output_directory, config=None, output_format="binary", workers=None, force=False):
+    if output_format not in output_formats:
+        raise ValueError(f"Unknown output format {output_format}, expected one of {tuple(output_formats)}")
+
+    config = dict(config or {})
+    outputs = get_output_filenames(inputs, output_directory, output_format)
+    tasks = [(input_filename, output_filename, config, output_format, force)
+             for input_filename, output_filename in zip(inputs, outputs)]
+
+    if workers == 1 or len(tasks) <= 1:
+        return [process_file(task) for task in tasks]
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        return list(executor.map(process_file, tasks))
@@ -1,40 +1,250 @@
+import numpy as np
+
+from .Metrics import metrics
 from .Vector3D import Vector3D
 
+# one pass mean and variance of 3 axis readings using Welford's algorithm
+# blocks are merged with the parallel form so both paths give the same result
+class RunningStats:
+    __slots__ = ("count", "mean", "m2")
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.count = 0
+        self.mean = [0.0, 0.0, 0.0]
+        self.m2 = [0.0, 0.0, 0.0]
+
+    # x is a Vector3D or any 3 values
+    def add(self, x):
+        self.count += 1
+        mean, m2 = self.mean, self.m2
+        x, y, z = x
+        dx, dy, dz = x - mean[0], y - mean[1], z - mean[2]
+        mean[0] += dx / self.count
+        mean[1] += dy / self.count
+        mean[2] += dz / self.count
+        m2[0] += dx * (x - mean[0])
+        m2[1] += dy * (y - mean[1])
+        m2[2] += dz * (z - mean[2])
+
+    # x is (N,3)
+    def add_block(self, x):
+        total = len(x)
+        if total == 0:
+            return
+
+        block_mean = np.mean(x, axis=0)
+        block_m2 = np.sum((x - block_mean)**2, axis=0)
+
+        count = self.count + total
+        delta = block_mean - self.mean
+        self.mean = (self.mean + delta*total/count).tolist()
+        self.m2 = (self.m2 + block_m2 + delta**2*self.count*total/count).tolist()
+        self.count = count
+
+    @property
+    def variance(self):
+        if self.count == 0:
+            return [0.0, 0.0, 0.0]
+        return [m2 / self.count for m2 in self.m2]
+
+    def get_state(self):
+        return {"count": self.count, "mean": list(self.mean), "m2": list(self.m2)}
+
+    def set_state(self, state):
+        self.count = state["count"]
+        self.mean = list(state["mean"])
+        self.m2 = list(state["m2"])
+
+# estimates sensor offsets from the first total_samples readings, which are not output
+# track_bias: keep re-estimating the gyro bias afterwards, e.g. as it drifts with temperature
+#   readings are split into windows of window_samples, a window is stationary if the
+#   standard deviation of every gyro axis is below gyro_threshold (deg/s) and of every
+#   accel axis below accel_threshold (g). the bias moves bias_rate of the way towards
+#   the mean of each stationary window, windows further than max_bias_step (deg/s)
+#   from the bias are treated as slow rotation and ignored
 class Calibrator:
-    def __init__(self, total_samples=200):
+    def __init__(self, total_samples=200, track_bias=False, window_samples=100,
+                 gyro_threshold=0.25, accel_threshold=0.01, bias_rate=0.1, max_bias_step=1.0):
         self.accel_offset = Vector3D(0, 0, 0)
         self.gyro_offset = Vector3D(0, 0, 0)
 
         self.reference_accel = Vector3D(1, 0, 0)
         self.reference_gyro = Vector3D(0, 0, 0)
 
-        self.total_samples = 200
+        self.total_samples = total_samples
         self.completed_samples = 0
         self.is_finished = False
 
+        # raw readings of the initial calibration, then of the current window
+        self.accel_stats = RunningStats()
+        self.gyro_stats = RunningStats()
+
+        self.track_bias = track_bias
+        self.window_samples = window_samples
+        self.gyro_threshold = gyro_threshold
+        self.accel_threshold = accel_threshold
+        self.bias_rate = bias_rate
+        self.max_bias_step = max_bias_step
+
+        self.is_stationary = False
+        self.bias_updates = 0
+
+    # plain python snapshot that can be stored as json
+    def get_state(self):
+        return {
+            "accel_offset": [float(v) for v in self.accel_offset],
+            "gyro_offset": [float(v) for v in self.gyro_offset],
+            "reference_accel": [float(v) for v in self.reference_accel],
+            "reference_gyro": [float(v) for v in self.reference_gyro],
+            "total_samples": self.total_samples,
+            "completed_samples": self.completed_samples,
+            "is_finished": self.is_finished,
+            "accel_stats": self.accel_stats.get_state(),
+            "gyro_stats": self.gyro_stats.get_state(),
+            "track_bias": self.track_bias,
+            "window_samples": self.window_samples,
+            "gyro_threshold": self.gyro_threshold,
+            "accel_threshold": self.accel_threshold,
+            "bias_rate": self.bias_rate,
+            "max_bias_step": self.max_bias_step,
+            "is_stationary": self.is_stationary,
+            "bias_updates": self.bias_updates,
+        }
+
+    def set_state(self, state):
+        self.accel_offset = Vector3D(*state["accel_offset"])
+        self.gyro_offset = Vector3D(*state["gyro_offset"])
+        self.reference_accel = Vector3D(*state["reference_accel"])
+        self.reference_gyro = Vector3D(*state["reference_gyro"])
+        self.total_samples = state["total_samples"]
+        self.completed_samples = state["completed_samples"]
+        self.is_finished = state["is_finished"]
+        self.accel_stats.set_state(state["accel_stats"])
+        self.gyro_stats.set_state(state["gyro_stats"])
+        self.track_bias = state["track_bias"]
+        self.window_samples = state["window_samples"]
+        self.gyro_threshold = state["gyro_threshold"]
+        self.accel_threshold = state["accel_threshold"]
+        self.bias_rate = state["bias_rate"]
+        self.max_bias_step = state["max_bias_step"]
+        self.is_stationary = state["is_stationary"]
+        self.bias_updates = state["bias_updates"]
+
+    @classmethod
+    def from_state(cls, state):
+        calibrator = cls()
+        calibrator.set_state(state)
+        return calibrator
+
     def filter_data(self, data):
         for d in data:
+            start = metrics.start()
             read_time, accel, gyro = d
             if self.is_finished:
                 # yield (read_time, accel, gyro-self.gyro_offset)
-                yield (read_time, accel-self.accel_offset, gyro-self.gyro_offset)
+                calibrated = (read_time, accel-self.accel_offset, gyro-self.gyro_offset)
+                if self.track_bias:
+                    self.on_tracking_data(accel, gyro)
+                metrics.stop("calibrator.filter_data", start)
+                yield calibrated
             else:
                 self.on_data(d)
+                metrics.stop("calibrator.filter_data", start)
+
+    # same as filter_data for a block of samples
+    # times is (N,), accel and gyro are (N,3)
+    def filter_block(self, times, accel, gyro):
+        start = metrics.start()
+        if not self.is_finished:
+            total = min(len(times), self.total_samples - self.completed_samples)
+            self.accel_stats.add_block(accel[:total])
+            self.gyro_stats.add_block(gyro[:total])
+            self.completed_samples += total
+
+            if self.completed_samples >= self.total_samples:
+                self.finish()
+
+            times, accel, gyro = times[total:], accel[total:], gyro[total:]
+
+        if not self.is_finished:
+            metrics.stop("calibrator.filter_block", start)
+            return times, accel, gyro
+
+        if self.track_bias:
+            accel, gyro = self.filter_tracking_block(accel, gyro)
+        else:
+            accel = accel - np.array(list(self.accel_offset))
+            gyro = gyro - np.array(list(self.gyro_offset))
+        metrics.stop("calibrator.filter_block", start)
+        return times, accel, gyro
+
+    # each window is calibrated with the offsets from before it ends, like filter_data
+    def filter_tracking_block(self, accel, gyro):
+        accel_output = np.empty(np.shape(accel))
+        gyro_output = np.empty(np.shape(gyro))
+
+        i = 0
+        total = len(accel)
+        while i < total:
+            end = min(total, i + self.window_samples - self.gyro_stats.count)
+            accel_output[i:end] = accel[i:end] - np.array(list(self.accel_offset))
+            gyro_output[i:end] = gyro[i:end] - np.array(list(self.gyro_offset))
+
+            self.accel_stats.add_block(accel[i:end])
+            self.gyro_stats.add_block(gyro[i:end])
+            if self.gyro_stats.count >= self.window_samples:
+                self.end_window()
+            i = end
+
+        return accel_output, gyro_output
 
     def on_data(self, data):
         _, accel, gyro, = data
-        self.accel_offset += accel
-        self.gyro_offset += gyro
+        self.accel_stats.add(accel)
+        self.gyro_stats.add(gyro)
         self.completed_samples += 1
 
         if self.completed_samples >= self.total_samples:
-            self.accel_offset /= self.completed_samples
-            self.gyro_offset /= self.completed_samples
+            self.finish()
+
+    def on_tracking_data(self, accel, gyro):
+        self.accel_stats.add(accel)
+        self.gyro_stats.add(gyro)
+        if self.gyro_stats.count >= self.window_samples:
+            self.end_window()
+
+    def end_window(self):
+        gyro_threshold = self.gyro_threshold**2
+        accel_threshold = self.accel_threshold**2
+        self.is_stationary = (
+            all(variance < gyro_threshold for variance in self.gyro_stats.variance) and
+            all(variance < accel_threshold for variance in self.accel_stats.variance))
+
+        if self.is_stationary:
+            bias = Vector3D(*self.gyro_stats.mean) - self.reference_gyro
+            step = bias - self.gyro_offset
+            if max(abs(v) for v in step) < self.max_bias_step:
+                self.gyro_offset += step*self.bias_rate
+                self.bias_updates += 1
+
+        self.accel_stats.reset()
+        self.gyro_stats.reset()
+
+    def finish(self):
+        self.accel_offset = Vector3D(*self.accel_stats.mean)
+        self.gyro_offset = Vector3D(*self.gyro_stats.mean)
+
+        # calibrated = raw - error
+        # error = raw - calibrated
+        # calibrated = true reference
+        self.accel_offset -= self.reference_accel
+        self.gyro_offset -=  self.reference_gyro
 
-            # calibrated = raw - error
-            # error = raw - calibrated 
-            # calibrated = true reference
-            self.accel_offset -= self.reference_accel
-            self.gyro_offset -=  self.reference_gyro
+        # the stats are reused for the bias tracking windows
+        self.accel_stats.reset()
+        self.gyro_stats.reset()
 
-            self.is_finished = True
+        self.is_finished = True
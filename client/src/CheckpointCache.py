@@ -0,0 +1,176 @@
+import bisect
+import hashlib
+import json
+import os
+from collections import OrderedDict
+
+# identifies a recording by its contents, records is any array supporting the buffer protocol
+def hash_records(records, chunk_size=1 << 20):
+    digest = hashlib.sha1()
+    data = memoryview(records).cast("B")
+    for i in range(0, len(data), chunk_size):
+        digest.update(data[i:i+chunk_size])
+    return digest.hexdigest()
+
+# least recently used cache of filter states
+# keyed by (recording hash, filter parameters, sample index) so states
+# are only reused for the same data and settings
+# with a directory states are also kept on disk as json, up to max_disk_entries files
+# and max_disk_bytes bytes if set, least recently used files are removed first
+class CheckpointCache:
+    def __init__(self, max_entries=256, directory=None, max_disk_entries=4096, max_disk_bytes=None):
+        self.max_entries = max_entries
+        self.directory = directory
+        self.max_disk_entries = max_disk_entries
+        self.max_disk_bytes = max_disk_bytes
+
+        self.entries = OrderedDict()
+        # (recording hash, parameters) -> sorted sample indices
+        self.indices = {}
+
+        # filename -> size of the files on disk, least recently used first
+        # the directory is only walked here, puts keep the totals up to date
+        self.disk_files = OrderedDict()
+        self.disk_bytes = 0
+        if directory is not None:
+            os.makedirs(directory, exist_ok=True)
+            self.scan_disk()
+
+    def __len__(self):
+        return len(self.entries)
+
+    def put(self, recording_hash, parameters, index, state):
+        key = (recording_hash, tuple(parameters), index)
+        self.entries[key] = state
+        self.entries.move_to_end(key)
+        self.add_index(key)
+
+        while len(self.entries) > self.max_entries:
+            old_key, _ = self.entries.popitem(last=False)
+            if self.directory is None:
+                self.remove_index(old_key)
+
+        if self.directory is not None:
+            self.write_disk(key, state)
+
+    def get(self, recording_hash, parameters, index):
+        key = (recording_hash, tuple(parameters), index)
+        if key in self.entries:
+            self.entries.move_to_end(key)
+            return self.entries[key]
+
+        if self.directory is None:
+            return None
+
+        state = self.read_disk(key)
+        if state is not None:
+            self.entries[key] = state
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+        return state
+
+    # latest cached (index, state) at or before index, or (None, None)
+    def find_nearest(self, recording_hash, parameters, index):
+        group = (recording_hash, tuple(parameters))
+        indices = self.get_indices(group)
+
+        i = bisect.bisect_right(indices, index)
+        while i > 0:
+            i -= 1
+            state = self.get(recording_hash, parameters, indices[i])
+            if state is not None:
+                return indices[i], state
+            # evicted from disk by another process
+            indices.pop(i)
+
+        return None, None
+
+    def get_indices(self, group):
+        if group not in self.indices:
+            self.indices[group] = self.read_disk_indices(group)
+        return self.indices[group]
+
+    def add_index(self, key):
+        indices = self.get_indices(key[:2])
+        i = bisect.bisect_left(indices, key[2])
+        if i == len(indices) or indices[i] != key[2]:
+            indices.insert(i, key[2])
+
+    def remove_index(self, key):
+        indices = self.get_indices(key[:2])
+        i = bisect.bisect_left(indices, key[2])
+        if i < len(indices) and indices[i] == key[2]:
+            indices.pop(i)
+
+    # on disk each group has a folder holding one json file per sample index
+    def get_group_directory(self, group):
+        digest = hashlib.sha1(repr(group).encode()).hexdigest()
+        return os.path.join(self.directory, digest)
+
+    def get_filename(self, key):
+        return os.path.join(self.get_group_directory(key[:2]), f"{key[2]}.json")
+
+    def read_disk_indices(self, group):
+        if self.directory is None:
+            return []
+
+        directory = self.get_group_directory(group)
+        if not os.path.isdir(directory):
+            return []
+        return sorted(int(name[:-5]) for name in os.listdir(directory) if name.endswith(".json"))
+
+    def read_disk(self, key):
+        filename = self.get_filename(key)
+        try:
+            with open(filename, "r") as fp:
+                state = json.load(fp)
+        except (OSError, ValueError):
+            return None
+
+        # mark as recently used for disk eviction
+        os.utime(filename)
+        if filename in self.disk_files:
+            self.disk_files.move_to_end(filename)
+        return state
+
+    def write_disk(self, key, state):
+        filename = self.get_filename(key)
+        os.makedirs(os.path.dirname(filename), exist_ok=True)
+        data = json.dumps(state)
+        with open(filename, "w+") as fp:
+            fp.write(data)
+
+        # json is ascii so its length is the file size
+        self.disk_bytes += len(data) - self.disk_files.pop(filename, 0)
+        self.disk_files[filename] = len(data)
+        self.evict_disk()
+
+    def scan_disk(self):
+        files = []
+        for group in os.listdir(self.directory):
+            directory = os.path.join(self.directory, group)
+            if os.path.isdir(directory):
+                for name in os.listdir(directory):
+                    stat = os.stat(os.path.join(directory, name))
+                    files.append((stat.st_mtime, os.path.join(directory, name), stat.st_size))
+
+        files.sort()
+        self.disk_files = OrderedDict((filename, size) for _, filename, size in files)
+        self.disk_bytes = sum(self.disk_files.values())
+        self.evict_disk()
+
+    def is_disk_full(self):
+        if len(self.disk_files) > self.max_disk_entries:
+            return True
+        return self.max_disk_bytes is not None and self.disk_bytes > self.max_disk_bytes
+
+    def evict_disk(self):
+        while self.is_disk_full():
+            filename, size = self.disk_files.popitem(last=False)
+            self.disk_bytes -= size
+            try:
+                os.remove(filename)
+            except FileNotFoundError:
+                # already removed by another process
+                pass
+        # cached index lists may now point at missing files, find_nearest skips them
@@ -1,28 +1,113 @@
-from collections import deque
+import threading
 import numpy as np
 
+from .Metrics import metrics
+
 # visualise acceleration, gyro, and estimated orientation
-class DataBuffer(deque):
-    def __init__(self, time_window=1.5):
-        super().__init__([])
+# fixed capacity ring buffer of (time, ...) rows
+# every row is written twice so that any window is a contiguous slice
+class DataBuffer:
+    def __init__(self, time_window=1.5, capacity=None, width=25):
         self.time_window = time_window
 
+        if capacity is None:
+            # leave room for up to 2 samples per ms
+            capacity = int(2 * time_window * 1000) + 1
+
+        self.capacity = capacity
+        self.width = width
+        self.data = np.zeros((2*capacity, width))
+
+        # absolute indices of oldest and next row
+        self.start = 0
+        self.end = 0
+
+        self.lock = threading.Lock()
+
+    def __len__(self):
+        with self.lock:
+            self.truncate_data()
+            return self.end - self.start
+
+    def __getitem__(self, index):
+        return self.view()[index]
+
+    def __iter__(self):
+        return iter(self.view())
+
+    def __array__(self, dtype=None, copy=None):
+        return np.array(self.view(), dtype=dtype)
+
     def append(self, data):
-        super().append(data)
-        self.truncate_data()
+        with self.lock:
+            i = self.end % self.capacity
+            self.data[i] = data
+            self.data[i+self.capacity] = data
+            self.end += 1
+            self.start = max(self.start, self.end - self.capacity)
+
+    # rows is (N,width)
+    def append_block(self, rows):
+        total = len(rows)
+        if total == 0:
+            return
+
+        with self.lock:
+            # only the newest rows can fit
+            skipped = max(0, total - self.capacity)
+            rows = rows[skipped:]
+            self.end += skipped
+
+            size = len(rows)
+            i = self.end % self.capacity
+            first = min(size, self.capacity - i)
+            rest = size - first
+
+            self.data[i:i+first] = rows[:first]
+            self.data[i+self.capacity:i+self.capacity+first] = rows[:first]
+            self.data[0:rest] = rows[first:]
+            self.data[self.capacity:self.capacity+rest] = rows[first:]
+
+            self.end += size
+            self.start = max(self.start, self.end - self.capacity)
 
+    def clear(self):
+        with self.lock:
+            self.start = self.end
+
+    # truncate data thats past window, caller holds the lock
     def truncate_data(self):
-        if len(self) == 0:
+        total = self.end - self.start
+        if total == 0:
             return
 
-        # truncate data thats past window
-        last_time = self[-1][0]
-        cutoff_time = last_time - (self.time_window * 1000)
-
-        while len(self) > 0:
-            entry = self[0]
-            entry_time = entry[0]
-            if entry_time < cutoff_time:
-                self.popleft() 
-            else:
-                break
\ No newline at end of file
+        start = metrics.start()
+        i = self.start % self.capacity
+        times = self.data[i:i+total, 0]
+        cutoff_time = times[-1] - (self.time_window * 1000)
+
+        # times are increasing so the cutoff can be found with a binary search
+        self.start += int(np.searchsorted(times, cutoff_time, side='left'))
+        metrics.stop("buffer.truncate_data", start)
+        metrics.gauge("buffer.rows", self.end - self.start)
+
+    # contiguous view of the current window, rows can be overwritten by later appends
+    def view(self):
+        return self.indexed_view()[1]
+
+    # absolute index of the first row in the window along with view()
+    def indexed_view(self):
+        with self.lock:
+            self.truncate_data()
+            i = self.start % self.capacity
+            return self.start, self.data[i:i+(self.end-self.start)]
+
+    # copy the current window into out which has at least capacity rows
+    # returns the number of rows copied
+    def snapshot_into(self, out):
+        with self.lock:
+            self.truncate_data()
+            total = self.end - self.start
+            i = self.start % self.capacity
+            out[:total] = self.data[i:i+total]
+            return total
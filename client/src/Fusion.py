@@ -0,0 +1,238 @@
+import math
+import numpy as np
+
+# quaternion orientation filters, an alternative to the complementary filter in IMU
+# readings are in the sensor frame where gravity at rest is +x, the filters run in a
+# frame with gravity along +z so the usual yaw, pitch, roll decomposition stays away
+# from gimbal lock when the board sits upright
+#   filter (x, y, z) = sensor (y, z, x)
+#
+# each step works on plain floats for a single device, or on (D,) arrays to update
+# D devices at once, the arithmetic is the same for both
+# quaternions are stored as 4 components (w, x, y, z)
+
+def to_filter_frame(v):
+    return v[1], v[2], v[0]
+
+def normalise(q0, q1, q2, q3, sqrt):
+    norm = 1 / sqrt(q0*q0 + q1*q1 + q2*q2 + q3*q3)
+    return q0*norm, q1*norm, q2*norm, q3*norm
+
+# unit accel and a 0/1 mask for readings that have no direction
+def normalise_accel(ax, ay, az, sqrt):
+    norm_sq = ax*ax + ay*ay + az*az
+    is_valid = (norm_sq > 0) * 1.0
+    norm = is_valid / sqrt(norm_sq + (1 - is_valid))
+    return ax*norm, ay*norm, az*norm, is_valid
+
+# rotation taking the filter frame to an earth frame with gravity along +z, yaw of 0
+def quaternion_from_accel(ax, ay, az):
+    roll = np.arctan2(ay, az)
+    pitch = np.arctan2(-ax, np.sqrt(np.square(ay) + np.square(az)))
+    cr, sr = np.cos(roll/2), np.sin(roll/2)
+    cp, sp = np.cos(pitch/2), np.sin(pitch/2)
+    return cr*cp, sr*cp, cr*sp, -sr*sp
+
+# (N,4) or (N,D,4) quaternions to (yaw, roll, pitch) in degrees laid out like
+# IMU.orientation, rotation about sensor x, y and z
+def quaternion_to_orientation(q):
+    q0, q1, q2, q3 = q[...,0], q[...,1], q[...,2], q[...,3]
+    roll = np.arctan2(2*(q0*q1 + q2*q3), 1 - 2*(q1*q1 + q2*q2))
+    pitch = np.arcsin(np.clip(2*(q0*q2 - q3*q1), -1, 1))
+    yaw = np.arctan2(2*(q0*q3 + q1*q2), 1 - 2*(q2*q2 + q3*q3))
+    return np.degrees(np.stack((yaw, roll, pitch), axis=-1))
+
+# same as quaternion_to_orientation for a single quaternion of floats
+def quaternion_to_orientation_scalar(q0, q1, q2, q3):
+    roll = math.atan2(2*(q0*q1 + q2*q3), 1 - 2*(q1*q1 + q2*q2))
+    pitch = math.asin(min(max(2*(q0*q2 - q3*q1), -1), 1))
+    yaw = math.atan2(2*(q0*q3 + q1*q2), 1 - 2*(q2*q2 + q3*q3))
+    return math.degrees(yaw), math.degrees(roll), math.degrees(pitch)
+
+# gradient descent filter from Madgwick's 2010 report, beta is the gyro error (rad/s)
+def madgwick_step(q, gyro, accel, dt, beta, sqrt):
+    q0, q1, q2, q3 = q
+    gx, gy, gz = gyro
+    ax, ay, az, is_valid = normalise_accel(*accel, sqrt)
+
+    q_dot0 = 0.5*(-q1*gx - q2*gy - q3*gz)
+    q_dot1 = 0.5*(q0*gx + q2*gz - q3*gy)
+    q_dot2 = 0.5*(q0*gy - q1*gz + q3*gx)
+    q_dot3 = 0.5*(q0*gz + q1*gy - q2*gx)
+
+    s0 = 4*q0*q2*q2 + 2*q2*ax + 4*q0*q1*q1 - 2*q1*ay
+    s1 = 4*q1*q3*q3 - 2*q3*ax + 4*q0*q0*q1 - 2*q0*ay - 4*q1 + 8*q1*q1*q1 + 8*q1*q2*q2 + 4*q1*az
+    s2 = 4*q0*q0*q2 + 2*q0*ax + 4*q2*q3*q3 - 2*q3*ay - 4*q2 + 8*q2*q1*q1 + 8*q2*q2*q2 + 4*q2*az
+    s3 = 4*q1*q1*q3 - 2*q1*ax + 4*q2*q2*q3 - 2*q2*ay
+    s_norm_sq = s0*s0 + s1*s1 + s2*s2 + s3*s3
+    s_is_valid = is_valid * (s_norm_sq > 0) * 1.0
+    step = beta * s_is_valid / sqrt(s_norm_sq + (1 - s_is_valid))
+
+    q0 = q0 + (q_dot0 - step*s0)*dt
+    q1 = q1 + (q_dot1 - step*s1)*dt
+    q2 = q2 + (q_dot2 - step*s2)*dt
+    q3 = q3 + (q_dot3 - step*s3)*dt
+    return normalise(q0, q1, q2, q3, sqrt)
+
+# proportional integral filter on the gravity direction error from Mahony et al. 2008
+# integral is the gyro bias estimate (rad/s), updated in place
+def mahony_step(q, gyro, accel, dt, kp, ki, integral, sqrt):
+    q0, q1, q2, q3 = q
+    gx, gy, gz = gyro
+    ax, ay, az, is_valid = normalise_accel(*accel, sqrt)
+
+    # gravity direction predicted by the current orientation
+    vx = 2*(q1*q3 - q0*q2)
+    vy = 2*(q0*q1 + q2*q3)
+    vz = q0*q0 - q1*q1 - q2*q2 + q3*q3
+
+    ex = (ay*vz - az*vy) * is_valid
+    ey = (az*vx - ax*vz) * is_valid
+    ez = (ax*vy - ay*vx) * is_valid
+
+    integral[0] = integral[0] + ki*ex*dt
+    integral[1] = integral[1] + ki*ey*dt
+    integral[2] = integral[2] + ki*ez*dt
+    gx = gx + kp*ex + integral[0]
+    gy = gy + kp*ey + integral[1]
+    gz = gz + kp*ez + integral[2]
+
+    q0, q1, q2, q3 = (
+        q0 + 0.5*(-q1*gx - q2*gy - q3*gz)*dt,
+        q1 + 0.5*(q0*gx + q2*gz - q3*gy)*dt,
+        q2 + 0.5*(q0*gy - q1*gz + q3*gx)*dt,
+        q3 + 0.5*(q0*gz + q1*gy - q2*gx)*dt)
+    return normalise(q0, q1, q2, q3, sqrt)
+
+# shared by the quaternion filters, subclasses implement step
+# devices: number of sensors updated together, readings then have a device axis
+class QuaternionFusion:
+    name = None
+
+    def __init__(self, devices=1):
+        self.devices = devices
+        self.q = None
+
+        self.sqrt = math.sqrt if devices == 1 else np.sqrt
+
+    def get_parameters(self):
+        return (self.name,)
+
+    def get_state(self):
+        return {
+            "name": self.name,
+            "devices": self.devices,
+            "q": None if self.q is None else np.array(self.q, dtype=np.float64).tolist(),
+        }
+
+    def set_state(self, state):
+        self.q = state["q"]
+        if self.q is not None and self.devices > 1:
+            self.q = [np.array(component) for component in self.q]
+        elif self.q is not None:
+            self.q = [float(component) for component in self.q]
+
+    # gyro (deg/s) and accel (g) are 3 values, or (D,3) with several devices, dt is in seconds
+    # returns the orientation like IMU.orientation
+    def update(self, gyro, accel, dt):
+        if self.devices == 1:
+            gyro = [math.radians(v) for v in gyro]
+            self.step_sample(to_filter_frame(gyro), to_filter_frame(list(accel)), dt)
+            return quaternion_to_orientation_scalar(*self.q)
+
+        gyro = np.radians(np.asarray(gyro, dtype=np.float64))
+        accel = np.asarray(accel, dtype=np.float64)
+        self.step_sample(to_filter_frame(gyro.T), to_filter_frame(accel.T), dt)
+        return quaternion_to_orientation(np.stack(self.q, axis=-1))
+
+    # gyro and accel are (N,3) or (N,D,3), dt is (N,) or (N,D)
+    # returns (N,3) or (N,D,3) orientations
+    def update_block(self, gyro, accel, dt):
+        total = len(gyro)
+        q = np.empty((total, 4) if self.devices == 1 else (total, self.devices, 4))
+
+        gyro = np.radians(gyro)
+        if self.devices == 1:
+            # plain floats are much faster than numpy scalars for a single device
+            gyro, accel, dt = gyro.tolist(), np.asarray(accel).tolist(), np.asarray(dt).tolist()
+
+        for i in range(total):
+            if self.devices == 1:
+                self.step_sample(to_filter_frame(gyro[i]), to_filter_frame(accel[i]), dt[i])
+                q[i] = self.q
+            else:
+                self.step_sample(to_filter_frame(gyro[i].T), to_filter_frame(accel[i].T), dt[i])
+                q[i] = np.stack(self.q, axis=-1)
+
+        return quaternion_to_orientation(q)
+
+    # the first reading sets the tilt so the filter does not have to converge from level
+    def step_sample(self, gyro, accel, dt):
+        if self.q is None:
+            self.q = list(quaternion_from_accel(*accel))
+            if self.devices == 1:
+                self.q = [float(component) for component in self.q]
+        self.q = self.step(self.q, gyro, accel, dt)
+
+class MadgwickFusion(QuaternionFusion):
+    name = "madgwick"
+
+    def __init__(self, beta=0.1, devices=1):
+        super().__init__(devices)
+        self.beta = beta
+
+    def get_parameters(self):
+        return (self.name, self.beta)
+
+    def get_state(self):
+        return dict(super().get_state(), beta=self.beta)
+
+    def set_state(self, state):
+        super().set_state(state)
+        self.beta = state["beta"]
+
+    def step(self, q, gyro, accel, dt):
+        return madgwick_step(q, gyro, accel, dt, self.beta, self.sqrt)
+
+class MahonyFusion(QuaternionFusion):
+    name = "mahony"
+
+    def __init__(self, kp=1.0, ki=0.0, devices=1):
+        super().__init__(devices)
+        self.kp = kp
+        self.ki = ki
+        self.integral = [0.0, 0.0, 0.0] if devices == 1 else [np.zeros(devices) for _ in range(3)]
+
+    def get_parameters(self):
+        return (self.name, self.kp, self.ki)
+
+    def get_state(self):
+        return dict(super().get_state(), kp=self.kp, ki=self.ki, integral=np.array(self.integral).tolist())
+
+    def set_state(self, state):
+        super().set_state(state)
+        self.kp = state["kp"]
+        self.ki = state["ki"]
+        if self.devices == 1:
+            self.integral = [float(v) for v in state["integral"]]
+        else:
+            self.integral = [np.array(v) for v in state["integral"]]
+
+    def step(self, q, gyro, accel, dt):
+        return mahony_step(q, gyro, accel, dt, self.kp, self.ki, self.integral, self.sqrt)
+
+fusion_types = {
+    MadgwickFusion.name: MadgwickFusion,
+    MahonyFusion.name: MahonyFusion,
+}
+
+# name is "madgwick" or "mahony", keyword arguments go to the filter
+def make_fusion(name, **kwargs):
+    if name not in fusion_types:
+        raise ValueError(f"Unknown fusion {name}, expected one of {tuple(fusion_types)}")
+    return fusion_types[name](**kwargs)
+
+def fusion_from_state(state):
+    fusion = make_fusion(state["name"], devices=state["devices"])
+    fusion.set_state(state)
+    return fusion
@@ -2,10 +2,20 @@ from collections import deque
 import numpy as np
 import math
 
+from .Fusion import fusion_from_state
+from .Metrics import metrics
 from .Vector3D import Vector3D
 
 class IMU:
-    def __init__(self):
+    # alpha weights the gyro angle in the complementary filter
+    # cutoffs are for the low pass filters on accel and gyro readings
+    # fusion: quaternion filter used for the orientation instead of the complementary filter
+    #   e.g. MadgwickFusion() or MahonyFusion(), see Fusion.py
+    # an imu follows one device, filters with devices > 1 are used directly on (N,D,3) readings
+    def __init__(self, alpha=0.96, accel_cutoff=20, gyro_cutoff=100, fusion=None):
+        if fusion is not None and fusion.devices != 1:
+            raise ValueError(f"IMU fusion filter must have 1 device, got {fusion.devices}")
+
         self.current_time = 0
         self.last_read_time = None
 
@@ -13,17 +23,59 @@ class IMU:
         self.unfiltered_orientation = Vector3D(0, 0, 0)
         self.low_pass_gyro_orientation = Vector3D(0, 0, 0)
 
-        self.accel_low_pass_filter = LowPassFilter(20)
-        self.gyro_low_pass_filter = LowPassFilter(100)
+        self.accel_low_pass_filter = LowPassFilter(accel_cutoff)
+        self.gyro_low_pass_filter = LowPassFilter(gyro_cutoff)
+        self.alpha = alpha
+        self.fusion = fusion
 
         self.buffer = deque([])
 
+    # filter settings, outputs only match between imus with equal parameters
+    def get_parameters(self):
+        parameters = (self.alpha, self.accel_low_pass_filter.f_cutoff, self.gyro_low_pass_filter.f_cutoff)
+        if self.fusion is not None:
+            parameters += self.fusion.get_parameters()
+        return parameters
+
+    # plain python snapshot of the filter state that can be stored as json
+    def get_state(self):
+        return {
+            "current_time": float(self.current_time),
+            "last_read_time": None if self.last_read_time is None else float(self.last_read_time),
+            "orientation": [float(v) for v in self.orientation],
+            "unfiltered_orientation": [float(v) for v in self.unfiltered_orientation],
+            "low_pass_gyro_orientation": [float(v) for v in self.low_pass_gyro_orientation],
+            "alpha": self.alpha,
+            "accel_low_pass_filter": self.accel_low_pass_filter.get_state(),
+            "gyro_low_pass_filter": self.gyro_low_pass_filter.get_state(),
+            "fusion": None if self.fusion is None else self.fusion.get_state(),
+        }
+
+    def set_state(self, state):
+        self.current_time = state["current_time"]
+        self.last_read_time = state["last_read_time"]
+        self.orientation = Vector3D(*state["orientation"])
+        self.unfiltered_orientation = Vector3D(*state["unfiltered_orientation"])
+        self.low_pass_gyro_orientation = Vector3D(*state["low_pass_gyro_orientation"])
+        self.alpha = state["alpha"]
+        self.accel_low_pass_filter.set_state(state["accel_low_pass_filter"])
+        self.gyro_low_pass_filter.set_state(state["gyro_low_pass_filter"])
+        fusion_state = state.get("fusion")
+        self.fusion = None if fusion_state is None else fusion_from_state(fusion_state)
+
+    @classmethod
+    def from_state(cls, state):
+        imu = cls()
+        imu.set_state(state)
+        return imu
+
     # output parsed data
     def read_data(self):
         while len(self.buffer) > 0:
             yield self.buffer.popleft()
 
     def update(self, data):
+        start = metrics.start()
         read_time, accel, gyro = data
         dt = self.calculate_dt(read_time)
         
@@ -38,13 +90,17 @@ class IMU:
         self.low_pass_gyro_orientation += filtered_gyro*dt_ms
 
         angle_accel = self.calculate_gravity_orientation(filtered_accel)
-        # complementary filter
-        filtered_gyro_angle = self.orientation + gyro*dt_ms 
-        alpha = 0.96
+        if self.fusion is not None:
+            self.orientation = Vector3D(*self.fusion.update(list(gyro), list(filtered_accel), dt_ms))
+            angle_accel.x = self.orientation.x
+        else:
+            # complementary filter
+            filtered_gyro_angle = self.orientation + gyro*dt_ms 
+            alpha = self.alpha
 
-        # cant compute yaw without magnetometer
-        angle_accel.x = filtered_gyro_angle.x
-        self.orientation = alpha*filtered_gyro_angle + (1-alpha)*angle_accel
+            # cant compute yaw without magnetometer
+            angle_accel.x = filtered_gyro_angle.x
+            self.orientation = alpha*filtered_gyro_angle + (1-alpha)*angle_accel
 
         data = [self.current_time]
         data.extend(list(accel))
@@ -57,6 +113,66 @@ class IMU:
         data.extend(list(filtered_gyro))
 
         self.buffer.append(np.array(data))
+        metrics.set_clock_offset(self.last_read_time - self.current_time)
+        metrics.stop("imu.update", start)
+
+    # same outputs as update for a block of samples
+    # times is (N,), accel and gyro are (N,3), returns (N,25)
+    def update_block(self, times, accel, gyro):
+        times = np.asarray(times, dtype=np.float64)
+        accel = np.asarray(accel, dtype=np.float64)
+        gyro = np.asarray(gyro, dtype=np.float64)
+        total = len(times)
+
+        output = np.empty((total, 25))
+        if total == 0:
+            return output
+        start = metrics.start()
+
+        if self.last_read_time is None:
+            self.last_read_time = times[0]
+
+        dt = np.diff(times, prepend=self.last_read_time)
+        self.last_read_time = times[-1]
+
+        # accumulate in the same order as update
+        current_time = np.cumsum(np.concatenate(([self.current_time], dt)))[1:]
+        self.current_time = current_time[-1]
+        dt_ms = (dt / 1000)[:,None]
+
+        filtered_accel = self.accel_low_pass_filter.get_block(accel, dt_ms)
+        filtered_gyro = self.gyro_low_pass_filter.get_block(gyro, dt_ms)
+
+        unfiltered_orientation = cumulative_sum(self.unfiltered_orientation, gyro*dt_ms)
+        low_pass_gyro_orientation = cumulative_sum(self.low_pass_gyro_orientation, filtered_gyro*dt_ms)
+
+        angle_accel = self.calculate_gravity_orientation_block(filtered_accel)
+
+        if self.fusion is not None:
+            orientation = self.fusion.update_block(gyro, filtered_accel, dt_ms[:,0])
+        else:
+            # complementary filter, yaw is integrated gyro only
+            alpha = np.array([1.0, self.alpha, self.alpha])
+            c = alpha*gyro*dt_ms + (1-alpha)*angle_accel
+            orientation = linear_recurrence(alpha, c, np.array(list(self.orientation)))
+        angle_accel[:,0] = orientation[:,0]
+
+        self.orientation = Vector3D(*orientation[-1])
+        self.unfiltered_orientation = Vector3D(*unfiltered_orientation[-1])
+        self.low_pass_gyro_orientation = Vector3D(*low_pass_gyro_orientation[-1])
+
+        output[:,0] = current_time
+        columns = [
+            accel, gyro, orientation, 
+            unfiltered_orientation, angle_accel, low_pass_gyro_orientation,
+            filtered_accel, filtered_gyro
+        ]
+        for i, column in enumerate(columns):
+            output[:,1+3*i:4+3*i] = column
+
+        metrics.set_clock_offset(self.last_read_time - self.current_time)
+        metrics.stop("imu.update_block", start, total)
+        return output
 
     # can only calculate two angles from gravity sensor
     # cannot measure yaw 
@@ -68,9 +184,16 @@ class IMU:
         angle_rad.y = math.atan(+accel.z / (accel.x**2 + accel.y**2)**0.5)
         angle_rad.z = math.atan(-accel.y / (accel.x**2 + accel.z**2)**0.5)
 
-        angle_deg = angle_rad * (180/math.pi)
+        return angle_rad * (180/math.pi)
 
-        return angle_deg 
+    def calculate_gravity_orientation_block(self, accel):
+        x, y, z = accel[:,0], accel[:,1], accel[:,2]
+        angle_rad = np.empty_like(accel)
+        angle_rad[:,0] = np.arctan(-y / (x**2 + z**2)**0.5)
+        angle_rad[:,1] = np.arctan(+z / (x**2 + y**2)**0.5)
+        angle_rad[:,2] = angle_rad[:,0]
+
+        return angle_rad * (180/math.pi)
 
     def calculate_dt(self, read_time):
         if self.last_read_time is None:
@@ -83,8 +206,26 @@ class IMU:
 
 class LowPassFilter:
     def __init__(self, f_cutoff):
+        self.f_cutoff = f_cutoff
         self.w_cutoff = f_cutoff / (2*math.pi)
         self.last_y = None
+
+    def get_state(self):
+        return {
+            "f_cutoff": self.f_cutoff,
+            "last_y": None if self.last_y is None else [float(v) for v in self.last_y],
+        }
+
+    def set_state(self, state):
+        self.f_cutoff = state["f_cutoff"]
+        self.w_cutoff = self.f_cutoff / (2*math.pi)
+        self.last_y = None if state["last_y"] is None else Vector3D(*state["last_y"])
+
+    @classmethod
+    def from_state(cls, state):
+        low_pass_filter = cls(state["f_cutoff"])
+        low_pass_filter.set_state(state)
+        return low_pass_filter
     
     def get_value(self, x, dt_ms):
         alpha = dt_ms / (1/self.w_cutoff + dt_ms)
@@ -101,5 +242,57 @@ class LowPassFilter:
 
         return y
 
-        
-    
+    # x is (N,3), dt_ms is (N,1)
+    def get_block(self, x, dt_ms):
+        alpha = dt_ms / (1/self.w_cutoff + dt_ms)
+        y = np.empty_like(x)
+        if len(x) == 0:
+            return y
+
+        start = 0
+        if self.last_y is None:
+            y[0] = x[0]
+            self.last_y = Vector3D(*(alpha[0]*x[0]))
+            start = 1
+
+        b = 1-alpha[start:]
+        # a constant dt, e.g. after Resampler, takes the constant coefficient path
+        if len(b) > 0 and np.all(b == b[0]):
+            b = b[0]
+        y[start:] = linear_recurrence(b, alpha[start:]*x[start:], np.array(list(self.last_y)))
+        if len(y) > start:
+            self.last_y = Vector3D(*y[-1])
+
+        return y
+
+def cumulative_sum(start, x):
+    y = np.cumsum(np.concatenate((np.array([list(start)]), x)), axis=0)
+    return y[1:]
+
+# solves y[i] = b[i]*y[i-1] + c[i] for a whole block
+# uses a log2(N) step scan so there is no per sample python loop
+# b with fewer dimensions than c is the same for every sample, e.g. shape (3,) for (N,3)
+def linear_recurrence(b, c, y0):
+    b = np.array(b, dtype=np.float64)
+    c = np.array(c, dtype=np.float64)
+    total = len(c)
+
+    if b.ndim < c.ndim:
+        # b**step is the same for every row, so only c is updated
+        power = b
+        step = 1
+        while step < total:
+            c[step:] += power*c[:-step]
+            power = power*power
+            step *= 2
+
+        powers = np.cumprod(np.broadcast_to(b, (total,) + b.shape), axis=0)
+        return c + powers*y0
+
+    step = 1
+    while step < total:
+        c[step:] = c[step:] + b[step:]*c[:-step]
+        b[step:] = b[step:]*b[:-step]
+        step *= 2
+
+    return c + b*y0
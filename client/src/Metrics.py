@@ -0,0 +1,200 @@
+import atexit
+import json
+import math
+import threading
+import time
+
+# counts per power of 10 for histogram buckets
+buckets_per_decade = 10
+
+# log spaced histogram, values are bucketed so recording is O(1) and memory is fixed
+# lowest is the smallest value told apart, anything below lands in the first bucket
+class Histogram:
+    def __init__(self, lowest=1e-6, decades=8):
+        self.lowest = lowest
+        self.counts = [0]*(decades*buckets_per_decade + 1)
+        self.total = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def add(self, value):
+        if value > self.lowest:
+            index = min(int(math.log10(value/self.lowest)*buckets_per_decade) + 1, len(self.counts)-1)
+        else:
+            index = 0
+        self.counts[index] += 1
+        self.total += 1
+        self.sum += value
+        self.max = max(self.max, value)
+
+    # upper edge of the bucket holding the given percentile
+    def percentile(self, p):
+        if self.total == 0:
+            return 0.0
+
+        target = self.total * p / 100
+        seen = 0
+        for index, count in enumerate(self.counts):
+            seen += count
+            if seen >= target:
+                return min(self.lowest * 10**(index/buckets_per_decade), self.max)
+        return self.max
+
+    def summary(self):
+        return {
+            "count": self.total,
+            "mean": self.sum / self.total if self.total > 0 else 0.0,
+            "p50": self.percentile(50),
+            "p90": self.percentile(90),
+            "p99": self.percentile(99),
+            "max": self.max,
+        }
+
+# counters, gauges and histograms shared by every stage
+# disabled by default, then each call returns straight away so hot paths can stay instrumented
+#     start = metrics.start()
+#     ...
+#     metrics.stop("imu.update", start)
+class Metrics:
+    def __init__(self):
+        self.enabled = False
+        self.lock = threading.Lock()
+        self.reset()
+
+    def enable(self, enabled=True):
+        self.enabled = enabled
+
+    def reset(self):
+        with self.lock:
+            self.counters = {}
+            self.gauges = {}
+            self.max_gauges = {}
+            self.histograms = {}
+            # (device time in ms, perf_counter) of the newest decoded sample
+            self.sample_clock = None
+            # device time minus the imu output time, see IMU.current_time
+            self.clock_offset = 0.0
+
+    def count(self, name, total=1):
+        if not self.enabled:
+            return
+        with self.lock:
+            self.counters[name] = self.counters.get(name, 0) + total
+
+    # latest value and the largest seen, e.g. queue depths
+    def gauge(self, name, value):
+        if not self.enabled:
+            return
+        with self.lock:
+            self.gauges[name] = value
+            self.max_gauges[name] = max(self.max_gauges.get(name, value), value)
+
+    def observe(self, name, value):
+        if not self.enabled:
+            return
+        with self.lock:
+            histogram = self.histograms.get(name)
+            if histogram is None:
+                histogram = self.histograms[name] = Histogram()
+            histogram.add(value)
+
+    def start(self):
+        if not self.enabled:
+            return 0.0
+        return time.perf_counter()
+
+    # duration in seconds since start, counted per call
+    def stop(self, name, start, total=1):
+        if not self.enabled:
+            return
+        self.observe(name, time.perf_counter() - start)
+        self.count(name, total)
+
+    # called by the reader with the device time of the newest sample
+    def mark_sample(self, device_time):
+        if not self.enabled:
+            return
+        self.sample_clock = (device_time, time.perf_counter())
+
+    # called by the imu so its output times can be matched to decoded samples
+    def set_clock_offset(self, offset):
+        if not self.enabled:
+            return
+        self.clock_offset = offset
+
+    # seconds since the sample at output_time, column 0 of the imu output, was decoded
+    def record_sample_age(self, name, output_time):
+        sample_clock = self.sample_clock
+        if not self.enabled or sample_clock is None:
+            return
+        newest_time, decode_time = sample_clock
+        device_time = output_time + self.clock_offset
+        age = (time.perf_counter() - decode_time) + (newest_time - device_time)/1000
+        self.observe(name, max(age, 0.0))
+
+    def snapshot(self):
+        with self.lock:
+            return {
+                "time": time.time(),
+                "counters": dict(self.counters),
+                "gauges": {name: {"value": value, "max": self.max_gauges[name]} for name, value in self.gauges.items()},
+                "histograms": {name: histogram.summary() for name, histogram in self.histograms.items()},
+            }
+
+    # one line per metric, durations in us, for text overlays and the console
+    def format_lines(self):
+        snapshot = self.snapshot()
+        lines = []
+        for name, summary in sorted(snapshot["histograms"].items()):
+            lines.append(
+                f"{name}: n={summary['count']} mean={1e6*summary['mean']:.1f}us "
+                f"p50={1e6*summary['p50']:.1f}us p99={1e6*summary['p99']:.1f}us max={1e6*summary['max']:.1f}us")
+        for name, gauge in sorted(snapshot["gauges"].items()):
+            lines.append(f"{name}: {gauge['value']} (max {gauge['max']})")
+        for name, value in sorted(snapshot["counters"].items()):
+            if name not in snapshot["histograms"]:
+                lines.append(f"{name}: {value}")
+        return lines
+
+# global instance used by the instrumented classes
+metrics = Metrics()
+
+# appends a json line snapshot of metrics to a file every interval seconds
+class MetricsWriter:
+    def __init__(self, filename, interval=1.0, source=metrics):
+        self.filename = filename
+        self.interval = interval
+        self.source = source
+
+        self.stop_event = threading.Event()
+        self.thread = threading.Thread(target=self.run, daemon=True)
+
+    # the last snapshot is written when the program exits
+    def start(self):
+        self.thread.start()
+        atexit.register(self.stop)
+
+    def run(self):
+        with open(self.filename, "a") as fp:
+            while not self.stop_event.wait(self.interval):
+                self.write(fp)
+            self.write(fp)
+
+    def write(self, fp):
+        fp.write(json.dumps(self.source.snapshot()) + "\n")
+        fp.flush()
+
+    def stop(self):
+        self.stop_event.set()
+        if self.thread.is_alive():
+            self.thread.join()
+
+# turn on the global metrics, with a filename they are also saved periodically
+def enable_metrics(filename=None, interval=1.0):
+    metrics.enable()
+    if filename is None:
+        return None
+
+    writer = MetricsWriter(filename, interval)
+    writer.start()
+    return writer
@@ -0,0 +1,207 @@
+import time
+import queue
+import threading
+import multiprocessing
+from collections import deque
+import numpy as np
+
+from .Calibrator import Calibrator
+from .Fusion import make_fusion
+from .IMU import IMU
+from .PacketFramer import PacketFramer
+from .TickUnwrapper import TickUnwrapper
+
+# maps a board's HAL_GetTick onto the host clock, both in ms
+# host = offset + rate*(tick - first tick)
+# rate is a least squares fit over recent blocks, offset is taken from the
+# lower envelope since transfer latency only ever makes packets arrive later
+class ClockSync:
+    def __init__(self, window=256, max_drift=1e-3):
+        self.ticks = deque([], maxlen=window)
+        self.host_times = deque([], maxlen=window)
+        self.max_drift = max_drift
+
+        self.rate = 1.0
+        self.offset = None
+        self.reference_tick = None
+        # aligned times never go backwards when the estimate changes
+        self.last_host_time = -np.inf
+
+    def update(self, tick, host_time):
+        if self.reference_tick is None:
+            self.reference_tick = tick
+
+        self.ticks.append(tick - self.reference_tick)
+        self.host_times.append(host_time)
+
+        ticks = np.array(self.ticks)
+        host_times = np.array(self.host_times)
+
+        if len(ticks) >= 8 and ticks[-1] > ticks[0]:
+            dx = ticks - ticks.mean()
+            dy = host_times - host_times.mean()
+            rate = np.sum(dx*dy) / np.sum(dx*dx)
+            self.rate = min(max(rate, 1-self.max_drift), 1+self.max_drift)
+
+        self.offset = np.min(host_times - self.rate*ticks)
+
+    def to_host(self, ticks):
+        host_times = self.offset + self.rate*(ticks - self.reference_tick)
+        host_times = np.maximum.accumulate(np.maximum(host_times, self.last_host_time))
+        self.last_host_time = host_times[-1]
+        return host_times
+
+# reads, calibrates and runs the imu for one device on a thread or process
+# puts (device, aligned times, imu output) blocks on output, then (device, None, None) when done
+# open_com must be picklable when running in a process, e.g. functools.partial(serial.Serial, ...)
+# fusion is the name of a quaternion filter, see Fusion.make_fusion
+def run_device(device, open_com, output, stop_event, calibration_samples=200, read_timeout=0.1, version=None, fusion=None, track_bias=False):
+    com = open_com()
+    com.timeout = read_timeout
+
+    framer = PacketFramer(version=version)
+    calibrator = Calibrator(calibration_samples, track_bias=track_bias)
+    imu = IMU(fusion=None if fusion is None else make_fusion(fusion))
+    clock = ClockSync()
+    unwrapper = TickUnwrapper()
+
+    try:
+        while not stop_event.is_set() and com.isOpen():
+            data = com.read(1)
+            total_waiting = com.in_waiting
+            if total_waiting > 0:
+                data += com.read(total_waiting)
+            host_time = time.perf_counter() * 1000
+
+            framer.feed(data)
+            block = framer.read_block()
+            if len(block) == 0:
+                continue
+
+            ticks = unwrapper.unwrap(block["time"])
+            clock.update(ticks[-1], host_time)
+
+            times, accel, gyro = calibrator.filter_block(ticks, block["accel"], block["gyro"])
+            if len(times) == 0:
+                continue
+
+            outputs = imu.update_block(times, accel, gyro)
+            output.put((device, clock.to_host(times), outputs))
+    finally:
+        output.put((device, None, None))
+        if hasattr(com, "close"):
+            com.close()
+
+# one reader per device with independent calibration and imu state
+# readings are merged into blocks sorted by host aligned time with columns
+#   aligned time (ms), device index, 25 imu columns
+# mode is "thread" or "process", processes keep the numpy work of each device off the consumer's GIL
+# version: packet version sent by the firmware of every device, None detects it per device, see PacketFramer
+# fusion and track_bias set up each device's IMU and Calibrator, fusion is a filter name
+class MultiDeviceReader:
+    modes = ("thread", "process")
+
+    def __init__(self, open_coms, mode="thread", calibration_samples=200, read_timeout=0.1, max_lag=100, startup_timeout=5000, version=None, fusion=None, track_bias=False):
+        if mode not in self.modes:
+            raise ValueError(f"Unknown mode {mode}, expected one of {self.modes}")
+        # fail here rather than in every worker
+        PacketFramer(version=version)
+        if fusion is not None:
+            make_fusion(fusion)
+
+        self.open_coms = open_coms
+        self.mode = mode
+        self.calibration_samples = calibration_samples
+        self.read_timeout = read_timeout
+        self.version = version
+        self.fusion = fusion
+        self.track_bias = track_bias
+        # ms to wait on a silent device before merging without it
+        self.max_lag = max_lag
+        # ms to wait for the first output of a device, covers process start and calibration
+        self.startup_timeout = startup_timeout
+
+        # rows older than ones already yielded, from devices that were not waited on
+        self.late_samples = 0
+
+        self.workers = []
+        self.output = None
+        self.stop_event = None
+
+    @property
+    def total_devices(self):
+        return len(self.open_coms)
+
+    def start(self):
+        if self.mode == "process":
+            self.output = multiprocessing.Queue()
+            self.stop_event = multiprocessing.Event()
+            worker_type = multiprocessing.Process
+        else:
+            self.output = queue.Queue()
+            self.stop_event = threading.Event()
+            worker_type = threading.Thread
+
+        for device, open_com in enumerate(self.open_coms):
+            args = (device, open_com, self.output, self.stop_event, self.calibration_samples, self.read_timeout, self.version, self.fusion, self.track_bias)
+            worker = worker_type(target=run_device, args=args, daemon=True)
+            worker.start()
+            self.workers.append(worker)
+
+    def stop(self):
+        self.stop_event.set()
+        for worker in self.workers:
+            worker.join()
+
+    def get_blocks(self):
+        width = 27
+        pending = np.empty((0, width))
+        latest_times = np.full(self.total_devices, -np.inf)
+        start_time = time.perf_counter() * 1000
+        last_seen = np.full(self.total_devices, start_time)
+        has_data = np.zeros(self.total_devices, dtype=bool)
+        last_yielded = -np.inf
+        is_running = np.ones(self.total_devices, dtype=bool)
+
+        while is_running.any() or len(pending) > 0:
+            try:
+                device, aligned_times, outputs = self.output.get(timeout=self.read_timeout)
+            except queue.Empty:
+                device = None
+
+            now = time.perf_counter() * 1000
+            if device is not None:
+                if aligned_times is None:
+                    is_running[device] = False
+                else:
+                    block = np.empty((len(outputs), width))
+                    block[:,0] = aligned_times
+                    block[:,1] = device
+                    block[:,2:] = outputs
+                    pending = np.concatenate((pending, block))
+                    latest_times[device] = aligned_times[-1]
+                    last_seen[device] = now
+                    has_data[device] = True
+
+            # rows up to the slowest running device can be put in order
+            # devices silent for longer than max_lag are not waited on
+            is_starting = ~has_data & (now - start_time < self.startup_timeout)
+            is_waited_on = is_running & ((now - last_seen < self.max_lag) | is_starting)
+            if is_waited_on.any():
+                watermark = np.min(latest_times[is_waited_on])
+            elif is_running.any():
+                watermark = now - self.max_lag
+            else:
+                watermark = np.inf
+
+            is_ready = pending[:,0] <= watermark
+            if not is_ready.any():
+                continue
+
+            ready = pending[is_ready]
+            pending = pending[~is_ready]
+            ready = ready[np.argsort(ready[:,0], kind="stable")]
+
+            self.late_samples += int(np.count_nonzero(ready[:,0] < last_yielded))
+            last_yielded = max(last_yielded, ready[-1,0])
+            yield ready
@@ -0,0 +1,322 @@
+import struct
+import zlib
+import numpy as np
+
+# big endian layout of TransmitPacket on the server
+# version 1 is the original packet without integrity checks
+packet_v1_dtype = np.dtype([
+    ("header", ">u2"),
+    ("time", ">u4"),
+    ("accel", ">f4", (3,)),
+    ("gyro", ">f4", (3,)),
+])
+
+# version 2 adds a sequence counter and a crc32 over every byte before it
+packet_v2_dtype = np.dtype([
+    ("header", ">u2"),
+    ("version", "u1"),
+    ("flags", "u1"),
+    ("sequence", ">u4"),
+    ("time", ">u4"),
+    ("accel", ">f4", (3,)),
+    ("gyro", ">f4", (3,)),
+    ("crc", ">u4"),
+])
+
+packet_dtype = packet_v2_dtype
+packet_dtypes = {1: packet_v1_dtype, 2: packet_v2_dtype}
+
+# crc of the stm32 crc unit, polynomial 0x04C11DB7, initial value 0xFFFFFFFF,
+# no reflection or final xor, over big endian words (CRC-32/MPEG-2)
+# zlib computes the reflected crc, feeding it bit reversed bytes and
+# reversing the result gives the same crc while staying in C code
+reverse_bits = bytes(int(f"{i:08b}"[::-1], 2) for i in range(256))
+reverse_bits_table = np.frombuffer(reverse_bits, dtype=np.uint8)
+
+def stm32_crc32(data):
+    crc = zlib.crc32(bytes(data).translate(reverse_bits)) ^ 0xFFFFFFFF
+    return int.from_bytes(crc.to_bytes(4, "little").translate(reverse_bits), "big")
+
+# crc of the first length bytes of each size byte record in data
+# bytes are reversed once for the whole batch, which is faster than a
+# vectorised table lookup per byte for the small blocks a serial read gives
+def stm32_crc32_block(data, size, length):
+    reflected = bytes(data).translate(reverse_bits)
+    total = len(reflected) // size
+    crc = np.fromiter(
+        (zlib.crc32(reflected[i:i+length]) for i in range(0, total*size, size)),
+        dtype=np.uint32, count=total)
+    crc ^= np.uint32(0xFFFFFFFF)
+
+    reversed_bytes = reverse_bits_table[crc.astype("<u4").view(np.uint8).reshape(total, 4)].astype(np.uint32)
+    return (reversed_bytes[:,0] << 24) | (reversed_bytes[:,1] << 16) | (reversed_bytes[:,2] << 8) | reversed_bytes[:,3]
+
+# splits a raw serial byte stream into packets
+# bytes are kept in a preallocated bytearray and decoded in place
+# version 2 packets are only accepted if their crc matches, a corrupt packet or a
+# header found inside a payload skips a byte and searches for the next header
+# version: packet version sent by the firmware, None detects it from the stream
+#   version 2 once a header starts a packet with a matching crc, version 1 once
+#   detect_packets headers follow each other at the version 1 packet size
+class PacketFramer:
+    header = b"\xba\x41"
+    packet_structs = {
+        1: struct.Struct(">HLffffff"),
+        2: struct.Struct(">HBBLLffffffL"),
+    }
+
+    def __init__(self, capacity=4096, version=None, detect_packets=4):
+        if version is not None and version not in self.packet_structs:
+            raise ValueError(f"Unknown packet version {version}, expected one of {tuple(self.packet_structs)}")
+
+        self.detect_packets = detect_packets
+        self.version = None
+        self.packet_dtype = packet_dtype
+        if version is not None:
+            self.set_version(version)
+        max_size = max(packet_struct.size for packet_struct in self.packet_structs.values())
+        capacity = max(capacity, 2*max_size)
+
+        self.buffer = bytearray(capacity)
+        self.view = memoryview(self.buffer)
+        self.start = 0
+        self.end = 0
+
+        self.total_packets = 0
+        self.skipped_bytes = 0
+        self.crc_failures = 0
+        # headers found inside a payload or garbage, not counted as crc failures
+        self.false_headers = 0
+        # sequence_gaps counts breaks in the sequence, lost_packets the packets missing in them
+        self.sequence_gaps = 0
+        self.lost_packets = 0
+        self.next_sequence = None
+
+    def set_version(self, version):
+        self.version = version
+        self.packet_struct = self.packet_structs[version]
+        self.packet_dtype = packet_dtypes[version]
+        self.packet_size = self.packet_struct.size
+
+    def __len__(self):
+        return self.end - self.start
+
+    def feed(self, data):
+        size = len(data)
+        if size == 0:
+            return
+
+        if self.end + size > len(self.buffer):
+            self.compact(size)
+
+        self.view[self.end:self.end+size] = data
+        self.end += size
+
+    # move unread bytes to the front, growing the buffer if they still dont fit
+    def compact(self, size):
+        remaining = self.end - self.start
+        capacity = len(self.buffer)
+
+        if remaining + size > capacity:
+            while remaining + size > capacity:
+                capacity *= 2
+            buffer = bytearray(capacity)
+            buffer[:remaining] = self.view[self.start:self.end]
+            self.view.release()
+            self.buffer = buffer
+            self.view = memoryview(self.buffer)
+        elif remaining > 0:
+            self.buffer[:remaining] = self.view[self.start:self.end]
+
+        self.start = 0
+        self.end = remaining
+
+    # move start to the next header, returns False if there is none
+    def find_header(self):
+        index = self.buffer.find(self.header, self.start, self.end)
+
+        # no header, only keep a trailing byte that could start one
+        if index < 0:
+            keep = 1 if self.buffer[self.end-1] == self.header[0] else 0
+            self.skipped_bytes += (self.end - keep) - self.start
+            self.start = self.end - keep
+            return False
+
+        self.skipped_bytes += index - self.start
+        self.start = index
+        return True
+
+    # a header that isnt the start of a valid packet
+    def skip_false_header(self):
+        self.skipped_bytes += 1
+        self.start += 1
+
+    # a packet failing its crc is a corrupt packet if another header follows it,
+    # otherwise the header was part of a payload or garbage
+    # returns False while the bytes after the packet have not arrived
+    def reject_packet(self):
+        following = self.start + self.packet_size
+        if following + len(self.header) > self.end:
+            return False
+
+        if self.buffer[following:following+len(self.header)] == self.header:
+            self.crc_failures += 1
+        else:
+            self.false_headers += 1
+        self.skip_false_header()
+        return True
+
+    # sets the version from the first packets, returns False until it is known
+    # bytes before the first packet are skipped
+    def detect_version(self):
+        v1_size = self.packet_structs[1].size
+        v2_size = self.packet_structs[2].size
+
+        while self.end - self.start >= len(self.header) and self.find_header():
+            if self.end - self.start < v2_size:
+                return False
+            _, version, *_, crc = self.packet_structs[2].unpack_from(self.buffer, self.start)
+            if version == 2 and crc == stm32_crc32(self.view[self.start:self.start+v2_size-4]):
+                self.set_version(2)
+                return True
+
+            if self.end - self.start < self.detect_packets*v1_size:
+                return False
+            headers = [self.start + i*v1_size for i in range(1, self.detect_packets)]
+            if all(self.buffer[i:i+len(self.header)] == self.header for i in headers):
+                self.set_version(1)
+                return True
+
+            self.skip_false_header()
+        return False
+
+    # sequence numbers of a block of accepted packets, see read_packets for a single packet
+    def update_sequence(self, sequences):
+        # usual case of no gaps without any array operations
+        first, last = int(sequences[0]), int(sequences[-1])
+        if self.next_sequence in (None, first) and ((last - first) & 0xFFFFFFFF) == len(sequences) - 1:
+            self.next_sequence = (last + 1) & 0xFFFFFFFF
+            return
+
+        sequences = np.asarray(sequences, dtype=np.uint32)
+        if self.next_sequence is not None:
+            previous = np.uint32((self.next_sequence - 1) & 0xFFFFFFFF)
+            sequences = np.concatenate(([previous], sequences)).astype(np.uint32)
+
+        # difference of 1 between consecutive packets, wrapping at 2^32
+        missing = np.diff(sequences) - np.uint32(1)
+        missing = missing[missing != 0]
+        self.sequence_gaps += len(missing)
+        # a backwards jump is a device reset rather than lost packets
+        self.lost_packets += int(missing[missing < (1 << 31)].sum())
+        self.next_sequence = (int(sequences[-1]) + 1) & 0xFFFFFFFF
+
+    # yields (read_time, accel_x, accel_y, accel_z, gyro_x, gyro_y, gyro_z)
+    def read_packets(self):
+        if self.version is None and not self.detect_version():
+            return
+
+        while self.end - self.start >= self.packet_size:
+            if not self.find_header():
+                break
+            if self.end - self.start < self.packet_size:
+                break
+
+            packet = self.packet_struct.unpack_from(self.buffer, self.start)
+            if self.version == 1:
+                self.start += self.packet_size
+                self.total_packets += 1
+                yield packet[1:]
+                continue
+
+            _, version, _, sequence, *reading, crc = packet
+            if version != self.version:
+                self.false_headers += 1
+                self.skip_false_header()
+                continue
+            if crc != stm32_crc32(self.view[self.start:self.start+self.packet_size-4]):
+                if not self.reject_packet():
+                    break
+                continue
+
+            self.start += self.packet_size
+            self.total_packets += 1
+            if self.next_sequence is not None and sequence != self.next_sequence:
+                self.sequence_gaps += 1
+                missing = (sequence - self.next_sequence) & 0xFFFFFFFF
+                if missing < (1 << 31):
+                    self.lost_packets += missing
+            self.next_sequence = (sequence + 1) & 0xFFFFFFFF
+            yield tuple(reading)
+
+        self.reset_if_empty()
+
+    # decode every aligned packet currently buffered into one structured array
+    # empty until the version is known, with the version 2 dtype
+    def read_block(self):
+        if self.version is None and not self.detect_version():
+            return np.empty(0, dtype=self.packet_dtype)
+
+        blocks = []
+        header_id = int.from_bytes(self.header, "big")
+
+        while self.end - self.start >= self.packet_size:
+            if not self.find_header():
+                break
+
+            total = (self.end - self.start) // self.packet_size
+            if total == 0:
+                break
+
+            packets = np.frombuffer(self.buffer, dtype=self.packet_dtype, count=total, offset=self.start)
+            # take the run of packets up to the first misaligned header
+            is_invalid = packets["header"] != header_id
+            if self.version > 1:
+                is_invalid |= packets["version"] != self.version
+            if is_invalid.any():
+                total = int(is_invalid.argmax())
+                packets = packets[:total]
+
+            if total > 0 and self.version > 1:
+                total = self.check_crc(total)
+                packets = packets[:total]
+                # failures after the first packet are counted once the search reaches them
+                if total == 0:
+                    if not self.reject_packet():
+                        break
+                    continue
+
+            if total == 0:
+                self.false_headers += 1
+                self.skip_false_header()
+                continue
+
+            # copy since the bytearray gets reused
+            blocks.append(packets.copy())
+            self.start += total*self.packet_size
+            self.total_packets += total
+            if self.version > 1:
+                self.update_sequence(packets["sequence"])
+
+        self.reset_if_empty()
+
+        if len(blocks) == 0:
+            return np.empty(0, dtype=self.packet_dtype)
+        if len(blocks) == 1:
+            return blocks[0]
+        return np.concatenate(blocks)
+
+    # number of leading packets with a matching crc
+    # the crc over a whole packet, including its own big endian crc, is 0
+    def check_crc(self, total):
+        size = self.packet_size
+        reflected = self.view[self.start:self.start+total*size].tobytes().translate(reverse_bits)
+        for i in range(total):
+            if zlib.crc32(reflected[i*size:(i+1)*size]) != 0xFFFFFFFF:
+                return i
+        return total
+
+    def reset_if_empty(self):
+        if self.start == self.end:
+            self.start = 0
+            self.end = 0
@@ -0,0 +1,133 @@
+import itertools
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+import numpy as np
+
+from .Calibrator import Calibrator
+from .Fusion import make_fusion
+from .IMU import IMU
+from .Resampler import Resampler
+from .SampleClock import SampleClock
+
+parameter_names = ("alpha", "accel_cutoff", "gyro_cutoff", "calibration_samples")
+
+# every combination of the given values, e.g. make_grid(alpha=[0.9, 0.96], ...)
+def make_grid(**values):
+    names = [name for name in parameter_names if name in values]
+    return [dict(zip(names, combination)) for combination in itertools.product(*(values[name] for name in names))]
+
+# ranges maps a parameter to (low, high), calibration_samples is drawn as an integer
+def make_random(ranges, total, seed=0):
+    rng = np.random.default_rng(seed)
+    configs = []
+    for _ in range(total):
+        config = {}
+        for name, (low, high) in ranges.items():
+            if name == "calibration_samples":
+                config[name] = int(rng.integers(low, high+1))
+            else:
+                config[name] = float(rng.uniform(low, high))
+        configs.append(config)
+    return configs
+
+# run calibration and the imu over (N,7) sensor rows with one configuration
+# config may also name a quaternion "fusion" filter, see Fusion.make_fusion
+# "reconstruct_time" smooths the tick timestamps with a SampleClock and "resample_rate"
+# interpolates the calibrated readings onto a fixed rate in Hz
+def process(sensor_data, config):
+    calibrator = Calibrator(config.get("calibration_samples", 200))
+    fusion = config.get("fusion")
+    imu = IMU(
+        alpha=config.get("alpha", 0.96),
+        accel_cutoff=config.get("accel_cutoff", 20),
+        gyro_cutoff=config.get("gyro_cutoff", 100),
+        fusion=None if fusion is None else make_fusion(fusion))
+
+    times = sensor_data[:,0]
+    if config.get("reconstruct_time"):
+        times = SampleClock().update_block(times)
+    times, accel, gyro = calibrator.filter_block(times, sensor_data[:,1:4], sensor_data[:,4:7])
+    if config.get("resample_rate") is not None:
+        times, accel, gyro = Resampler(config["resample_rate"]).filter_block(times, accel, gyro)
+    return imu.update_block(times, accel, gyro)
+
+metric_names = ("drift", "yaw_drift", "noise", "gyro_drift", "gyro_noise")
+
+# quality of the filtered orientation (columns 7:10), lower is better
+#   drift: slope of a linear fit in deg/s, roll and pitch only since yaw is gyro only
+#   yaw_drift: same for yaw
+#   noise: std of sample to sample changes in deg, roll and pitch
+# the complementary filter integrates the raw gyro, so gyro_cutoff only shows in the
+# low pass gyro orientation (columns 16:19)
+#   gyro_drift: mean slope in deg/s over all three axes
+#   gyro_noise: std of sample to sample changes in deg over all three axes
+def get_metrics(outputs):
+    if len(outputs) < 2:
+        return {name: np.nan for name in metric_names}
+
+    seconds = outputs[:,0] / 1000
+    orientation = outputs[:,7:10]
+    gyro_orientation = outputs[:,16:19]
+    slopes = np.polyfit(seconds - seconds.mean(), np.hstack((orientation, gyro_orientation)), 1)[0]
+    noise = np.std(np.diff(orientation[:,1:3], axis=0), axis=0)
+    gyro_noise = np.std(np.diff(gyro_orientation, axis=0), axis=0)
+
+    return {
+        "drift": float(np.abs(slopes[1:3]).mean()),
+        "yaw_drift": float(abs(slopes[0])),
+        "noise": float(noise.mean()),
+        "gyro_drift": float(np.abs(slopes[3:6]).mean()),
+        "gyro_noise": float(gyro_noise.mean()),
+    }
+
+def evaluate(sensor_data, config):
+    return dict(config, **get_metrics(process(sensor_data, config)))
+
+# worker processes attach to the shared sensor array once instead of unpickling it per task
+worker_memory = None
+worker_data = None
+
+def init_worker(name, shape):
+    global worker_memory, worker_data
+    worker_memory = shared_memory.SharedMemory(name=name)
+    worker_data = np.ndarray(shape, dtype=np.float64, buffer=worker_memory.buf)
+
+def evaluate_worker(config):
+    return evaluate(worker_data, config)
+
+# evaluate configs over (N,7) sensor rows on a process pool
+# returns one dict of parameters and metrics per config, in the order given
+def run_sweep(sensor_data, configs, workers=None):
+    sensor_data = np.ascontiguousarray(sensor_data, dtype=np.float64)
+    if workers == 1:
+        return [evaluate(sensor_data, config) for config in configs]
+
+    memory = shared_memory.SharedMemory(create=True, size=sensor_data.nbytes)
+    shared_data = None
+    try:
+        shared_data = np.ndarray(sensor_data.shape, dtype=np.float64, buffer=memory.buf)
+        shared_data[:] = sensor_data
+
+        initargs = (memory.name, sensor_data.shape)
+        with ProcessPoolExecutor(max_workers=workers, initializer=init_worker, initargs=initargs) as executor:
+            return list(executor.map(evaluate_worker, configs))
+    finally:
+        del shared_data
+        memory.close()
+        memory.unlink()
+
+# sort results by the sum of the given metrics, each scaled by its median
+# a metric whose median is zero or nan is left unscaled
+def rank_results(results, metrics=("drift", "noise", "gyro_noise")):
+    scales = {}
+    for metric in metrics:
+        values = np.array([result[metric] for result in results], dtype=np.float64)
+        scale = np.nanmedian(values) if np.isfinite(values).any() else np.nan
+        scales[metric] = scale if np.isfinite(scale) and scale != 0 else 1.0
+
+    def score(result):
+        return sum(result[metric] / scales[metric] for metric in metrics)
+
+    for result in results:
+        result["score"] = score(result)
+    return sorted(results, key=lambda result: result["score"])
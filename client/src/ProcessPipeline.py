@@ -0,0 +1,135 @@
+import time
+import multiprocessing
+import numpy as np
+
+from .Calibrator import Calibrator
+from .Fusion import make_fusion
+from .IMU import IMU
+from .PacketFramer import PacketFramer
+from .SharedRingBuffer import SharedRingBuffer
+
+# reader process: serial port -> (N,7) rows of time, accel, gyro
+def run_reader(open_com, raw_ring, stop_event, read_timeout, version=None):
+    com = open_com()
+    com.timeout = read_timeout
+    framer = PacketFramer(version=version)
+
+    try:
+        while not stop_event.is_set() and com.isOpen():
+            data = com.read(1)
+            total_waiting = com.in_waiting
+            if total_waiting > 0:
+                data += com.read(total_waiting)
+            # bytes left in the serial buffer show if this process falls behind
+            raw_ring.set_producer_backlog(com.in_waiting)
+
+            framer.feed(data)
+            block = framer.read_block()
+            if len(block) == 0:
+                continue
+
+            rows = np.empty((len(block), 7))
+            rows[:,0] = block["time"]
+            rows[:,1:4] = block["accel"]
+            rows[:,4:7] = block["gyro"]
+            raw_ring.put(rows, stop_event=stop_event, poll_interval=read_timeout)
+    finally:
+        raw_ring.close()
+        if hasattr(com, "close"):
+            com.close()
+
+# processing process: calibration and imu, (N,7) rows -> (N,25) rows
+def run_processor(raw_ring, output_ring, calibration_samples, imu_parameters, read_timeout, fusion=None, track_bias=False):
+    calibrator = Calibrator(calibration_samples, track_bias=track_bias)
+    imu = IMU(*imu_parameters, fusion=None if fusion is None else make_fusion(fusion))
+
+    try:
+        while True:
+            rows = raw_ring.get(timeout=read_timeout)
+            if len(rows) == 0:
+                if raw_ring.is_closed and len(raw_ring) == 0:
+                    return
+                continue
+
+            times, accel, gyro = calibrator.filter_block(rows[:,0], rows[:,1:4], rows[:,4:7])
+            if len(times) > 0:
+                output_ring.put(imu.update_block(times, accel, gyro))
+    finally:
+        output_ring.close()
+
+# reader and processing each run in their own process so a slow consumer,
+# e.g. the gui, cannot hold the gil while packets are decoded
+# stages are connected by shared memory ring buffers, the output ring drops
+# rows when full so the consumer never blocks ingest
+# open_com must be picklable, e.g. functools.partial(serial.Serial, ...)
+# version: packet version sent by the firmware, None detects it, see PacketFramer
+# fusion and track_bias set up the IMU and Calibrator, fusion is a filter name
+# stop_timeout: seconds stop waits for each process before terminating it
+class ProcessPipeline:
+    def __init__(self, open_com, calibration_samples=200, imu_parameters=(), capacity=1 << 16, read_timeout=0.1, version=None, fusion=None, track_bias=False, stop_timeout=2.0):
+        # fail here rather than in the worker processes
+        PacketFramer(version=version)
+        if fusion is not None:
+            make_fusion(fusion)
+        self.open_com = open_com
+        self.calibration_samples = calibration_samples
+        self.imu_parameters = tuple(imu_parameters)
+        self.read_timeout = read_timeout
+        self.version = version
+        self.fusion = fusion
+        self.track_bias = track_bias
+        self.stop_timeout = stop_timeout
+
+        self.raw_ring = SharedRingBuffer(capacity, 7, overflow="block")
+        self.output_ring = SharedRingBuffer(capacity, 25, overflow="drop")
+        self.stop_event = multiprocessing.Event()
+        self.processes = []
+
+    def start(self):
+        self.processes = [
+            multiprocessing.Process(
+                target=run_reader,
+                args=(self.open_com, self.raw_ring, self.stop_event, self.read_timeout, self.version),
+                daemon=True),
+            multiprocessing.Process(
+                target=run_processor,
+                args=(self.raw_ring, self.output_ring, self.calibration_samples, self.imu_parameters, self.read_timeout, self.fusion, self.track_bias),
+                daemon=True),
+        ]
+        for process in self.processes:
+            process.start()
+
+    def stop(self):
+        self.stop_event.set()
+        for process in self.processes:
+            process.join(self.stop_timeout)
+            # a stalled process is not left holding the shared memory
+            if process.is_alive():
+                process.terminate()
+                process.join()
+        self.raw_ring.release()
+        self.output_ring.release()
+
+    # (N,25) imu output blocks until the pipeline finishes
+    def get_blocks(self):
+        while True:
+            rows = self.output_ring.get(timeout=self.read_timeout)
+            if len(rows) > 0:
+                yield rows
+            elif len(self.output_ring) == 0 and (self.output_ring.is_closed or not self.is_processing()):
+                return
+
+    # false once the processing process has exited, even if it died without closing its ring
+    def is_processing(self):
+        return len(self.processes) == 0 or self.processes[1].is_alive()
+
+    # queue depth of each stage, in bytes for the serial port and rows for the rings
+    def get_stats(self):
+        return {
+            "serial_backlog": self.raw_ring.get_producer_backlog(),
+            "raw_depth": len(self.raw_ring),
+            "raw_max_depth": self.raw_ring.max_depth,
+            "output_depth": len(self.output_ring),
+            "output_max_depth": self.output_ring.max_depth,
+            "output_dropped": self.output_ring.dropped,
+        }
@@ -1,43 +1,141 @@
-from matplotlib import pyplot as plt 
+from matplotlib import pyplot as plt
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.figure import Figure
 import numpy as np
 from matplotlib.ticker import AutoMinorLocator, MultipleLocator
-import threading
-import time
+import os
 
 from .DataBuffer import DataBuffer
+from .Metrics import metrics
 
-# Visualiser using matplotlib - Very slow
+# Visualiser using matplotlib - slower than QtVisualiser
+# blit: keep the axes as a cached background and only draw the lines each frame
+#   with a DataBuffer the x limits move a page_fraction of the window ahead at a time,
+#   the background is only redrawn then
+# offscreen: draw on an Agg canvas without a window, for save_frames on a headless machine
+# figsize: (width, height) in inches
 class PyPlotVisualiser:
-    def __init__(self, buffer=[]):
+    def __init__(self, buffer=[], blit=True, offscreen=False, fps=60, page_fraction=0.25, figsize=None):
         self.buffer = buffer
-        self.figure = AccelFigure()
-    
+        self.offscreen = offscreen
+        self.fps = fps
+        self.figure = AccelFigure(blit=blit and not offscreen, offscreen=offscreen, page_fraction=page_fraction, figsize=figsize)
+
+        self.frame = None
+        self.total_rendered = None
+        self.timer = None
+
+    # matplotlib can only draw from the gui thread, so frames are drawn by a timer on
+    # the event loop while readings are pushed from other threads
     def start_threaded(self):
-        if len(self.buffer) == 0:
-            return
+        if self.offscreen:
+            raise ValueError("Offscreen visualiser has no window, use save_frames")
+
+        self.redraw()
+        self.timer = self.figure.figure.canvas.new_timer(interval=int(1000/self.fps))
+        self.timer.add_callback(self.render)
+        self.timer.start()
+        plt.show()
 
-        update_time = 1000/60
-        while True:
-            self.redraw()
-            time.sleep(update_time)
-    
     def start(self):
+        if self.offscreen:
+            raise ValueError("Offscreen visualiser has no window, use save_frames")
+
         self.redraw()
-        self.figure.show()
         plt.show()
-    
+
+    # skip frames when no new data arrived
+    def render(self):
+        if isinstance(self.buffer, DataBuffer):
+            total_appended = self.buffer.end
+        else:
+            total_appended = len(self.buffer)
+
+        if total_appended == self.total_rendered:
+            return
+        self.total_rendered = total_appended
+        self.redraw()
+
     def redraw(self):
-        self.figure.update(self.buffer)
+        start = metrics.start()
+        data = self.get_data()
+        if len(data) > 0:
+            metrics.record_sample_age("visualiser.sample_age", data[-1,0])
+        self.figure.update(data, self.get_time_window())
         self.figure.redraw()
-    
+        metrics.stop("visualiser.redraw", start)
+
+    # ms shown at once, None shows all the data
+    def get_time_window(self):
+        if isinstance(self.buffer, DataBuffer):
+            return self.buffer.time_window * 1000
+        return None
+
+    # ring buffers are copied into a reused frame instead of a new array
+    def get_data(self):
+        if not isinstance(self.buffer, DataBuffer):
+            return np.asarray(self.buffer).reshape(-1, 25)
+
+        if self.frame is None or len(self.frame) < self.buffer.capacity:
+            self.frame = np.empty((self.buffer.capacity, self.buffer.width))
+        total = self.buffer.snapshot_into(self.frame)
+        return self.frame[:total]
+
     def push_data(self, data):
         self.buffer.append(data)
 
+    # render a window of window seconds sliding over the data, e.g. a processed recording
+    # output is a directory of numbered pngs, or a .gif or .mp4 file (mp4 needs ffmpeg)
+    # returns the number of frames written
+    def save_frames(self, output, window=5.0, fps=30, dpi=100):
+        data = self.get_data()
+        if len(data) == 0:
+            return 0
+
+        times = data[:,0]
+        ends = np.arange(times[0] + 1000/fps, times[-1] + 1000/fps, 1000/fps)
+        starts = np.searchsorted(times, ends - window*1000, side='left')
+        stops = np.searchsorted(times, ends, side='right')
+
+        # lines are animated when blitting, which leaves them out of saved figures
+        blit = self.figure.blit
+        self.figure.set_blit(False)
+        try:
+            if output.endswith((".gif", ".mp4")):
+                self.save_video(output, data, starts, stops, window, fps, dpi)
+            else:
+                self.save_pngs(output, data, starts, stops, window, dpi)
+        finally:
+            self.figure.set_blit(blit)
+        return len(ends)
+
+    def save_pngs(self, directory, data, starts, stops, window, dpi):
+        os.makedirs(directory, exist_ok=True)
+        for i, (start, stop) in enumerate(zip(starts, stops)):
+            self.figure.update(data[start:stop], window*1000)
+            self.figure.figure.savefig(os.path.join(directory, f"frame_{i:05d}.png"), dpi=dpi)
+
+    def save_video(self, filename, data, starts, stops, window, fps, dpi):
+        from matplotlib import animation
+        if filename.endswith(".gif"):
+            writer = animation.PillowWriter(fps=fps)
+        else:
+            writer = animation.FFMpegWriter(fps=fps)
+
+        with writer.saving(self.figure.figure, filename, dpi):
+            for start, stop in zip(starts, stops):
+                self.figure.update(data[start:stop], window*1000)
+                writer.grab_frame()
+
 class AccelFigure:
-    def __init__(self):
-        self.figure = plt.figure()
-        x = []
-        y = []
+    def __init__(self, blit=True, offscreen=False, page_fraction=0.25, figsize=None):
+        if offscreen:
+            self.figure = Figure(figsize=figsize)
+            FigureCanvasAgg(self.figure)
+        else:
+            self.figure = plt.figure(figsize=figsize)
+
+        self.page_fraction = page_fraction if blit else 0.0
 
         subplot = self.figure.add_subplot(131)
         subplot.set_ylim([-15, 15])
@@ -72,47 +170,93 @@ class AccelFigure:
 
         self.orientation_subplot = Subplot(subplot)
 
+        self.subplots = [self.accel_subplot, self.gyro_subplot, self.orientation_subplot]
+
+        # axes without the lines, captured after every full draw
+        self.background = None
+        self.needs_draw = True
+        self.figure.canvas.mpl_connect("draw_event", self.on_draw)
+        self.set_blit(blit)
+
+    def set_blit(self, blit):
+        self.blit = blit
+        for subplot in self.subplots:
+            for line in subplot.lines:
+                line.set_animated(blit)
+        self.needs_draw = True
+
     def show(self):
         self.figure.show()
 
-    def update(self, data):
-        self.update_data(data)
-    
+    # time_window in ms, None fits the x limits to the data
+    def update(self, data, time_window=None):
+        self.update_data(data, time_window)
+
     def redraw(self):
-        self.figure.canvas.draw()
-        self.figure.canvas.flush_events() 
-    
-    def update_data(self, data):
-        data = np.array(data)
+        canvas = self.figure.canvas
+        if not self.blit or self.background is None or self.needs_draw:
+            # on_draw caches the new background and draws the lines over it
+            self.needs_draw = False
+            canvas.draw()
+        else:
+            canvas.restore_region(self.background)
+            self.draw_lines()
+
+        if self.blit:
+            canvas.blit(self.figure.bbox)
+        canvas.flush_events()
+
+    def on_draw(self, event):
+        if not self.blit:
+            return
+        self.background = self.figure.canvas.copy_from_bbox(self.figure.bbox)
+        self.draw_lines()
+
+    def draw_lines(self):
+        for subplot in self.subplots:
+            for line in subplot.lines:
+                subplot.subplot.draw_artist(line)
+
+    def update_data(self, data, time_window=None):
+        if len(data) == 0:
+            return
         x = data[:,0]
 
         accel_data = data[:,1:4]
         gyro_data = data[:,4:7]
         orientation_data = data[:,7:10]
 
-        self.accel_subplot.update_data(x, accel_data)
-        self.gyro_subplot.update_data(x, gyro_data)
-        self.orientation_subplot.update_data(x, orientation_data)
+        for subplot, y in zip(self.subplots, (accel_data, gyro_data, orientation_data)):
+            if subplot.update_data(x, y, time_window, self.page_fraction):
+                self.needs_draw = True
 
 
 class Subplot:
     def __init__(self, subplot, total_axes=3):
         self.subplot = subplot
-        self.total_axes = 3
-        self.lines = [self.subplot.plot([], [])[0] for _ in range(3)]
-    
-    def update_data(self, x, y):
-        if len(x) == 0:
-            return
+        self.total_axes = total_axes
+        self.lines = [self.subplot.plot([], [])[0] for _ in range(total_axes)]
+        self.xlim = None
 
-        xlim = (x[0], x[-1])
-        self.subplot.set_xlim(xlim)
+    # returns True if the x limits changed, which needs a full redraw
+    # with a time_window the limits jump page_fraction of the window past the newest sample
+    def update_data(self, x, y, time_window=None, page_fraction=0.0):
+        if len(x) == 0:
+            return False
 
         for axis in range(self.total_axes):
-            line = self.lines[axis]
-            sub_y = y[:,axis]
-            line.set_xdata(x)
-            line.set_ydata(sub_y)
+            self.lines[axis].set_data(x, y[:,axis])
 
-        
+        if time_window is None:
+            xlim = (x[0], x[-1])
+        elif self.xlim is not None and self.xlim[0] <= x[-1] <= self.xlim[1] and page_fraction > 0:
+            xlim = self.xlim
+        else:
+            end = x[-1] + time_window*page_fraction
+            xlim = (end - time_window, end)
 
+        if xlim == self.xlim:
+            return False
+        self.xlim = xlim
+        self.subplot.set_xlim(xlim)
+        return True
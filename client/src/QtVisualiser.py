@@ -1,13 +1,23 @@
 import numpy as np
 import sys
+import time
 import pyqtgraph as pg
 from pyqtgraph.Qt import QtCore, QtGui
 
 from .DataBuffer import DataBuffer
+from .Metrics import metrics
+from .SpectrumAnalyser import channel_names
 
 class QtVisualiser:
-    def __init__(self, buffer=[]):
+    # decimate: min/max downsample ring buffers to the plot width
+    # live_panels: indices of the subplots to update, defaults to all 8
+    # show_metrics: text panel with the instrumentation metrics, see Metrics
+    # analyser: SpectrumAnalyser whose results are shown in a row of spectrum panels
+    def __init__(self, buffer=[], decimate=True, live_panels=None, show_metrics=False, metrics_interval=0.5, analyser=None):
         self.buffer = buffer
+        self.frame = None
+        self.decimate = decimate and isinstance(buffer, DataBuffer)
+        self.total_rendered = -1
 
         self.window = pg.GraphicsWindow() 
         self.window.setWindowTitle("Gyro data")
@@ -58,6 +68,36 @@ class QtVisualiser:
         plot.setLabel('left', 'Angular velocity (deg/s)')
         self.subplots.append(Subplot(plot))
 
+        if live_panels is None:
+            live_panels = range(len(self.subplots))
+        self.live_panels = sorted(set(live_panels))
+
+        for i, subplot in enumerate(self.subplots):
+            if i not in self.live_panels:
+                subplot.plot.hide()
+
+        self.decimators = [EnvelopeDecimator() for _ in self.subplots]
+
+        self.analyser = analyser
+        self.last_spectrum = None
+        if analyser is not None:
+            self.window.nextRow()
+            self.spectrum_subplots = []
+            for title, unit in (("Accelerometer spectrum", "g^2/Hz"), ("Gyroscope spectrum", "(deg/s)^2/Hz")):
+                plot = self.window.addPlot(title=title)
+                plot.setLabel('bottom', 'Frequency (Hz)')
+                plot.setLabel('left', f'Power spectral density ({unit})')
+                plot.setLogMode(y=True)
+                self.spectrum_subplots.append(Subplot(plot))
+            self.spectrum_label = self.window.addLabel(justify='left')
+
+        self.metrics_label = None
+        self.metrics_interval = metrics_interval
+        self.last_metrics_update = 0.0
+        if show_metrics:
+            self.window.nextRow()
+            self.metrics_label = self.window.addLabel(justify='left', colspan=3)
+
         self.timer = pg.QtCore.QTimer()
         self.timer.timeout.connect(self.render)
 
@@ -73,23 +113,101 @@ class QtVisualiser:
 
 
     def render(self):
-        if len(self.buffer) == 0:
+        start = metrics.start()
+        self.render_frame()
+        if self.analyser is not None:
+            self.render_spectrum()
+        metrics.stop("visualiser.render", start)
+        if self.metrics_label is not None:
+            self.update_metrics_label()
+
+    def update_metrics_label(self):
+        now = time.perf_counter()
+        if now - self.last_metrics_update < self.metrics_interval:
             return
+        self.last_metrics_update = now
+        self.metrics_label.setText("<br>".join(metrics.format_lines()), size='8pt')
+
+    def render_frame(self):
+        # skip frames when no new data arrived
+        if isinstance(self.buffer, DataBuffer):
+            total_appended = self.buffer.end
+        else:
+            total_appended = len(self.buffer)
 
-        data = np.array(self.buffer)
+        if total_appended == self.total_rendered:
+            return
+        self.total_rendered = total_appended
 
+        if self.decimate:
+            self.render_decimated()
+            return
+
+        data = self.get_data()
+        if len(data) == 0:
+            return
+        metrics.record_sample_age("visualiser.sample_age", data[-1,0])
+
+        # each panel plots 3 columns after the time column
+        # accel, gyro, filtered orientation
+        # unfiltered gyro orientation, gravity orientation, low pass gyro orientation
+        # low pass accel, low pass gyro
         x = data[:,0] # x data
-        data_format = [
-            3, 3, 3, # accel, gyro, filtered orientation 
-            3, 3, 3, # unfiltered gyro orientation, gravity orientation, low pass gyro orientation
-            3, 3     # low pass accel, low pass gyro
+        for i in self.live_panels:
+            y = data[:,1+3*i:4+3*i]
+            self.subplots[i].update_data(x, y)
+
+    # redrawn when the analyser publishes a new result
+    def render_spectrum(self):
+        result = self.analyser.get_result()
+        if result is None or result is self.last_spectrum:
+            return
+        self.last_spectrum = result
+
+        # log axis, empty bins would be -inf
+        psd = np.maximum(result["psd"], 1e-12)
+        frequencies = result["frequencies"]
+        self.spectrum_subplots[0].update_data(frequencies, psd[:,0:3])
+        self.spectrum_subplots[1].update_data(frequencies, psd[:,3:6])
+
+        lines = [
+            f"{name}: rms {rms:.4g} peak {peak:.1f} Hz"
+            for name, rms, peak in zip(channel_names, result["rms"], result["peak_frequency"])
         ]
+        self.spectrum_label.setText("<br>".join(lines), size='8pt')
+
+    # only the samples appended since the last frame are downsampled
+    def render_decimated(self):
+        first_index, data = self.buffer.indexed_view()
+        if len(data) == 0:
+            return
+        metrics.record_sample_age("visualiser.sample_age", data[-1,0])
+
+        x = data[:,0]
+        for i in self.live_panels:
+            subplot = self.subplots[i]
+            # sized from the rows in the window, which is fewer than the capacity while
+            # the buffer fills or at low sample rates
+            bucket_size = subplot.get_bucket_size(len(data))
+            y = data[:,1+3*i:4+3*i]
+            x_decimated, y_decimated = self.decimators[i].update(first_index, x, y, bucket_size)
+            subplot.update_data(x_decimated, y_decimated)
+
+    # ring buffers are copied into a reused frame instead of a new array
+    def get_data(self):
+        if not isinstance(self.buffer, DataBuffer):
+            return np.array(self.buffer)
 
-        i = 1
-        for plot, width in zip(self.subplots, data_format):
-            y = data[:,i:(i+width)]
-            plot.update_data(x, y)
-            i += width
+        if self.frame is None or len(self.frame) < self.buffer.capacity:
+            self.frame = np.empty((self.buffer.capacity, self.buffer.width))
+        total = self.buffer.snapshot_into(self.frame)
+        return self.frame[:total]
+
+    # replace the displayed data, e.g. a window of a replay
+    def set_data(self, data):
+        self.buffer = data
+        self.total_rendered = -1
+        self.render()
 
     def push_data(self, data):
         self.buffer.append(data)
@@ -112,8 +230,75 @@ class Subplot:
 
 
 
+    # samples per min/max bucket so the window fits in the plot width
+    # rounded down to a power of 2 so small resizes keep the cached buckets
+    def get_bucket_size(self, total_samples):
+        width = int(self.plot.getViewBox().width())
+        if width <= 0:
+            width = 1000
+
+        bucket_size = max(1, total_samples // width)
+        return 1 << (bucket_size.bit_length()-1)
+
     def update_data(self, x, y):
         for axis in range(self.total_axes):
             curve = self.curves[axis]
             sub_y = y[:,axis]
             curve.setData(x, sub_y)
+
+# min/max envelope of a ring buffer window
+# completed buckets are cached by absolute sample index so only new samples are processed
+class EnvelopeDecimator:
+    def __init__(self):
+        self.bucket_size = None
+        self.reset(0)
+
+    def reset(self, next_index):
+        self.next_index = next_index
+        self.first_bucket = next_index
+        self.x = np.empty(0)
+        self.y = np.empty((0, 3))
+
+    # x is (N,) and y is (N,3) for the window starting at absolute index first_index
+    def update(self, first_index, x, y, bucket_size):
+        end_index = first_index + len(x)
+        aligned_index = -(-first_index // bucket_size) * bucket_size
+
+        if bucket_size != self.bucket_size or self.next_index < first_index or self.next_index > end_index:
+            self.bucket_size = bucket_size
+            self.reset(aligned_index)
+
+        # drop buckets that left the window
+        if self.first_bucket < first_index:
+            total_dropped = -(-(first_index - self.first_bucket) // bucket_size)
+            self.x = self.x[2*total_dropped:]
+            self.y = self.y[2*total_dropped:]
+            self.first_bucket += total_dropped*bucket_size
+
+        # downsample newly completed buckets
+        complete_index = (end_index // bucket_size) * bucket_size
+        if complete_index > self.next_index:
+            start = self.next_index - first_index
+            end = complete_index - first_index
+            x_new, y_new = envelope(x[start:end], y[start:end], bucket_size)
+            self.x = np.concatenate((self.x, x_new))
+            self.y = np.concatenate((self.y, y_new))
+            self.next_index = complete_index
+
+        # the unfinished bucket is recomputed each frame
+        start = max(self.next_index, first_index) - first_index
+        if start >= len(x):
+            return self.x, self.y
+
+        x_tail, y_tail = envelope(x[start:], y[start:], len(x)-start)
+        return np.concatenate((self.x, x_tail)), np.concatenate((self.y, y_tail))
+
+# each bucket becomes 2 points, (first time, min) and (last time, max)
+def envelope(x, y, bucket_size):
+    total_buckets = len(x) // bucket_size
+    x = x[:total_buckets*bucket_size].reshape(total_buckets, bucket_size)
+    y = y[:total_buckets*bucket_size].reshape(total_buckets, bucket_size, y.shape[1])
+
+    x_envelope = np.stack((x[:,0], x[:,-1]), axis=1).reshape(-1)
+    y_envelope = np.stack((y.min(axis=1), y.max(axis=1)), axis=1).reshape(-1, y.shape[2])
+    return x_envelope, y_envelope
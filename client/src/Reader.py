@@ -1,66 +1,130 @@
 import time
-import struct
 import threading
 
-from collections import deque
-
+from .Metrics import metrics
+from .PacketFramer import PacketFramer
+from .SampleQueue import SampleQueue
 from .Vector3D import Vector3D
 
 class Reader:
-    def __init__(self, com):
+    # block_mode: yield structured arrays of packets instead of single readings
+    # blocking_reads: wait on the port with com.timeout instead of polling read_all
+    # max_queued, overflow: bound on queued items and what to do when full, see SampleQueue
+    # version: packet version sent by the firmware, None detects it, see PacketFramer
+    # rate_interval: seconds between updates of packets_per_second
+    def __init__(self, com, block_mode=False, blocking_reads=False, read_timeout=0.1, max_queued=None, overflow="block", version=None, rate_interval=1.0):
         self.com = com
         self.running = False
+        self.block_mode = block_mode
+        self.blocking_reads = blocking_reads
+        self.read_timeout = read_timeout
+
+        self.buffered_data = SampleQueue(max_queued, overflow)
+        self.framer = PacketFramer(version=version)
 
-        self.buffered_data = deque([])
+        self.rate_interval = rate_interval
+        self.rate_time = None
+        self.rate_packets = 0
+        self.packets_per_second = 0.0
 
         self.serial_thread = threading.Thread(target=self.start_read)
 
+    @property
+    def dropped_samples(self):
+        return self.buffered_data.dropped_samples
+
+    # link health, crc and sequence counts stay 0 for version 1 packets
+    # version is None until the packet version has been detected
+    def get_stats(self):
+        return {
+            "version": self.framer.version,
+            "packets": self.framer.total_packets,
+            "packets_per_second": self.packets_per_second,
+            "crc_failures": self.framer.crc_failures,
+            "false_headers": self.framer.false_headers,
+            "skipped_bytes": self.framer.skipped_bytes,
+            "sequence_gaps": self.framer.sequence_gaps,
+            "lost_packets": self.framer.lost_packets,
+            "dropped_samples": self.dropped_samples,
+        }
+
+    def update_rate(self):
+        now = time.perf_counter()
+        if self.rate_time is None:
+            self.rate_time = now
+            return
+
+        elapsed = now - self.rate_time
+        if elapsed >= self.rate_interval:
+            total_packets = self.framer.total_packets
+            self.packets_per_second = (total_packets - self.rate_packets) / elapsed
+            self.rate_packets = total_packets
+            self.rate_time = now
+
+    # wakes up as soon as the reader thread queues data
     def get_readings(self):
-        while self.running:
-            while len(self.buffered_data) > 0:
-                yield self.buffered_data.popleft()
-            time.sleep(0.001)
+        while True:
+            for data in self.buffered_data.get_all(timeout=self.read_timeout):
+                yield data
+
+            # readings decoded before the port closed are still yielded
+            if not self.running and len(self.buffered_data) == 0:
+                return
 
     def start(self):
         self.running = True
+        if self.blocking_reads:
+            self.com.timeout = self.read_timeout
         self.serial_thread.start()
 
     def stop(self):
         self.running = False
+        # unblock a reader thread waiting for space in the queue
+        self.buffered_data.close()
         self.serial_thread.join()
 
-    def start_read(self):
-        data_buffer = []
-        packet_format = ">HLffffff"
-        packet_size = struct.calcsize(packet_format)
-
-
+    def read_data(self):
+        if not self.blocking_reads:
+            return self.com.read_all()
 
-        header_id = 0xba41
+        # wait for at least one byte then take everything already waiting
+        data = self.com.read(1)
+        total_waiting = self.com.in_waiting
+        if total_waiting > 0:
+            data += self.com.read(total_waiting)
+        return data
 
+    def start_read(self):
         try:
             while self.com.isOpen() and self.running:
-                data = self.com.read_all()        
-                data_buffer.extend(data)
+                data = self.read_data()
+                start = metrics.start()
+                self.framer.feed(data)
+
+                if self.block_mode:
+                    block = self.framer.read_block()
+                    if len(block) > 0:
+                        metrics.mark_sample(block["time"][-1])
+                        self.buffered_data.put(block, len(block))
+                else:
+                    for packet in self.framer.read_packets():
+                        read_time, accel_x, accel_y, accel_z, gyro_x, gyro_y, gyro_z = packet
 
-                while len(data_buffer) >= packet_size:
-                    packet = struct.unpack(packet_format, bytes(data_buffer[:packet_size]))
-                    header, read_time, accel_x, accel_y, accel_z, gyro_x, gyro_y, gyro_z = packet
-                    # invalid header, move into next byte
-                    if header != header_id:
-                        data_buffer = data_buffer[1:]
-                        continue
+                        accel = Vector3D(accel_x, accel_y, accel_z)
+                        gyro = Vector3D(gyro_x, gyro_y, gyro_z)
 
-                    data_buffer = data_buffer[packet_size:]
-                    
-                    accel = Vector3D(accel_x, accel_y, accel_z)
-                    gyro = Vector3D(gyro_x, gyro_y, gyro_z)
+                        metrics.mark_sample(read_time)
+                        self.buffered_data.put([read_time, accel, gyro])
 
-                    data = [read_time, accel, gyro]
+                if data:
+                    metrics.stop("reader.decode", start)
+                    metrics.gauge("reader.queue_depth", len(self.buffered_data))
+                    metrics.count("reader.bytes", len(data))
 
-                    self.buffered_data.append(data)
+                self.update_rate()
 
-                if not data:
+                if not data and not self.blocking_reads:
                     time.sleep(0.001)
         finally:
-            self.running = False
\ No newline at end of file
+            self.running = False
+            self.buffered_data.close()
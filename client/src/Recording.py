@@ -0,0 +1,180 @@
+import os
+import struct
+import threading
+import numpy as np
+
+# binary recording of raw sensor readings
+# 64 byte header followed by fixed width little endian records
+recording_magic = b"MPU6050R"
+recording_version = 1
+
+header_struct = struct.Struct("<8sHHfff3f3fQ8x")
+
+record_dtype = np.dtype([
+    ("time", "<u4"),
+    ("accel", "<f4", (3,)),
+    ("gyro", "<f4", (3,)),
+])
+
+csv_header = "time accel_x accel_y accel_z gyro_x gyro_y gyro_z"
+
+# sample_rate is nominal (Hz), ranges are the configured full scale (g and deg/s)
+# offsets are the calibration results at the time of recording
+class RecordingHeader:
+    def __init__(self, sample_rate=500.0, accel_range=16.0, gyro_range=2000.0,
+                 accel_offset=(0, 0, 0), gyro_offset=(0, 0, 0), total_records=0):
+        self.sample_rate = sample_rate
+        self.accel_range = accel_range
+        self.gyro_range = gyro_range
+        self.accel_offset = tuple(accel_offset)
+        self.gyro_offset = tuple(gyro_offset)
+        self.total_records = total_records
+
+    def pack(self):
+        return header_struct.pack(
+            recording_magic, recording_version, record_dtype.itemsize,
+            self.sample_rate, self.accel_range, self.gyro_range,
+            *self.accel_offset, *self.gyro_offset,
+            self.total_records)
+
+    @classmethod
+    def unpack(cls, data):
+        fields = header_struct.unpack(data[:header_struct.size])
+        magic, version, record_size = fields[:3]
+        if magic != recording_magic:
+            raise ValueError("Not a recording, header magic does not match")
+        if version != recording_version or record_size != record_dtype.itemsize:
+            raise ValueError(f"Unsupported recording version {version} with {record_size} byte records")
+
+        sample_rate, accel_range, gyro_range = fields[3:6]
+        return cls(sample_rate, accel_range, gyro_range, fields[6:9], fields[9:12], fields[12])
+
+def is_recording(filename):
+    with open(filename, "rb") as fp:
+        return fp.read(len(recording_magic)) == recording_magic
+
+# convert (N,7) rows of time, accel, gyro into records
+def rows_to_records(rows):
+    rows = np.asarray(rows)
+    records = np.empty(len(rows), dtype=record_dtype)
+    records["time"] = rows[:,0]
+    records["accel"] = rows[:,1:4]
+    records["gyro"] = rows[:,4:7]
+    return records
+
+# convert records or decoded packet blocks into (N,7) float rows
+def records_to_rows(records):
+    rows = np.empty((len(records), 7))
+    rows[:,0] = records["time"]
+    rows[:,1:4] = records["accel"]
+    rows[:,4:7] = records["gyro"]
+    return rows
+
+def read_recording(filename):
+    with open(filename, "rb") as fp:
+        header = RecordingHeader.unpack(fp.read(header_struct.size))
+        records = np.fromfile(fp, dtype=record_dtype)
+    return header, records
+
+# records are paged in from disk as they are accessed
+# a partial record left by an interrupted write is ignored, as in read_recording
+def map_recording(filename):
+    with open(filename, "rb") as fp:
+        header = RecordingHeader.unpack(fp.read(header_struct.size))
+    total = (os.path.getsize(filename) - header_struct.size) // record_dtype.itemsize
+    records = np.memmap(filename, dtype=record_dtype, mode="r", offset=header_struct.size, shape=(total,))
+    return header, records
+
+def write_recording(filename, records, header=None):
+    header = header or RecordingHeader()
+    header.total_records = len(records)
+    with open(filename, "wb") as fp:
+        fp.write(header.pack())
+        fp.write(np.asarray(records, dtype=record_dtype).tobytes())
+
+# load either a recording or a csv from save_data.py as (N,7) rows
+def load_sensor_data(filename):
+    if is_recording(filename):
+        return records_to_rows(read_recording(filename)[1])
+    return np.loadtxt(filename, skiprows=1, ndmin=2)
+
+def save_csv(filename, rows):
+    np.savetxt(filename, rows, fmt=["%d"] + ["%+f"]*6, header=csv_header, comments="")
+
+# writes readings on a background thread with large buffered writes
+# so the ingest thread only appends to a list
+class RecordingWriter:
+    def __init__(self, filename, header=None, buffer_size=1 << 20, flush_interval=0.5):
+        self.header = header or RecordingHeader()
+        self.flush_interval = flush_interval
+
+        self.fp = open(filename, "wb", buffering=buffer_size)
+        self.fp.write(self.header.pack())
+
+        self.pending = []
+        self.lock = threading.Lock()
+        self.has_pending = threading.Condition(self.lock)
+        self.closed = False
+
+        self.thread = threading.Thread(target=self.run)
+        self.thread.start()
+
+    # block is a decoded packet block or array of records
+    def write_block(self, block):
+        with self.lock:
+            self.pending.append(block)
+            self.has_pending.notify()
+
+    # single reading as yielded by Reader
+    def write(self, read_time, accel, gyro):
+        with self.lock:
+            self.pending.append((read_time, *accel, *gyro))
+
+    def set_calibration(self, accel_offset, gyro_offset):
+        self.header.accel_offset = tuple(accel_offset)
+        self.header.gyro_offset = tuple(gyro_offset)
+
+    def run(self):
+        while True:
+            with self.lock:
+                if not self.closed:
+                    self.has_pending.wait(self.flush_interval)
+                pending = self.pending
+                self.pending = []
+                closed = self.closed
+
+            self.write_pending(pending)
+            if closed:
+                return
+
+    def write_pending(self, pending):
+        rows = []
+        for item in pending:
+            if isinstance(item, tuple):
+                rows.append(item)
+                continue
+
+            if len(rows) > 0:
+                self.write_records(rows_to_records(rows))
+                rows = []
+            self.write_records(item)
+
+        if len(rows) > 0:
+            self.write_records(rows_to_records(rows))
+
+    def write_records(self, records):
+        if records.dtype != record_dtype:
+            records = rows_to_records(records_to_rows(records))
+        self.fp.write(records.tobytes())
+        self.header.total_records += len(records)
+
+    # flush everything and fill in the final header
+    def close(self):
+        with self.lock:
+            self.closed = True
+            self.has_pending.notify()
+        self.thread.join()
+
+        self.fp.seek(0)
+        self.fp.write(self.header.pack())
+        self.fp.close()
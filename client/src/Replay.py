@@ -0,0 +1,107 @@
+import numpy as np
+
+from .Calibrator import Calibrator
+from .CheckpointCache import CheckpointCache, hash_records
+from .IMU import IMU
+from .Recording import is_recording, load_sensor_data, map_recording, rows_to_records, RecordingHeader
+
+# random access replay of a recording
+# binary recordings are memory mapped, csv files are loaded into memory
+# imu output is computed per requested window, resuming from the closest
+# cached imu state which is stored every checkpoint_interval seconds
+# imu is the unused filter to replay with, the cache can be shared between replays
+class Replay:
+    def __init__(self, filename, calibration_samples=200, checkpoint_interval=10.0, chunk_size=65536, imu=None, cache=None):
+        if is_recording(filename):
+            self.header, self.records = map_recording(filename)
+        else:
+            self.header = RecordingHeader()
+            self.records = rows_to_records(load_sensor_data(filename))
+
+        self.chunk_size = chunk_size
+        self.checkpoint_samples = max(1, int(checkpoint_interval * self.header.sample_rate))
+
+        # the calibrator only needs the start of the recording
+        self.calibrator = Calibrator(calibration_samples)
+        start = self.records[:calibration_samples]
+        self.calibrator.filter_block(start["time"], start["accel"], start["gyro"])
+        self.first_index = self.calibrator.completed_samples
+
+        # imu states before a sample index
+        if imu is None:
+            imu = IMU()
+        if cache is None:
+            cache = CheckpointCache()
+        self.cache = cache
+        self.recording_hash = hash_records(self.records)
+        self.parameters = (calibration_samples,) + imu.get_parameters()
+        # kept outside the cache so seeking still works once it has been evicted
+        self.base_state = imu.get_state()
+        self.cache.put(self.recording_hash, self.parameters, self.first_index, self.base_state)
+
+    def __len__(self):
+        return len(self.records)
+
+    @property
+    def start_time(self):
+        return float(self.records["time"][self.first_index]) if len(self) > self.first_index else 0.0
+
+    @property
+    def end_time(self):
+        return float(self.records["time"][-1]) if len(self) > 0 else 0.0
+
+    # binary search on the recorded times
+    def index_of(self, read_time, side="left"):
+        return int(np.searchsorted(self.records["time"], read_time, side=side))
+
+    # imu output (M,25) for samples with read times in [start_time, end_time]
+    # column 0 is time since the first processed sample like IMU.update
+    def get_range(self, start_time, end_time):
+        start = max(self.index_of(start_time), self.first_index)
+        end = self.index_of(end_time, side="right")
+        return self.get_indices(start, end)
+
+    def get_indices(self, start, end):
+        start = max(start, self.first_index)
+        end = min(end, len(self))
+        if end <= start:
+            return np.empty((0, 25))
+
+        index, state = self.cache.find_nearest(self.recording_hash, self.parameters, start)
+        if state is None:
+            index, state = self.first_index, self.base_state
+        imu = IMU.from_state(state)
+
+        # catch up to the window, leaving checkpoints on the way
+        while index < start:
+            next_index = min(start, self.next_checkpoint(index))
+            self.process(imu, index, next_index)
+            index = next_index
+            self.save_checkpoint(imu, index)
+
+        outputs = []
+        while index < end:
+            next_index = min(end, self.next_checkpoint(index), index + self.chunk_size)
+            outputs.append(self.process(imu, index, next_index))
+            index = next_index
+            self.save_checkpoint(imu, index)
+
+        return np.concatenate(outputs)
+
+    def save_checkpoint(self, imu, index):
+        if not self.is_checkpoint(index):
+            return
+        if self.cache.get(self.recording_hash, self.parameters, index) is None:
+            self.cache.put(self.recording_hash, self.parameters, index, imu.get_state())
+
+    def is_checkpoint(self, index):
+        return (index - self.first_index) % self.checkpoint_samples == 0
+
+    def next_checkpoint(self, index):
+        offset = index - self.first_index
+        return self.first_index + (offset // self.checkpoint_samples + 1) * self.checkpoint_samples
+
+    def process(self, imu, start, end):
+        records = self.records[start:end]
+        times, accel, gyro = self.calibrator.filter_block(records["time"], records["accel"], records["gyro"])
+        return imu.update_block(times, accel, gyro)
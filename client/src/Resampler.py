@@ -0,0 +1,63 @@
+import numpy as np
+
+from .Vector3D import Vector3D
+
+# linear interpolation of readings onto a fixed rate grid so later stages see a constant dt
+# the last reading of each block is kept, so blocks of any size give the same output
+# meant for rates near the sensor rate, there is no anti aliasing filter when downsampling
+# rate: Hz of the output, the grid starts at the first reading
+class Resampler:
+    def __init__(self, rate=500.0):
+        if rate <= 0:
+            raise ValueError(f"Resample rate must be positive, got {rate}")
+
+        self.period = 1000 / rate
+        self.start_time = None
+        self.total_output = 0
+        self.last_time = None
+        self.last_values = None
+
+    # times is (N,) increasing ms, values is (N,C)
+    # returns (M,) grid times and (M,C) values for the grid points up to the last reading
+    def resample(self, times, values):
+        times = np.asarray(times, dtype=np.float64)
+        values = np.asarray(values, dtype=np.float64)
+        if len(times) == 0:
+            return times, values.reshape(0, values.shape[-1])
+        values = values.reshape(len(times), -1)
+        if self.last_time is not None:
+            times = np.concatenate(([self.last_time], times))
+            values = np.concatenate((self.last_values[None], values))
+
+        if self.start_time is None:
+            self.start_time = times[0]
+        self.last_time = times[-1]
+        self.last_values = values[-1]
+
+        # grid times from the start so the period does not accumulate rounding errors
+        end = int(np.floor((times[-1] - self.start_time) / self.period)) + 1
+        grid = self.start_time + self.period*np.arange(self.total_output, max(end, self.total_output))
+        self.total_output += len(grid)
+
+        right = np.clip(np.searchsorted(times, grid, side='right'), 1, len(times)-1)
+        left = right - 1
+        if len(times) == 1:
+            right = left
+
+        span = times[right] - times[left]
+        weight = np.where(span > 0, (grid - times[left]) / np.where(span > 0, span, 1), 0.0)
+        resampled = values[left] + weight[:,None] * (values[right] - values[left])
+        return grid, resampled
+
+    # pass through for blocks from Calibrator.filter_block
+    # times is (N,), accel and gyro are (N,3)
+    def filter_block(self, times, accel, gyro):
+        grid, values = self.resample(times, np.hstack((accel, gyro)))
+        return grid, values[:,0:3], values[:,3:6]
+
+    # readings from Calibrator.filter_data, zero or more readings per input
+    def filter_data(self, data):
+        for read_time, accel, gyro in data:
+            grid, values = self.resample([read_time], [[*accel, *gyro]])
+            for t, row in zip(grid, values):
+                yield (t, Vector3D(*row[0:3]), Vector3D(*row[3:6]))
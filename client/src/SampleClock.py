@@ -0,0 +1,222 @@
+import math
+import numpy as np
+
+from .TickUnwrapper import TickUnwrapper
+
+# smooth sample times from HAL_GetTick timestamps
+# ticks are floored to 1 ms while samples come about every 2 ms, so raw dt jumps between
+# 0 and 3 ms. each sample gets an index on the sample clock and times are read off a
+# least squares line of tick against index over the last `window` samples
+# the fit is kept as running sums over a ring of the window, so a reading costs the same
+# whatever the window size
+# the fit is updated once per block, or per chunk of at most max_block samples, and the
+# times of a block are read off the updated line, so they depend on how ticks are split
+# into blocks. on data_1.csv per sample updates and 7 sample blocks differ from the whole
+# file as one block by up to 0.6 ms while the first window fills and 0.1 ms after
+# nominal_rate: Hz, used for the clock until min_samples have been seen
+# max_gap: seconds, a longer jump or ticks going backwards restart the fit, e.g. a board reset
+class SampleClock:
+    def __init__(self, window=1000, nominal_rate=500.0, min_samples=16, max_gap=1.0, max_block=None):
+        self.window = window
+        self.nominal_period = 1000 / nominal_rate
+        self.min_samples = min_samples
+        self.max_gap = max_gap
+        self.max_block = max(1, window // 8) if max_block is None else max_block
+
+        self.unwrapper = TickUnwrapper()
+
+        self.lost_samples = 0
+        self.total_resets = 0
+        self.reset()
+
+    def reset(self):
+        # ring of (index, tick) of the last `window` samples
+        self.indices = np.zeros(self.window)
+        self.ticks = np.zeros(self.window)
+        self.total_samples = 0
+        self.position = 0
+        self.last_index = -1
+        self.last_unwrapped_tick = None
+        self.reset_sums(0.0, 0.0)
+
+        # tick = offset + period*index
+        self.offset = None
+        self.period = self.nominal_period
+        self.last_time = -np.inf
+
+    @property
+    def rate(self):
+        return 1000 / self.period
+
+    def get_stats(self):
+        return {
+            "rate": self.rate,
+            "lost_samples": self.lost_samples,
+            "resets": self.total_resets,
+        }
+
+    # ticks in ms, returns (N,) reconstructed times in ms
+    def update_block(self, ticks):
+        if len(ticks) == 0:
+            return np.empty(0)
+        ticks = self.unwrapper.unwrap(ticks)
+
+        # discontinuities split the block and restart the fit
+        previous = ticks[0] if self.last_unwrapped_tick is None else self.last_unwrapped_tick
+        dt = np.diff(ticks, prepend=previous)
+        breaks = set(np.flatnonzero((dt < 0) | (dt > self.max_gap*1000)).tolist())
+
+        times = []
+        bounds = sorted(breaks | set(range(0, len(ticks), self.max_block)) | {len(ticks)})
+        for start, end in zip(bounds[:-1], bounds[1:]):
+            if start in breaks:
+                self.reset()
+                self.total_resets += 1
+            times.append(self.update_segment(ticks[start:end]))
+        return np.concatenate(times)
+
+    # same as a one sample update_block on plain floats, numpy costs more than the
+    # arithmetic for a single reading
+    def update(self, tick):
+        tick = self.unwrapper.unwrap_one(tick)
+
+        previous = self.last_unwrapped_tick
+        if previous is not None and (tick < previous or tick - previous > self.max_gap*1000):
+            self.reset()
+            self.total_resets += 1
+
+        tick_centre = tick + 0.5
+        if self.offset is None:
+            self.offset = tick_centre
+
+        nearest = math.ceil((tick_centre - self.offset) / self.period - 0.5)
+        index = max(self.last_index + 1, nearest)
+        self.lost_samples += int(index - self.last_index) - 1
+        self.last_index = index
+        self.last_unwrapped_tick = tick
+
+        self.add_sample(index, tick_centre)
+        self.fit()
+
+        read_time = max(self.offset + self.period*index, self.last_time)
+        self.last_time = read_time
+        return read_time
+
+    # pass through for readings from Reader or Calibrator.filter_data
+    def filter_data(self, data):
+        for read_time, accel, gyro in data:
+            yield (self.update(read_time), accel, gyro)
+
+    # pass through for blocks, times is (N,), accel and gyro are (N,3)
+    def filter_block(self, times, accel, gyro):
+        return self.update_block(times), accel, gyro
+
+    # ticks has at most window samples and no discontinuities
+    def update_segment(self, ticks):
+        # floored ticks are half a ms early on average
+        ticks_centre = ticks + 0.5
+        if self.offset is None:
+            self.offset = ticks_centre[0]
+            # a long first block is a better guess than the nominal rate, assuming no
+            # samples were lost in it
+            span = ticks[-1] - ticks[0]
+            if len(ticks) >= self.min_samples and span > 0:
+                self.period = span / (len(ticks)-1)
+
+        # nearest index on the current clock, at least one after the previous sample
+        # so duplicate ticks still advance, larger steps are lost samples
+        # halfway rounds down, a 3 ms step at a 2 ms rate is jitter rather than a lost sample
+        nearest = np.ceil((ticks_centre - self.offset) / self.period - 0.5)
+        steps = np.arange(1, len(ticks)+1)
+        indices = self.last_index + steps + np.maximum.accumulate(np.maximum(nearest - self.last_index - steps, 0))
+        self.lost_samples += int(indices[-1] - self.last_index) - len(ticks)
+        self.last_index = int(indices[-1])
+        self.last_unwrapped_tick = float(ticks[-1])
+
+        self.add_samples(indices, ticks_centre)
+        self.fit()
+
+        times = self.offset + self.period*indices
+        # times never go backwards when the fit moves
+        times = np.maximum.accumulate(np.maximum(times, self.last_time))
+        self.last_time = times[-1]
+        return times
+
+    # sums are of samples relative to a reference so they keep their precision
+    # as indices and ticks grow, see rebase
+    def reset_sums(self, reference_index, reference_tick):
+        self.reference_index = reference_index
+        self.reference_tick = reference_tick
+        self.sum_i = self.sum_t = self.sum_ii = self.sum_it = 0.0
+
+    def add_sums(self, indices, ticks, sign):
+        i = indices - self.reference_index
+        t = ticks - self.reference_tick
+        self.sum_i += sign*float(np.sum(i))
+        self.sum_t += sign*float(np.sum(t))
+        self.sum_ii += sign*float(np.sum(i*i))
+        self.sum_it += sign*float(np.sum(i*t))
+
+    def add_sample(self, index, tick):
+        i = self.position
+        if self.total_samples >= self.window:
+            old_index = float(self.indices[i]) - self.reference_index
+            old_tick = float(self.ticks[i]) - self.reference_tick
+            self.sum_i -= old_index
+            self.sum_t -= old_tick
+            self.sum_ii -= old_index*old_index
+            self.sum_it -= old_index*old_tick
+
+        self.indices[i] = index
+        self.ticks[i] = tick
+        self.position = (i + 1) % self.window
+        self.total_samples += 1
+
+        new_index = index - self.reference_index
+        new_tick = tick - self.reference_tick
+        self.sum_i += new_index
+        self.sum_t += new_tick
+        self.sum_ii += new_index*new_index
+        self.sum_it += new_index*new_tick
+
+        if new_index > 4*self.window:
+            self.rebase(index, tick)
+
+    # indices and ticks have at most window samples
+    def add_samples(self, indices, ticks):
+        total = len(indices)
+        positions = (self.position + np.arange(total)) % self.window
+
+        # the ring fills from 0, so once full every write replaces the oldest sample
+        evicted = positions[self.total_samples + np.arange(total) >= self.window]
+        self.add_sums(self.indices[evicted], self.ticks[evicted], -1)
+
+        self.indices[positions] = indices
+        self.ticks[positions] = ticks
+        self.position = (self.position + total) % self.window
+        self.total_samples += total
+        self.add_sums(indices, ticks, +1)
+
+        # recompute from the ring once the samples have moved far from the reference,
+        # this also clears rounding errors left by the running updates
+        if indices[-1] - self.reference_index > 4*self.window:
+            self.rebase(indices[-1], ticks[-1])
+
+    def rebase(self, reference_index, reference_tick):
+        count = min(self.total_samples, self.window)
+        positions = (self.position - count + np.arange(count)) % self.window
+        self.reset_sums(reference_index, reference_tick)
+        self.add_sums(self.indices[positions], self.ticks[positions], +1)
+
+    def fit(self):
+        count = min(self.total_samples, self.window)
+        mean_i = self.sum_i / count
+        mean_t = self.sum_t / count
+        if count >= self.min_samples:
+            variance = self.sum_ii - count*mean_i*mean_i
+            covariance = self.sum_it - count*mean_i*mean_t
+            self.period = float(covariance / variance)
+        else:
+            self.period = self.nominal_period
+
+        self.offset = self.reference_tick + mean_t - self.period*(self.reference_index + mean_i)
@@ -0,0 +1,77 @@
+import threading
+from collections import deque
+
+# bounded hand-off between the reader thread and a consumer
+# overflow policy when full:
+#   block: wait for the consumer to make room
+#   drop-oldest: discard the oldest queued item
+#   drop-newest: discard the item being added
+class SampleQueue:
+    overflow_policies = ("block", "drop-oldest", "drop-newest")
+
+    def __init__(self, max_size=None, overflow="block"):
+        if overflow not in self.overflow_policies:
+            raise ValueError(f"Unknown overflow policy {overflow}, expected one of {self.overflow_policies}")
+
+        self.max_size = max_size
+        self.overflow = overflow
+
+        # (item, total samples in item)
+        self.items = deque([])
+        self.lock = threading.Lock()
+        self.not_empty = threading.Condition(self.lock)
+        self.not_full = threading.Condition(self.lock)
+        self.closed = False
+
+        self.total_samples = 0
+        self.dropped_samples = 0
+
+    def __len__(self):
+        return len(self.items)
+
+    def is_full(self):
+        return self.max_size is not None and len(self.items) >= self.max_size
+
+    # returns False if the item was dropped
+    def put(self, item, size=1):
+        with self.lock:
+            self.total_samples += size
+
+            if self.is_full():
+                if self.overflow == "drop-newest":
+                    self.dropped_samples += size
+                    return False
+
+                if self.overflow == "drop-oldest":
+                    _, dropped_size = self.items.popleft()
+                    self.dropped_samples += dropped_size
+                else:
+                    while self.is_full() and not self.closed:
+                        self.not_full.wait()
+
+            if self.closed:
+                self.dropped_samples += size
+                return False
+
+            self.items.append((item, size))
+            self.not_empty.notify()
+            return True
+
+    # wait until items are queued and take all of them
+    # returns an empty list on timeout or once closed and drained
+    def get_all(self, timeout=None):
+        with self.lock:
+            if len(self.items) == 0 and not self.closed:
+                self.not_empty.wait(timeout)
+
+            items = [item for item, _ in self.items]
+            self.items.clear()
+            self.not_full.notify_all()
+            return items
+
+    # wake up any waiting threads, queued items can still be taken
+    def close(self):
+        with self.lock:
+            self.closed = True
+            self.not_empty.notify_all()
+            self.not_full.notify_all()
@@ -0,0 +1,147 @@
+import time
+import multiprocessing
+from multiprocessing import shared_memory
+import numpy as np
+
+# header slots in shared memory
+WRITE_COUNT = 0
+READ_COUNT = 1
+DROPPED = 2
+MAX_DEPTH = 3
+# free slot for the producer, e.g. the serial backlog of the reader
+PRODUCER_BACKLOG = 4
+IS_CLOSED = 5
+TOTAL_SLOTS = 8
+
+# single producer, single consumer ring of float rows in shared memory
+# pass it to a multiprocessing.Process as an argument to share it
+# overflow "block" waits for space, "drop" discards rows that do not fit
+class SharedRingBuffer:
+    overflow_policies = ("block", "drop")
+
+    def __init__(self, capacity, width, overflow="block"):
+        if overflow not in self.overflow_policies:
+            raise ValueError(f"Unknown overflow policy {overflow}, expected one of {self.overflow_policies}")
+
+        self.capacity = capacity
+        self.width = width
+        self.overflow = overflow
+
+        size = 8*TOTAL_SLOTS + 8*capacity*width
+        self.memory = shared_memory.SharedMemory(create=True, size=size)
+        self.is_owner = True
+        self.condition = multiprocessing.Condition()
+        self.attach()
+        self.header[:] = 0
+
+    def attach(self):
+        self.header = np.ndarray(TOTAL_SLOTS, dtype=np.int64, buffer=self.memory.buf)
+        self.data = np.ndarray((self.capacity, self.width), dtype=np.float64, buffer=self.memory.buf, offset=8*TOTAL_SLOTS)
+
+    def __getstate__(self):
+        return {
+            "name": self.memory.name,
+            "capacity": self.capacity,
+            "width": self.width,
+            "overflow": self.overflow,
+            "condition": self.condition,
+        }
+
+    def __setstate__(self, state):
+        self.capacity = state["capacity"]
+        self.width = state["width"]
+        self.overflow = state["overflow"]
+        self.condition = state["condition"]
+        self.memory = shared_memory.SharedMemory(name=state["name"])
+        self.is_owner = False
+        self.attach()
+
+    def __len__(self):
+        return int(self.header[WRITE_COUNT] - self.header[READ_COUNT])
+
+    @property
+    def dropped(self):
+        return int(self.header[DROPPED])
+
+    @property
+    def max_depth(self):
+        return int(self.header[MAX_DEPTH])
+
+    @property
+    def is_closed(self):
+        return bool(self.header[IS_CLOSED])
+
+    def set_producer_backlog(self, backlog):
+        self.header[PRODUCER_BACKLOG] = backlog
+
+    def get_producer_backlog(self):
+        return int(self.header[PRODUCER_BACKLOG])
+
+    # rows is (N,width), returns the number of rows written
+    # in block mode rows that still do not fit after timeout, or once stop_event is set,
+    # are dropped, stop_event is checked every poll_interval seconds while waiting
+    # so a consumer that died with the ring full cannot hang the producer
+    def put(self, rows, timeout=None, stop_event=None, poll_interval=0.1):
+        total = len(rows)
+        with self.condition:
+            if self.overflow == "block":
+                end_time = None if timeout is None else time.monotonic() + timeout
+                while self.capacity - len(self) < min(total, self.capacity) and not self.is_closed:
+                    if stop_event is not None and stop_event.is_set():
+                        break
+                    wait = None if stop_event is None else poll_interval
+                    if end_time is not None:
+                        remaining = end_time - time.monotonic()
+                        if remaining <= 0:
+                            break
+                        wait = remaining if wait is None else min(wait, remaining)
+                    self.condition.wait(wait)
+
+            total_free = self.capacity - len(self)
+            if total > total_free:
+                self.header[DROPPED] += total - total_free
+                rows = rows[:total_free]
+
+            self.write(rows)
+            self.header[MAX_DEPTH] = max(self.header[MAX_DEPTH], len(self))
+            self.condition.notify_all()
+            return len(rows)
+
+    def write(self, rows):
+        total = len(rows)
+        i = int(self.header[WRITE_COUNT] % self.capacity)
+        first = min(total, self.capacity - i)
+        self.data[i:i+first] = rows[:first]
+        self.data[:total-first] = rows[first:]
+        self.header[WRITE_COUNT] += total
+
+    # waits for rows and copies out up to max_rows of them
+    # returns an empty array on timeout or once closed and drained
+    def get(self, max_rows=None, timeout=None):
+        with self.condition:
+            if len(self) == 0 and not self.is_closed:
+                self.condition.wait(timeout)
+
+            total = len(self)
+            if max_rows is not None:
+                total = min(total, max_rows)
+
+            i = int(self.header[READ_COUNT] % self.capacity)
+            first = min(total, self.capacity - i)
+            rows = np.concatenate((self.data[i:i+first], self.data[:total-first]))
+            self.header[READ_COUNT] += total
+            self.condition.notify_all()
+            return rows
+
+    # no more rows will be put, wakes up a waiting consumer
+    def close(self):
+        with self.condition:
+            self.header[IS_CLOSED] = 1
+            self.condition.notify_all()
+
+    def release(self):
+        self.header = None
+        self.data = None
+        self.memory.close()
+        if self.is_owner:
+            self.memory.unlink()
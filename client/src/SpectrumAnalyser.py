@@ -0,0 +1,199 @@
+import threading
+import time
+import numpy as np
+
+from .Metrics import metrics
+from .SampleQueue import SampleQueue
+
+channel_names = ("accel_x", "accel_y", "accel_z", "gyro_x", "gyro_y", "gyro_z")
+
+# sliding window spectra of calibrated readings for vibration monitoring
+# readings are handed to a thread through a bounded queue so the ingest path only copies them
+# every hop = window_size*(1-overlap) samples the newest window is hann windowed and
+# transformed, the psd is averaged over the last `averages` windows (welch)
+# a result is published at most every publish_interval seconds, see get_result
+# sample_rate: Hz, None estimates it from the reading times
+# max_queued: blocks waiting for the thread, the oldest are dropped when it falls behind
+class SpectrumAnalyser:
+    def __init__(self, window_size=512, overlap=0.5, averages=4, sample_rate=None, publish_interval=0.2, max_queued=64):
+        if not 0 <= overlap < 1:
+            raise ValueError(f"Overlap must be in [0, 1), got {overlap}")
+
+        self.window_size = window_size
+        self.hop_size = max(1, int(window_size * (1-overlap)))
+        self.averages = averages
+        self.sample_rate = sample_rate
+        self.publish_interval = publish_interval
+
+        total_channels = len(channel_names)
+        # every row is written twice so the newest window is always a contiguous slice
+        self.times = np.zeros(2*window_size)
+        self.samples = np.zeros((2*window_size, total_channels))
+        self.total_samples = 0
+        self.samples_since_hop = 0
+
+        # reused for every transform, numpy caches the fft plan for each size
+        self.taper = np.hanning(window_size)[:,None]
+        self.tapered = np.empty((window_size, total_channels))
+        self.taper_power = np.sum(self.taper**2)
+
+        total_bins = window_size//2 + 1
+        self.psd_history = np.zeros((averages, total_bins, total_channels))
+        self.psd_sum = np.zeros((total_bins, total_channels))
+        self.total_spectra = 0
+
+        self.result = None
+        self.last_publish = 0.0
+        self.listeners = []
+        self.lock = threading.Lock()
+
+        self.queue = SampleQueue(max_queued, "drop-oldest")
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        # readings from filter_data waiting to be queued as a block
+        self.pending = []
+
+    # callback(result) is called from the analyser thread for every published result
+    def add_listener(self, callback):
+        self.listeners.append(callback)
+
+    def start(self):
+        self.thread.start()
+
+    def stop(self):
+        self.flush_pending()
+        self.queue.close()
+        if self.thread.is_alive():
+            self.thread.join()
+
+    # newest published result or None
+    #   frequencies: (F,) Hz
+    #   psd: (F,6) power spectral density per channel, g^2/Hz and (deg/s)^2/Hz
+    #   rms: (6,) of the window with the mean removed
+    #   peak_frequency: (6,) Hz of the largest psd peak above DC
+    def get_result(self):
+        with self.lock:
+            return self.result
+
+    # pass through for readings from Calibrator.filter_data
+    def filter_data(self, data):
+        for d in data:
+            read_time, accel, gyro = d
+            self.pending.append((read_time, *accel, *gyro))
+            if len(self.pending) >= self.hop_size:
+                self.flush_pending()
+            yield d
+
+    def flush_pending(self):
+        if len(self.pending) == 0:
+            return
+        rows = np.array(self.pending)
+        self.pending = []
+        self.queue.put(rows, len(rows))
+
+    # pass through for blocks from Calibrator.filter_block
+    # times is (N,), accel and gyro are (N,3)
+    def filter_block(self, times, accel, gyro):
+        if len(times) > 0:
+            rows = np.empty((len(times), 1 + len(channel_names)))
+            rows[:,0] = times
+            rows[:,1:4] = accel
+            rows[:,4:7] = gyro
+            self.queue.put(rows, len(rows))
+        return times, accel, gyro
+
+    def run(self):
+        while True:
+            blocks = self.queue.get_all()
+            if len(blocks) == 0:
+                return
+            for rows in blocks:
+                self.add_rows(rows)
+
+    # (N,7) rows of time, accel, gyro, processed on the calling thread
+    def add_rows(self, rows):
+        i = 0
+        while i < len(rows):
+            # stop at each hop so every window is transformed
+            end = min(len(rows), i + self.hop_size - self.samples_since_hop)
+            self.write_rows(rows[i:end])
+            self.samples_since_hop += end - i
+            i = end
+
+            if self.samples_since_hop >= self.hop_size:
+                self.samples_since_hop = 0
+                if self.total_samples >= self.window_size:
+                    self.update_spectrum()
+
+    # rows has at most window_size rows
+    def write_rows(self, rows):
+        size = self.window_size
+        i = self.total_samples % size
+        first = min(len(rows), size - i)
+        for start, block in ((i, rows[:first]), (0, rows[first:])):
+            end = start + len(block)
+            self.times[start:end] = block[:,0]
+            self.times[start+size:end+size] = block[:,0]
+            self.samples[start:end] = block[:,1:]
+            self.samples[start+size:end+size] = block[:,1:]
+        self.total_samples += len(rows)
+
+    def update_spectrum(self):
+        start = metrics.start()
+        size = self.window_size
+        i = self.total_samples % size
+        times = self.times[i:i+size]
+        window = self.samples[i:i+size]
+
+        sample_rate = self.sample_rate
+        if sample_rate is None:
+            elapsed = times[-1] - times[0]
+            sample_rate = 1000 * (size-1) / elapsed if elapsed > 0 else 1.0
+
+        mean = window.mean(axis=0)
+        np.subtract(window, mean, out=self.tapered)
+        rms = np.sqrt(np.mean(self.tapered**2, axis=0))
+        np.multiply(self.tapered, self.taper, out=self.tapered)
+
+        spectrum = np.fft.rfft(self.tapered, axis=0)
+        psd = (spectrum.real**2 + spectrum.imag**2) / (sample_rate * self.taper_power)
+        # one sided, DC and the nyquist bin of even sizes only appear once
+        psd[1:-1 if size % 2 == 0 else None] *= 2
+
+        # running welch average over the last `averages` windows
+        slot = self.total_spectra % self.averages
+        self.psd_sum += psd - self.psd_history[slot]
+        self.psd_history[slot] = psd
+        self.total_spectra += 1
+        average_psd = self.psd_sum / min(self.total_spectra, self.averages)
+
+        metrics.stop("analyser.spectrum", start)
+
+        now = time.perf_counter()
+        if now - self.last_publish < self.publish_interval:
+            return
+        self.last_publish = now
+        self.publish(times[-1], sample_rate, average_psd, rms)
+
+    def publish(self, read_time, sample_rate, psd, rms):
+        frequencies = np.fft.rfftfreq(self.window_size, 1/sample_rate)
+
+        # parabola through the log power around the largest bin, finer than the bin spacing
+        peak_bins = np.clip(1 + np.argmax(psd[1:], axis=0), 1, len(psd)-2)
+        channels = np.arange(psd.shape[1])
+        below, peak, above = (np.log(psd[peak_bins+k, channels] + 1e-30) for k in (-1, 0, 1))
+        curvature = below - 2*peak + above
+        offset = np.where(curvature < 0, 0.5*(below - above) / np.minimum(curvature, -1e-30), 0.0)
+
+        result = {
+            "time": read_time,
+            "sample_rate": sample_rate,
+            "frequencies": frequencies,
+            "psd": psd,
+            "rms": rms,
+            "peak_frequency": (peak_bins + offset) * frequencies[1],
+        }
+        with self.lock:
+            self.result = result
+
+        for listener in self.listeners:
+            listener(result)
@@ -0,0 +1,412 @@
+import os
+import socket
+import struct
+import threading
+import time
+from urllib.parse import urlsplit
+import numpy as np
+
+from .SampleQueue import SampleQueue
+
+# fans out sample blocks from one reader to any number of local subscribers
+# urls are tcp://host:port, udp://host:port or unix:///path/to/socket
+#
+# every message is a 16 byte header followed by (rows, width) little endian float64
+#   magic, version, kind, width, rows, sequence
+# kind is raw (time, accel, gyro) rows or fused rows laid out like IMU.update_block
+# sequence counts messages of each kind so subscribers can tell when blocks were dropped
+message_magic = b"MPUT"
+message_version = 1
+message_header_struct = struct.Struct("<4sBBHII")
+
+kind_raw = 0
+kind_fused = 1
+kind_widths = {kind_raw: 7, kind_fused: 25}
+
+# udp subscribers register by sending subscribe_message, then again every
+# keepalive_interval, they are forgotten after subscriber_timeout without one
+subscribe_message = b"MPUS"
+unsubscribe_message = b"MPUX"
+keepalive_interval = 1.0
+subscriber_timeout = 5.0
+
+# largest udp payload sent, blocks are split to fit
+max_datagram_size = 60000
+
+schemes = ("tcp", "udp", "unix")
+
+# returns (scheme, address) where address is (host, port) or a path
+def parse_url(url):
+    parts = urlsplit(url)
+    if parts.scheme not in schemes:
+        raise ValueError(f"Unknown telemetry url {url}, expected one of {tuple(f'{scheme}://' for scheme in schemes)}")
+
+    if parts.scheme == "unix":
+        return parts.scheme, parts.netloc + parts.path
+    if parts.port is None:
+        raise ValueError(f"Telemetry url {url} has no port")
+    return parts.scheme, (parts.hostname or "127.0.0.1", parts.port)
+
+def open_socket(scheme):
+    if scheme == "unix":
+        return socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    if scheme == "udp":
+        return socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+    return sock
+
+def encode_message(kind, rows, sequence):
+    rows = np.ascontiguousarray(rows, dtype="<f8")
+    header = message_header_struct.pack(message_magic, message_version, kind, rows.shape[1], len(rows), sequence)
+    return header + rows.tobytes()
+
+# returns (kind, sequence, rows) and the size of the message, or None if data holds
+# less than a whole message
+def decode_message(data, offset=0):
+    if len(data) - offset < message_header_struct.size:
+        return None
+
+    magic, version, kind, width, total_rows, sequence = message_header_struct.unpack_from(data, offset)
+    if magic != message_magic or version != message_version:
+        raise ValueError(f"Not a telemetry message, got magic {magic} version {version}")
+
+    size = message_header_struct.size + 8*width*total_rows
+    if len(data) - offset < size:
+        return None
+
+    # copied so the receive buffer can be reused
+    rows = np.frombuffer(data, dtype="<f8", count=width*total_rows, offset=offset+message_header_struct.size)
+    return (kind, sequence, rows.reshape(total_rows, width).copy()), size
+
+# one connected client with its own bounded send queue and thread
+# a client that falls behind loses its oldest or newest messages, or is disconnected,
+# so it never holds up the publisher or the other clients
+class Subscriber:
+    def __init__(self, name, send, close, max_queued=64, overflow="drop-oldest"):
+        self.name = name
+        self.send = send
+        self.close_socket = close
+        self.overflow = overflow
+        self.queue = SampleQueue(max_queued, "drop-newest" if overflow == "disconnect" else overflow)
+
+        self.sent_messages = 0
+        self.is_connected = True
+        self.thread = threading.Thread(target=self.run, daemon=True)
+
+    def start(self):
+        self.thread.start()
+
+    # never blocks, returns False if the message was dropped
+    def put(self, message):
+        if not self.is_connected:
+            return False
+
+        is_queued = self.queue.put(message)
+        if not is_queued and self.overflow == "disconnect":
+            self.close()
+        return is_queued
+
+    def run(self):
+        try:
+            while True:
+                messages = self.queue.get_all()
+                if len(messages) == 0:
+                    return
+                for message in messages:
+                    self.send(message)
+                    self.sent_messages += 1
+        except OSError:
+            pass
+        finally:
+            self.close()
+
+    def close(self):
+        if not self.is_connected:
+            return
+        self.is_connected = False
+        self.queue.close()
+        self.close_socket()
+
+    def get_stats(self):
+        return {
+            "name": self.name,
+            "connected": self.is_connected,
+            "sent_messages": self.sent_messages,
+            "queued_messages": len(self.queue),
+            "dropped_messages": self.queue.dropped_samples,
+        }
+
+# serves blocks published from the ingest thread to every subscriber of url
+# max_queued: messages waiting per subscriber
+# overflow: what happens to a subscriber with a full queue
+#   drop-oldest, drop-newest: skip messages for that subscriber
+#   disconnect: close the connection
+class TelemetryPublisher:
+    overflow_policies = ("drop-oldest", "drop-newest", "disconnect")
+
+    def __init__(self, url, max_queued=64, overflow="drop-oldest", accept_timeout=0.1):
+        if overflow not in self.overflow_policies:
+            raise ValueError(f"Unknown overflow policy {overflow}, expected one of {self.overflow_policies}")
+
+        self.url = url
+        self.scheme, self.address = parse_url(url)
+        self.max_queued = max_queued
+        self.overflow = overflow
+        self.accept_timeout = accept_timeout
+
+        self.sock = None
+        self.subscribers = {}
+        self.lock = threading.Lock()
+        self.sequences = {kind: 0 for kind in kind_widths}
+        self.disconnected_subscribers = 0
+
+        self.running = False
+        self.thread = threading.Thread(target=self.run, daemon=True)
+
+    def start(self):
+        if self.scheme == "unix" and os.path.exists(self.address):
+            # left behind by a publisher that did not exit cleanly
+            os.remove(self.address)
+
+        self.sock = open_socket(self.scheme)
+        if self.scheme != "unix":
+            self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.sock.bind(self.address)
+        if self.scheme != "udp":
+            self.sock.listen()
+        self.sock.settimeout(self.accept_timeout)
+
+        self.running = True
+        self.thread.start()
+
+    def stop(self):
+        if self.sock is None:
+            return
+        self.running = False
+        self.thread.join()
+
+        with self.lock:
+            subscribers = list(self.subscribers.values())
+            self.subscribers.clear()
+        for subscriber in subscribers:
+            subscriber.close()
+
+        self.sock.close()
+        if self.scheme == "unix" and os.path.exists(self.address):
+            os.remove(self.address)
+
+    def run(self):
+        if self.scheme == "udp":
+            self.run_datagram()
+        else:
+            self.run_stream()
+
+    def run_stream(self):
+        while self.running:
+            try:
+                connection, address = self.sock.accept()
+            except socket.timeout:
+                continue
+            except OSError:
+                return
+
+            connection.settimeout(None)
+            if self.scheme == "tcp":
+                connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            name = f"{address[0]}:{address[1]}" if self.scheme == "tcp" else f"unix:{id(connection):x}"
+            self.add_subscriber(name, Subscriber(name, connection.sendall, connection.close, self.max_queued, self.overflow))
+
+    def run_datagram(self):
+        last_seen = {}
+        while self.running:
+            try:
+                data, address = self.sock.recvfrom(64)
+            except socket.timeout:
+                data, address = None, None
+            except OSError:
+                return
+
+            if data == subscribe_message:
+                if address not in last_seen:
+                    send = lambda message, address=address: self.sock.sendto(message, address)
+                    self.add_subscriber(address, Subscriber(f"{address[0]}:{address[1]}", send, lambda: None, self.max_queued, self.overflow))
+                last_seen[address] = time.monotonic()
+            elif data == unsubscribe_message:
+                last_seen.pop(address, None)
+                self.remove_subscriber(address)
+
+            now = time.monotonic()
+            for address in [address for address, seen in last_seen.items() if now - seen > subscriber_timeout]:
+                del last_seen[address]
+                self.remove_subscriber(address)
+
+    def add_subscriber(self, key, subscriber):
+        subscriber.start()
+        with self.lock:
+            self.subscribers[key] = subscriber
+
+    def remove_subscriber(self, key):
+        with self.lock:
+            subscriber = self.subscribers.pop(key, None)
+        if subscriber is not None:
+            subscriber.close()
+
+    # rows is (N,7) time, accel, gyro
+    def publish_raw(self, rows):
+        self.publish(kind_raw, rows)
+
+    # rows is (N,25) from IMU.update_block
+    def publish_fused(self, rows):
+        self.publish(kind_fused, rows)
+
+    # each block is encoded once and shared by every subscriber queue
+    def publish(self, kind, rows):
+        if len(rows) == 0:
+            return
+
+        messages = []
+        max_rows = len(rows)
+        if self.scheme == "udp":
+            max_rows = max(1, (max_datagram_size - message_header_struct.size) // (8*kind_widths[kind]))
+        for i in range(0, len(rows), max_rows):
+            messages.append(encode_message(kind, rows[i:i+max_rows], self.sequences[kind]))
+            self.sequences[kind] = (self.sequences[kind] + 1) & 0xFFFFFFFF
+
+        with self.lock:
+            subscribers = list(self.subscribers.items())
+
+        for key, subscriber in subscribers:
+            for message in messages:
+                subscriber.put(message)
+            if not subscriber.is_connected:
+                self.disconnected_subscribers += 1
+                with self.lock:
+                    self.subscribers.pop(key, None)
+
+    def get_stats(self):
+        with self.lock:
+            subscribers = [subscriber.get_stats() for subscriber in self.subscribers.values()]
+        return {
+            "subscribers": len(subscribers),
+            "disconnected_subscribers": self.disconnected_subscribers,
+            "sent_messages": sum(stats["sent_messages"] for stats in subscribers),
+            "dropped_messages": sum(stats["dropped_messages"] for stats in subscribers),
+        }
+
+# receives blocks from a TelemetryPublisher at url
+# lost_messages counts gaps in the message sequences, from udp loss or a full send queue,
+# and messages that could not be decoded, which are skipped
+class TelemetrySubscriber:
+    def __init__(self, url, read_timeout=0.5):
+        self.url = url
+        self.scheme, self.address = parse_url(url)
+        self.read_timeout = read_timeout
+
+        self.sock = None
+        self.running = False
+        self.next_sequences = {}
+        self.lost_messages = 0
+        # corrupt messages already counted as lost, not counted again in the gap they leave
+        self.corrupt_messages = 0
+        self.uncounted_gaps = 0
+        self.last_keepalive = None
+
+    def connect(self):
+        self.sock = open_socket(self.scheme)
+        self.sock.settimeout(self.read_timeout)
+        if self.scheme == "udp":
+            # room for bursts while the consumer is busy
+            self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 1 << 22)
+            self.sock.bind(("127.0.0.1" if self.address[0] in ("127.0.0.1", "localhost") else "", 0))
+            self.send_keepalive()
+        else:
+            self.sock.connect(self.address)
+        self.running = True
+
+    def close(self):
+        self.running = False
+        if self.sock is None:
+            return
+        if self.scheme == "udp":
+            try:
+                self.sock.sendto(unsubscribe_message, self.address)
+            except OSError:
+                pass
+        self.sock.close()
+
+    def send_keepalive(self):
+        now = time.monotonic()
+        if self.last_keepalive is None or now - self.last_keepalive > keepalive_interval:
+            self.sock.sendto(subscribe_message, self.address)
+            self.last_keepalive = now
+
+    def update_sequence(self, kind, sequence):
+        expected = self.next_sequences.get(kind)
+        if expected is not None and sequence != expected:
+            missing = (sequence - expected) & 0xFFFFFFFF
+            counted = min(missing, self.uncounted_gaps)
+            self.uncounted_gaps -= counted
+            self.lost_messages += missing - counted
+        self.next_sequences[kind] = (sequence + 1) & 0xFFFFFFFF
+
+    def skip_corrupt_message(self):
+        self.corrupt_messages += 1
+        self.uncounted_gaps += 1
+        self.lost_messages += 1
+
+    # yields (kind, rows) until close() or the publisher goes away
+    def get_messages(self):
+        if self.sock is None:
+            self.connect()
+
+        buffer = bytearray()
+        is_resyncing = False
+        while self.running:
+            try:
+                if self.scheme == "udp":
+                    self.send_keepalive()
+                    data = self.sock.recv(65536)
+                    buffer = bytearray(data)
+                else:
+                    data = self.sock.recv(1 << 16)
+                    if not data:
+                        return
+                    buffer += data
+            except socket.timeout:
+                continue
+            except OSError:
+                return
+
+            offset = 0
+            while True:
+                try:
+                    result = decode_message(buffer, offset)
+                except ValueError:
+                    # counted once however many bytes are skipped to find the next message
+                    if not is_resyncing:
+                        self.skip_corrupt_message()
+                    if self.scheme == "udp":
+                        # the rest of the datagram belongs to the corrupt message
+                        offset = len(buffer)
+                        break
+                    # a stream resumes at the next message header
+                    is_resyncing = True
+                    next_offset = buffer.find(message_magic, offset+1)
+                    offset = next_offset if next_offset >= 0 else max(offset+1, len(buffer) - len(message_magic) + 1)
+                    continue
+                if result is None:
+                    break
+                is_resyncing = False
+                (kind, sequence, rows), size = result
+                offset += size
+                self.update_sequence(kind, sequence)
+                yield kind, rows
+            del buffer[:offset]
+
+    # yields only rows of the given kind
+    def get_blocks(self, kind=kind_fused):
+        for message_kind, rows in self.get_messages():
+            if message_kind == kind:
+                yield rows
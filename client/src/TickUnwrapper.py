@@ -0,0 +1,27 @@
+import numpy as np
+
+# removes the wraparound of a board's 32 bit HAL_GetTick, which wraps every ~49.7 days
+# a step back of more than half the range is a wrap rather than a reset
+class TickUnwrapper:
+    def __init__(self):
+        self.last_tick = None
+        self.wrap_offset = 0
+
+    # ticks is a (N,) array of raw 32 bit ticks, returns them as float64 without wraparound
+    def unwrap(self, ticks):
+        ticks = np.asarray(ticks, dtype=np.int64)
+        previous = np.concatenate(([ticks[0] if self.last_tick is None else self.last_tick], ticks[:-1]))
+        wraps = np.cumsum((ticks - previous) < -(1 << 31)) * (1 << 32)
+        self.last_tick = int(ticks[-1])
+
+        unwrapped = ticks + wraps + self.wrap_offset
+        self.wrap_offset += int(wraps[-1])
+        return unwrapped.astype(np.float64)
+
+    # same as unwrap for a single tick, on plain ints since numpy costs more than the arithmetic
+    def unwrap_one(self, tick):
+        tick = int(tick)
+        if self.last_tick is not None and tick - self.last_tick < -(1 << 31):
+            self.wrap_offset += 1 << 32
+        self.last_tick = tick
+        return float(tick + self.wrap_offset)
@@ -1,4 +1,6 @@
 class Vector3D:
+    __slots__ = ("x", "y", "z")
+
     def __init__(self, x=0, y=0, z=0):
         self.x = x
         self.y = y
@@ -26,6 +28,31 @@ class Vector3D:
     def __rmul__(self, k):
         return self * k
 
+    # in place operators modify this vector instead of allocating a new one
+    def __iadd__(self, other):
+        self.x += other.x
+        self.y += other.y
+        self.z += other.z
+        return self
+
+    def __isub__(self, other):
+        self.x -= other.x
+        self.y -= other.y
+        self.z -= other.z
+        return self
+
+    def __imul__(self, k):
+        self.x *= k
+        self.y *= k
+        self.z *= k
+        return self
+
+    def __itruediv__(self, k):
+        self.x /= k
+        self.y /= k
+        self.z /= k
+        return self
+
     def __rdiv__(self, k):
         return Vector3D(k/self.x, k/self.y, k/self.z)
     
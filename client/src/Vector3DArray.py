@@ -0,0 +1,104 @@
+import numpy as np
+
+from .Vector3D import Vector3D
+
+# many Vector3D stored as a structure of arrays
+# data is (3,N) so x, y and z are each contiguous
+class Vector3DArray:
+    __slots__ = ("data",)
+
+    def __init__(self, data):
+        self.data = np.asarray(data, dtype=np.float64)
+
+    @classmethod
+    def zeros(cls, size):
+        return cls(np.zeros((3, size)))
+
+    # rows is (N,3), the layout used by the IMU and the visualisers
+    @classmethod
+    def from_rows(cls, rows):
+        return cls(np.array(rows, dtype=np.float64).T)
+
+    @classmethod
+    def from_vectors(cls, vectors):
+        return cls.from_rows([list(v) for v in vectors])
+
+    def to_rows(self):
+        return self.data.T
+
+    @property
+    def x(self):
+        return self.data[0]
+
+    @property
+    def y(self):
+        return self.data[1]
+
+    @property
+    def z(self):
+        return self.data[2]
+
+    def __len__(self):
+        return self.data.shape[1]
+
+    def __iter__(self):
+        yield self.x
+        yield self.y
+        yield self.z
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return Vector3DArray(self.data[:,index])
+        return Vector3D(*self.data[:,index])
+
+    def __setitem__(self, index, value):
+        value = as_operand(value)
+        # a single column takes a vector as (3,)
+        if not isinstance(index, slice) and np.ndim(value) == 2:
+            value = value[:,0]
+        self.data[:,index] = value
+
+    def __add__(self, other):
+        return Vector3DArray(self.data + as_operand(other))
+
+    def __radd__(self, other):
+        return self + other
+
+    def __sub__(self, other):
+        return Vector3DArray(self.data - as_operand(other))
+
+    def __rsub__(self, other):
+        return Vector3DArray(as_operand(other) - self.data)
+
+    def __mul__(self, k):
+        return Vector3DArray(self.data * as_operand(k))
+
+    def __rmul__(self, k):
+        return self * k
+
+    def __truediv__(self, k):
+        return Vector3DArray(self.data / as_operand(k))
+
+    def __iadd__(self, other):
+        self.data += as_operand(other)
+        return self
+
+    def __isub__(self, other):
+        self.data -= as_operand(other)
+        return self
+
+    def __imul__(self, k):
+        self.data *= as_operand(k)
+        return self
+
+    def __itruediv__(self, k):
+        self.data /= as_operand(k)
+        return self
+
+# vectors broadcast over every column, an (N,) array applies per vector
+def as_operand(other):
+    if isinstance(other, Vector3DArray):
+        return other.data
+    if isinstance(other, Vector3D):
+        return np.array([[other.x], [other.y], [other.z]])
+    return other
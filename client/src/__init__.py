@@ -1,7 +1,47 @@
+import importlib
+
 from .Calibrator import Calibrator
 from .IMU import IMU
-from .PyPlotVisualiser import PyPlotVisualiser
-from .QtVisualiser import QtVisualiser
+from .Fusion import MadgwickFusion, MahonyFusion, make_fusion
 from .Reader import Reader
+from .AsyncReader import AsyncReader
+from .AsyncPipeline import AsyncPipeline
+from .MultiDeviceReader import MultiDeviceReader, ClockSync
+from .ProcessPipeline import ProcessPipeline
+from .SharedRingBuffer import SharedRingBuffer
+from .PacketFramer import PacketFramer, packet_dtype
 from .DataBuffer import DataBuffer
-from .Vector3D import Vector3D
\ No newline at end of file
+from .Metrics import Metrics, MetricsWriter, metrics
+from .Recording import RecordingWriter, RecordingHeader
+from .Replay import Replay
+from .Telemetry import TelemetryPublisher, TelemetrySubscriber
+from .SpectrumAnalyser import SpectrumAnalyser
+from .SampleClock import SampleClock
+from .TickUnwrapper import TickUnwrapper
+from .Resampler import Resampler
+from .CheckpointCache import CheckpointCache
+from .ParameterSweep import run_sweep
+from .BatchProcessor import run_batch
+from .Vector3D import Vector3D
+from .Vector3DArray import Vector3DArray
+
+# the visualisers are imported on first use (pep 562) so headless tools never import
+# matplotlib or Qt, every other name is imported here as before
+# importing a visualiser submodule directly binds the module under its name, so
+# scripts that also use the package take visualisers from their submodule
+#     from src.QtVisualiser import QtVisualiser
+lazy_exports = {
+    "PyPlotVisualiser": "PyPlotVisualiser",
+    "QtVisualiser": "QtVisualiser",
+}
+
+def __getattr__(name):
+    if name not in lazy_exports:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+    value = getattr(importlib.import_module(f".{lazy_exports[name]}", __name__), name)
+    globals()[name] = value
+    return value
+
+def __dir__():
+    return sorted(set(globals()) | set(lazy_exports))
@@ -0,0 +1,53 @@
+import argparse
+import json
+
+from src.ParameterSweep import make_grid, make_random, rank_results, run_sweep, parameter_names, metric_names
+from src.Recording import load_sensor_data
+
+# python sweep.py --input data/data_1.csv --alpha 0.9 0.96 0.98 --gyro-cutoff 50 100 200
+# python sweep.py --input data/data_1.csv --random 64 --alpha 0.8 0.99 --accel-cutoff 5 50
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--input", default="data/data_1.csv", help="csv or binary recording")
+    parser.add_argument("--alpha", default=[0.96], type=float, nargs='+')
+    parser.add_argument("--accel-cutoff", default=[20], type=float, nargs='+')
+    parser.add_argument("--gyro-cutoff", default=[100], type=float, nargs='+')
+    parser.add_argument("--calibration-samples", default=[200], type=int, nargs='+')
+    parser.add_argument("--random", default=None, type=int, help="draw this many configs from the (low, high) of each list instead of a grid")
+    parser.add_argument("--seed", default=0, type=int)
+    parser.add_argument("--workers", default=None, type=int, help="process pool size, 1 runs in this process")
+    parser.add_argument("--rank-by", default=["drift", "noise", "gyro_noise"], nargs='+', choices=list(metric_names))
+    parser.add_argument("--top", default=20, type=int)
+    parser.add_argument("--output", default=None, help="save all ranked results as json")
+
+    args = parser.parse_args()
+
+    values = {
+        "alpha": args.alpha,
+        "accel_cutoff": args.accel_cutoff,
+        "gyro_cutoff": args.gyro_cutoff,
+        "calibration_samples": args.calibration_samples,
+    }
+
+    if args.random is None:
+        configs = make_grid(**values)
+    else:
+        ranges = {name: (min(value), max(value)) for name, value in values.items()}
+        configs = make_random(ranges, args.random, seed=args.seed)
+
+    sensor_data = load_sensor_data(args.input)
+    print(f"Evaluating {len(configs)} configurations over {len(sensor_data)} samples")
+
+    results = rank_results(run_sweep(sensor_data, configs, workers=args.workers), args.rank_by)
+
+    columns = list(parameter_names) + list(metric_names) + ["score"]
+    print(" ".join(f"{column:>19}" for column in columns))
+    for result in results[:args.top]:
+        print(" ".join(f"{result[column]:>19.6g}" for column in columns))
+
+    if args.output is not None:
+        with open(args.output, "w+") as fp:
+            json.dump(results, fp, indent=4)
+
+if __name__ == '__main__':
+    main()
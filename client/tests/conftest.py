@@ -0,0 +1,5 @@
+import os
+import sys
+
+# tests import the client modules the same way the scripts do, from src
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,36 @@
+import asyncio
+import io
+import numpy as np
+import pytest
+
+from benchmarks.FakeSerial import FakeSerial, encode_packets
+from src.AsyncPipeline import AsyncPipeline
+from src.AsyncReader import AsyncReader
+from src.Calibrator import Calibrator
+from src.IMU import IMU
+from src.AsyncPipeline import text_file_sink
+
+def make_pipeline(total=2000):
+    rows = np.zeros((total, 7))
+    rows[:,0] = 2*np.arange(total)
+    rows[:,1] = 1
+    stream, _ = encode_packets(rows)
+    return AsyncPipeline(AsyncReader(FakeSerial(stream, max_read=64)), Calibrator(100), IMU(), max_queued=2)
+
+def test_failing_sink_stops_pipeline():
+    pipeline = make_pipeline()
+
+    async def sink(block):
+        raise RuntimeError("sink failed")
+    pipeline.add_sink(sink)
+
+    with pytest.raises(RuntimeError, match="sink failed"):
+        asyncio.run(asyncio.wait_for(pipeline.run(), timeout=10))
+
+def test_text_file_sink_writes_every_packet():
+    pipeline = make_pipeline()
+    fp = io.StringIO()
+    pipeline.add_sink(text_file_sink(fp), raw=True)
+
+    asyncio.run(asyncio.wait_for(pipeline.run(), timeout=10))
+    assert len(fp.getvalue().splitlines()) == 2000
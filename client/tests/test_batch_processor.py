@@ -0,0 +1,42 @@
+import os
+import shutil
+
+from src.BatchProcessor import find_inputs, read_output, run_batch
+from src.Recording import load_sensor_data, recording_magic, rows_to_records, save_csv, write_recording
+
+data_directory = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data")
+
+def test_globs_only_match_recordings(tmp_path):
+    for name in ("a.csv", "b.bin", "a.out.bin", "a.npz", "cache.json"):
+        (tmp_path / name).write_bytes(b"")
+
+    expected = sorted(str(tmp_path / name) for name in ("a.csv", "b.bin"))
+    assert find_inputs([str(tmp_path / "*")]) == expected
+    assert find_inputs([str(tmp_path)]) == expected
+
+def test_malformed_recording_does_not_stop_batch(tmp_path):
+    shutil.copy(os.path.join(data_directory, "data_0.csv"), tmp_path / "good.csv")
+    # recording magic with a truncated header raises struct.error while loading
+    (tmp_path / "truncated.bin").write_bytes(recording_magic + b"\x01")
+
+    results = run_batch(find_inputs([str(tmp_path)]), str(tmp_path / "out"), workers=1)
+    status = {result["input"].rsplit("/", 1)[-1]: result for result in results}
+
+    assert status["truncated.bin"]["status"] == "failed"
+    assert status["good.csv"]["status"] == "processed"
+    assert len(read_output(status["good.csv"]["output"])) == status["good.csv"]["rows"]
+
+def test_csv_and_binary_recordings_get_separate_outputs(tmp_path):
+    rows = load_sensor_data(os.path.join(data_directory, "data_0.csv"))[:2000]
+    save_csv(str(tmp_path / "data_0.csv"), rows)
+    write_recording(str(tmp_path / "data_0.bin"), rows_to_records(rows))
+
+    inputs = find_inputs([str(tmp_path)])
+    results = run_batch(inputs, str(tmp_path / "out"), workers=2)
+    assert [result["status"] for result in results] == ["processed", "processed"]
+    assert len({result["output"] for result in results}) == 2
+
+    results = run_batch(inputs, str(tmp_path / "out"), workers=2)
+    assert [result["status"] for result in results] == ["skipped", "skipped"]
+    # no temporary files are left next to the outputs
+    assert sorted(os.listdir(tmp_path / "out")) == ["data_0.bin.out.bin", "data_0.csv.out.bin"]
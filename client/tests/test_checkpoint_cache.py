@@ -0,0 +1,52 @@
+import os
+import sys
+
+from src.CheckpointCache import CheckpointCache
+
+def list_files(directory):
+    return sorted(
+        os.path.join(root, name)
+        for root, _, names in os.walk(directory) for name in names)
+
+def disk_size(directory):
+    return sum(os.path.getsize(filename) for filename in list_files(directory))
+
+def test_disk_totals_without_walking_the_directory(tmp_path, monkeypatch):
+    cache = CheckpointCache(max_entries=4, directory=str(tmp_path), max_disk_entries=10)
+
+    listdir = os.listdir
+    def listdir_groups(path):
+        # listing one group for its indices is fine, listing every group is not
+        assert path != str(tmp_path), "put walked the cache directory"
+        return listdir(path)
+    monkeypatch.setattr(sys.modules["src.CheckpointCache"].os, "listdir", listdir_groups)
+
+    for index in range(25):
+        cache.put("recording", (0.96,), index, {"index": index, "values": [0.5]*index})
+    monkeypatch.undo()
+
+    files = list_files(tmp_path)
+    assert len(files) == len(cache.disk_files) == 10
+    assert cache.disk_bytes == disk_size(tmp_path)
+    # the oldest states were removed
+    assert cache.get("recording", (0.96,), 24)["index"] == 24
+    assert cache.get("recording", (0.96,), 0) is None
+
+def test_disk_byte_limit(tmp_path):
+    cache = CheckpointCache(max_entries=4, directory=str(tmp_path), max_disk_bytes=1000)
+    for index in range(50):
+        cache.put("recording", (0.96,), index, {"index": index, "values": [0.25]*10})
+        assert cache.disk_bytes <= 1000
+
+    assert cache.disk_bytes == disk_size(tmp_path)
+    assert len(list_files(tmp_path)) == len(cache.disk_files) < 50
+
+def test_existing_directory_is_scanned_once(tmp_path):
+    cache = CheckpointCache(directory=str(tmp_path))
+    for index in range(8):
+        cache.put("recording", (0.96,), index, {"index": index})
+
+    reopened = CheckpointCache(directory=str(tmp_path), max_disk_entries=5)
+    assert len(reopened.disk_files) == 5
+    assert reopened.disk_bytes == disk_size(tmp_path)
+    assert reopened.find_nearest("recording", (0.96,), 100) == (7, {"index": 7})
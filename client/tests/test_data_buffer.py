@@ -0,0 +1,55 @@
+import numpy as np
+import pytest
+
+from src.DataBuffer import DataBuffer
+
+def make_rows(start, total, width=4, period=2.0):
+    rows = np.zeros((total, width))
+    rows[:,0] = period*np.arange(start, start+total)
+    rows[:,1:] = np.arange(start, start+total)[:,None] + np.arange(1, width)
+    return rows
+
+@pytest.mark.parametrize("sizes", [[7, 13, 1, 40, 3, 25], [100], [1]*90, [61, 61]])
+def test_append_block_matches_append(sizes):
+    # a window longer than the capacity so only the ring bounds the rows
+    block_buffer = DataBuffer(time_window=1000, capacity=50, width=4)
+    row_buffer = DataBuffer(time_window=1000, capacity=50, width=4)
+
+    start = 0
+    for size in sizes:
+        rows = make_rows(start, size)
+        block_buffer.append_block(rows)
+        for row in rows:
+            row_buffer.append(row)
+        start += size
+
+        expected = make_rows(max(0, start - 50), min(start, 50))
+        assert np.array_equal(block_buffer.view(), row_buffer.view())
+        assert np.array_equal(block_buffer.view(), expected)
+        # both copies of the ring hold the same rows
+        assert np.array_equal(block_buffer.data[:50], block_buffer.data[50:])
+
+def test_window_is_truncated_by_time():
+    # 1 s window of 2 ms rows
+    buffer = DataBuffer(time_window=1.0, width=4)
+    buffer.append_block(make_rows(0, 800))
+
+    times = buffer.view()[:,0]
+    # rows exactly time_window before the newest are kept
+    assert times[0] == times[-1] - 1000
+    assert len(buffer) == 501
+
+    start, view = buffer.indexed_view()
+    assert start == 299
+    out = np.empty((buffer.capacity, 4))
+    assert buffer.snapshot_into(out) == 501
+    assert np.array_equal(out[:501], view)
+
+def test_truncation_across_wrap():
+    buffer = DataBuffer(time_window=0.1, capacity=64, width=4)
+    for start in range(0, 500, 37):
+        buffer.append_block(make_rows(start, 37))
+        times = buffer.view()[:,0]
+        assert times[-1] == 2.0*(start + 36)
+        assert times[0] >= times[-1] - 100
+        assert np.all(np.diff(times) == 2.0)
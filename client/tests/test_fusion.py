@@ -0,0 +1,30 @@
+import numpy as np
+import pytest
+
+from src.IMU import IMU
+from src.Fusion import MadgwickFusion, MahonyFusion
+
+def make_readings(total, seed):
+    rng = np.random.default_rng(seed)
+    accel = np.array([1.0, 0.0, 0.0]) + 0.02*rng.normal(size=(total, 3))
+    gyro = 5*rng.normal(size=(total, 3))
+    return accel, gyro
+
+@pytest.mark.parametrize("fusion_type", [MadgwickFusion, MahonyFusion])
+def test_devices_match_single_device_filters(fusion_type):
+    total = 200
+    readings = [make_readings(total, seed) for seed in range(2)]
+    dt = np.full(total, 0.002)
+
+    fusion = fusion_type(devices=2)
+    accel = np.stack([accel for accel, _ in readings], axis=1)
+    gyro = np.stack([gyro for _, gyro in readings], axis=1)
+    orientation = fusion.update_block(gyro, accel, dt)
+
+    for device, (accel, gyro) in enumerate(readings):
+        expected = fusion_type().update_block(gyro, accel, dt)
+        assert np.allclose(orientation[:,device], expected)
+
+def test_imu_rejects_several_devices():
+    with pytest.raises(ValueError):
+        IMU(fusion=MadgwickFusion(devices=2))
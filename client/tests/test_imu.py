@@ -0,0 +1,67 @@
+import numpy as np
+import pytest
+
+from src.Calibrator import Calibrator
+from src.Fusion import MadgwickFusion, MahonyFusion
+from src.IMU import IMU
+from src.Vector3D import Vector3D
+
+def make_readings(total, seed=0):
+    rng = np.random.default_rng(seed)
+    # jittered 2 ms sample times with a few repeated ticks
+    times = 1000 + np.cumsum(rng.choice([0, 1, 2, 2, 3], size=total)).astype(np.float64)
+    accel = np.array([1.0, 0.0, 0.0]) + 0.05*rng.normal(size=(total, 3))
+    gyro = 0.5 + 5*rng.normal(size=(total, 3))
+    return times, accel, gyro
+
+def update_samples(imu, times, accel, gyro):
+    outputs = []
+    for read_time, a, g in zip(times, accel, gyro):
+        imu.update((read_time, Vector3D(*a), Vector3D(*g)))
+        outputs.extend(imu.read_data())
+    return np.array(outputs)
+
+def update_blocks(imu, times, accel, gyro, sizes):
+    bounds = np.cumsum(sizes)
+    return np.concatenate([
+        imu.update_block(times[start:end], accel[start:end], gyro[start:end])
+        for start, end in zip(np.concatenate(([0], bounds[:-1])), bounds)])
+
+@pytest.mark.parametrize("make_fusion", [None, MadgwickFusion, MahonyFusion])
+def test_update_block_matches_update(make_fusion):
+    times, accel, gyro = make_readings(1000)
+    sample_imu = IMU(fusion=None if make_fusion is None else make_fusion())
+    block_imu = IMU(fusion=None if make_fusion is None else make_fusion())
+
+    expected = update_samples(sample_imu, times, accel, gyro)
+    # blocks of uneven sizes, including single samples
+    outputs = update_blocks(block_imu, times, accel, gyro, [1, 7, 250, 1, 500, 241])
+
+    assert outputs.shape == (1000, 25)
+    assert np.allclose(outputs, expected, rtol=1e-9, atol=1e-9)
+    assert np.allclose(list(block_imu.orientation), list(sample_imu.orientation))
+
+@pytest.mark.parametrize("track_bias", [False, True])
+def test_calibrator_filter_block_matches_filter_data(track_bias):
+    times, accel, gyro = make_readings(1000)
+    # quiet enough to count as stationary for bias tracking
+    gravity = np.array([1.0, 0.0, 0.0])
+    accel = gravity + 0.05*(accel - gravity)
+    gyro = 0.5 + 0.01*(gyro - 0.5)
+
+    calibrator = Calibrator(100, track_bias=track_bias)
+    readings = list(calibrator.filter_data(
+        (read_time, Vector3D(*a), Vector3D(*g)) for read_time, a, g in zip(times, accel, gyro)))
+
+    block_calibrator = Calibrator(100, track_bias=track_bias)
+    blocks = [block_calibrator.filter_block(times[i:i+64], accel[i:i+64], gyro[i:i+64]) for i in range(0, 1000, 64)]
+    block_times = np.concatenate([block[0] for block in blocks])
+    block_accel = np.concatenate([block[1] for block in blocks])
+    block_gyro = np.concatenate([block[2] for block in blocks])
+
+    assert len(block_times) == len(readings) == 900
+    assert np.array_equal(block_times, [reading[0] for reading in readings])
+    assert np.allclose(block_accel, [list(reading[1]) for reading in readings])
+    assert np.allclose(block_gyro, [list(reading[2]) for reading in readings])
+    if track_bias:
+        assert block_calibrator.bias_updates == calibrator.bias_updates > 0
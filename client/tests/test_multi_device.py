@@ -0,0 +1,58 @@
+import functools
+import numpy as np
+import pytest
+
+from benchmarks.FakeSerial import FakeSerial, encode_packets
+from src.Calibrator import Calibrator
+from src.IMU import IMU
+from src.Fusion import MahonyFusion
+from src.MultiDeviceReader import MultiDeviceReader
+
+def make_rows(total):
+    rng = np.random.default_rng(0)
+    rows = np.zeros((total, 7))
+    rows[:,0] = 1000 + 2*np.arange(total)
+    rows[:,1] = 1 + 0.01*rng.normal(size=total)
+    rows[:,2:7] = 0.01*rng.normal(size=(total, 5))
+    return rows
+
+@pytest.mark.parametrize("version", [1, 2])
+def test_devices_decode_packet_version(version):
+    total, calibration_samples = 600, 100
+    stream, _ = encode_packets(make_rows(total), version=version)
+    open_coms = [functools.partial(FakeSerial, stream, seed=device) for device in range(2)]
+
+    reader = MultiDeviceReader(open_coms, calibration_samples=calibration_samples, version=version)
+    reader.start()
+    try:
+        blocks = list(reader.get_blocks())
+    finally:
+        reader.stop()
+
+    rows = np.concatenate(blocks)
+    for device in range(2):
+        assert np.sum(rows[:,1] == device) == total - calibration_samples
+    assert np.all(np.diff(rows[:,0]) >= 0)
+
+def test_unknown_packet_version():
+    with pytest.raises(ValueError):
+        MultiDeviceReader([], version=3)
+
+def test_devices_use_fusion_and_bias_tracking():
+    sensor_rows = make_rows(400)
+    stream, _ = encode_packets(sensor_rows)
+    reader = MultiDeviceReader([functools.partial(FakeSerial, stream)], calibration_samples=100, fusion="mahony", track_bias=True)
+    reader.start()
+    try:
+        rows = np.concatenate(list(reader.get_blocks()))
+    finally:
+        reader.stop()
+
+    calibrator = Calibrator(100, track_bias=True)
+    imu = IMU(fusion=MahonyFusion())
+    times, accel, gyro = calibrator.filter_block(sensor_rows[:,0], sensor_rows[:,1:4], sensor_rows[:,4:7])
+    assert np.allclose(rows[:,2:], imu.update_block(times, accel, gyro))
+
+def test_unknown_fusion():
+    with pytest.raises(ValueError):
+        MultiDeviceReader([], fusion="kalman")
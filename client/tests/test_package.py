@@ -0,0 +1,27 @@
+import os
+import subprocess
+import sys
+
+client_directory = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def run(code):
+    subprocess.run([sys.executable, "-c", code], cwd=client_directory, check=True)
+
+def test_package_names_are_classes():
+    run("import inspect\n"
+        "from src import IMU, Vector3D, Calibrator, Reader, DataBuffer\n"
+        "assert all(inspect.isclass(value) for value in (IMU, Vector3D, Calibrator, Reader, DataBuffer))\n"
+        "assert list(Vector3D(1, 2, 3)) == [1, 2, 3]\n")
+
+def test_submodule_imports_keep_package_classes():
+    run("import inspect\n"
+        "from src.Reader import Reader\n"
+        "import src.Vector3D\n"
+        "from src import IMU, Vector3D\n"
+        "assert inspect.isclass(IMU) and inspect.isclass(Vector3D)\n")
+
+def test_visualisers_load_lazily():
+    run("import sys\n"
+        "from src import Calibrator, IMU\n"
+        "assert 'src.QtVisualiser' not in sys.modules and 'src.PyPlotVisualiser' not in sys.modules\n"
+        "assert 'matplotlib' not in sys.modules\n")
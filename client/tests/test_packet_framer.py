@@ -0,0 +1,137 @@
+import numpy as np
+import pytest
+
+from benchmarks.FakeSerial import encode_packets
+from src.PacketFramer import PacketFramer, packet_v2_dtype, stm32_crc32, stm32_crc32_block
+
+def make_rows(total):
+    rng = np.random.default_rng(0)
+    rows = np.zeros((total, 7))
+    rows[:,0] = 1000 + 2*np.arange(total)
+    rows[:,1:7] = rng.normal(size=(total, 6))
+    return rows.astype(np.float32).astype(np.float64)
+
+def read_all(framer, stream, chunk_size=37):
+    blocks = []
+    for i in range(0, len(stream), chunk_size):
+        framer.feed(stream[i:i+chunk_size])
+        block = framer.read_block()
+        # empty blocks from before the version is detected have the default dtype
+        if len(block) > 0:
+            blocks.append(block)
+    if len(blocks) == 0:
+        return np.empty(0, dtype=framer.packet_dtype)
+    return np.concatenate(blocks)
+
+def test_crc_check_value():
+    # CRC-32/MPEG-2 check value
+    assert stm32_crc32(b"123456789") == 0x0376E6E7
+    assert stm32_crc32(b"") == 0xFFFFFFFF
+
+def test_crc_block_matches_single():
+    rng = np.random.default_rng(0)
+    data = rng.integers(0, 256, 10*36, dtype=np.uint8).tobytes()
+    expected = [stm32_crc32(data[i:i+32]) for i in range(0, len(data), 36)]
+    assert stm32_crc32_block(data, 36, 32).tolist() == expected
+
+@pytest.mark.parametrize("version", [1, 2])
+def test_resync_over_garbage(version):
+    rows = make_rows(500)
+    stream, _ = encode_packets(rows, garbage_rate=0.3, version=version)
+
+    framer = PacketFramer(capacity=256, version=version)
+    packets = read_all(framer, stream)
+
+    assert len(packets) == len(rows)
+    assert np.array_equal(packets["time"], rows[:,0])
+    assert np.array_equal(packets["accel"], rows[:,1:4])
+    assert np.array_equal(packets["gyro"], rows[:,4:7])
+    assert framer.skipped_bytes > 0
+
+def test_corrupt_packet_is_rejected():
+    rows = make_rows(100)
+    stream, _ = encode_packets(rows)
+    size = packet_v2_dtype.itemsize
+    corrupt = 40
+    stream = bytearray(stream)
+    # a flipped bit in the gyro payload of one packet
+    stream[corrupt*size + size - 6] ^= 0x01
+
+    framer = PacketFramer()
+    packets = read_all(framer, bytes(stream))
+
+    expected = np.delete(np.arange(len(rows)), corrupt)
+    assert np.array_equal(packets["sequence"], expected)
+    assert np.array_equal(packets["time"], rows[expected,0])
+    assert framer.crc_failures == 1
+    assert framer.sequence_gaps == 1
+    assert framer.lost_packets == 1
+
+def test_read_packets_matches_read_block():
+    rows = make_rows(200)
+    stream, _ = encode_packets(rows, garbage_rate=0.3)
+    stream = bytearray(stream)
+    stream[len(stream)//2] ^= 0xFF
+
+    block_framer = PacketFramer()
+    packets = read_all(block_framer, bytes(stream))
+
+    framer = PacketFramer()
+    readings = []
+    for i in range(0, len(stream), 37):
+        framer.feed(stream[i:i+37])
+        readings.extend(framer.read_packets())
+
+    assert len(readings) == len(packets)
+    assert np.array_equal([reading[0] for reading in readings], packets["time"])
+    assert framer.crc_failures == block_framer.crc_failures
+    assert framer.lost_packets == block_framer.lost_packets
+
+@pytest.mark.parametrize("version", [1, 2])
+def test_version_is_detected(version):
+    rows = make_rows(300)
+    stream, _ = encode_packets(rows, garbage_rate=0.3, version=version)
+    stream = b"\x00\xba\x41\x02\x13" + stream
+
+    framer = PacketFramer()
+    packets = read_all(framer, stream, chunk_size=5)
+
+    # version 1 needs detect_packets packets in a row, so packets before the first
+    # run without garbage are skipped
+    assert framer.version == version
+    assert len(rows) - 10 < len(packets) <= len(rows)
+    assert np.array_equal(packets["time"], rows[-len(packets):,0])
+    if version == 2:
+        assert len(packets) == len(rows)
+
+    packet_framer = PacketFramer()
+    packet_framer.feed(stream)
+    readings = list(packet_framer.read_packets())
+    assert packet_framer.version == version
+    assert len(readings) == len(packets)
+
+def test_wrong_version_decodes_nothing():
+    stream, _ = encode_packets(make_rows(100), version=1)
+    framer = PacketFramer(version=2)
+    assert len(read_all(framer, stream)) == 0
+    assert framer.crc_failures == 0
+    assert framer.false_headers > 0
+
+def test_false_header_is_not_a_crc_failure():
+    rows = make_rows(20)
+    stream, _ = encode_packets(rows)
+    size = packet_v2_dtype.itemsize
+    # garbage that starts like a version 2 packet between packets 4 and 5
+    false_packet = b"\xba\x41\x02" + bytes(range(10))
+    stream = stream[:5*size] + false_packet + stream[5*size:]
+
+    for read in ("block", "packets"):
+        framer = PacketFramer()
+        framer.feed(stream)
+        if read == "block":
+            total = len(framer.read_block())
+        else:
+            total = len(list(framer.read_packets()))
+        assert total == len(rows)
+        assert framer.crc_failures == 0
+        assert framer.false_headers == 1
@@ -0,0 +1,26 @@
+import os
+import warnings
+import numpy as np
+
+from src.ParameterSweep import make_grid, rank_results, run_sweep
+from src.Recording import load_sensor_data
+
+data_directory = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data")
+
+def test_gyro_cutoff_changes_metrics():
+    sensor_data = load_sensor_data(os.path.join(data_directory, "data_1.csv"))[:3000]
+    results = run_sweep(sensor_data, make_grid(gyro_cutoff=[50, 100]), workers=1)
+    assert results[0]["gyro_noise"] != results[1]["gyro_noise"]
+
+def test_pool_matches_single_process():
+    sensor_data = load_sensor_data(os.path.join(data_directory, "data_1.csv"))[:2000]
+    configs = make_grid(alpha=[0.9, 0.96])
+    assert run_sweep(sensor_data, configs, workers=2) == run_sweep(sensor_data, configs, workers=1)
+
+def test_rank_leaves_zero_and_nan_medians_unscaled():
+    results = [{"noise": value, "drift": np.nan} for value in (4.0, 0.0, 0.0)]
+    with warnings.catch_warnings():
+        warnings.simplefilter("error")
+        scores = [result["score"] for result in rank_results(results, ("noise",))]
+        rank_results(results, ("drift",))
+    assert scores == [0.0, 0.0, 4.0]
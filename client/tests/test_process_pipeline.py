@@ -0,0 +1,67 @@
+import functools
+import multiprocessing
+import threading
+import time
+import numpy as np
+
+from benchmarks.FakeSerial import FakeSerial, encode_packets
+from src.Calibrator import Calibrator
+from src.IMU import IMU
+from src.Fusion import MadgwickFusion
+from src.ProcessPipeline import ProcessPipeline
+from src.SharedRingBuffer import SharedRingBuffer
+
+def test_pipeline_uses_packet_version_and_fusion():
+    total = 400
+    rng = np.random.default_rng(0)
+    rows = np.zeros((total, 7))
+    rows[:,0] = 2*np.arange(total)
+    rows[:,1] = 1 + 0.01*rng.normal(size=total)
+    rows[:,2:7] = 0.01*rng.normal(size=(total, 5))
+    stream, _ = encode_packets(rows, version=1)
+
+    pipeline = ProcessPipeline(functools.partial(FakeSerial, stream), calibration_samples=100, version=1, fusion="madgwick", track_bias=True)
+    pipeline.start()
+    try:
+        outputs = np.concatenate(list(pipeline.get_blocks()))
+    finally:
+        pipeline.stop()
+
+    calibrator = Calibrator(100, track_bias=True)
+    imu = IMU(fusion=MadgwickFusion())
+    times, accel, gyro = calibrator.filter_block(rows[:,0], rows[:,1:4], rows[:,4:7])
+    assert np.allclose(outputs, imu.update_block(times, accel, gyro))
+
+def test_full_ring_put_returns_on_stop():
+    ring = SharedRingBuffer(16, 7)
+    stop_event = multiprocessing.Event()
+    try:
+        assert ring.put(np.zeros((16, 7))) == 16
+        threading.Timer(0.2, stop_event.set).start()
+        start = time.monotonic()
+        assert ring.put(np.ones((4, 7)), stop_event=stop_event, poll_interval=0.05) == 0
+        assert time.monotonic() - start < 2
+        assert ring.dropped == 4
+        assert ring.put(np.ones((4, 7)), timeout=0.1) == 0
+    finally:
+        ring.release()
+
+def test_stop_after_processor_dies():
+    rows = np.zeros((20000, 7))
+    rows[:,0] = 2*np.arange(len(rows))
+    rows[:,1] = 1
+    stream, _ = encode_packets(rows)
+
+    pipeline = ProcessPipeline(functools.partial(FakeSerial, stream, rate=2000), capacity=256, stop_timeout=1.0)
+    pipeline.start()
+    pipeline.processes[1].kill()
+    # the reader fills the raw ring and waits on it
+    time.sleep(0.5)
+
+    start = time.monotonic()
+    try:
+        assert all(len(block) > 0 for block in pipeline.get_blocks())
+    finally:
+        pipeline.stop()
+    assert time.monotonic() - start < 5
+    assert not any(process.is_alive() for process in pipeline.processes)
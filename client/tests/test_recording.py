@@ -0,0 +1,85 @@
+import numpy as np
+import pytest
+
+from src.Recording import RecordingHeader, RecordingWriter, header_struct, load_sensor_data, map_recording
+from src.Recording import read_recording, record_dtype, rows_to_records, write_recording
+from src.Vector3D import Vector3D
+
+def make_rows(total):
+    rng = np.random.default_rng(0)
+    rows = np.zeros((total, 7))
+    rows[:,0] = 1000 + 2*np.arange(total)
+    rows[:,1:7] = rng.normal(size=(total, 6))
+    # values a float32 record holds exactly
+    return rows.astype(np.float32).astype(np.float64)
+
+def check_header(header, total):
+    assert header.sample_rate == 250.0
+    assert header.accel_range == 8.0
+    assert header.gyro_range == 500.0
+    assert header.accel_offset == pytest.approx((0.5, -0.25, 0.125))
+    assert header.gyro_offset == pytest.approx((1.5, 2.5, -3.5))
+    assert header.total_records == total
+
+def make_header():
+    return RecordingHeader(250.0, 8.0, 500.0, accel_offset=(0.5, -0.25, 0.125), gyro_offset=(1.5, 2.5, -3.5))
+
+def test_write_read_round_trip(tmp_path):
+    filename = str(tmp_path / "recording.bin")
+    rows = make_rows(500)
+    write_recording(filename, rows_to_records(rows), make_header())
+
+    header, records = read_recording(filename)
+    check_header(header, 500)
+    assert np.array_equal(load_sensor_data(filename), rows)
+
+    header, records = map_recording(filename)
+    check_header(header, 500)
+    assert np.array_equal(records["time"], rows[:,0])
+    assert np.array_equal(records["gyro"], rows[:,4:7])
+
+def test_writer_round_trip(tmp_path):
+    filename = str(tmp_path / "recording.bin")
+    rows = make_rows(300)
+
+    writer = RecordingWriter(filename, RecordingHeader(250.0, 8.0, 500.0), flush_interval=0.01)
+    writer.write_block(rows_to_records(rows[:100]))
+    for row in rows[100:150]:
+        writer.write(row[0], Vector3D(*row[1:4]), Vector3D(*row[4:7]))
+    writer.write_block(rows_to_records(rows[150:]))
+    # offsets found after recording started are kept in the final header
+    writer.set_calibration((0.5, -0.25, 0.125), (1.5, 2.5, -3.5))
+    writer.close()
+
+    header, _ = read_recording(filename)
+    check_header(header, 300)
+    assert np.array_equal(load_sensor_data(filename), rows)
+
+def test_truncated_final_record_is_ignored(tmp_path):
+    filename = str(tmp_path / "recording.bin")
+    rows = make_rows(100)
+    write_recording(filename, rows_to_records(rows), make_header())
+    # an interrupted write leaves part of a record
+    with open(filename, "ab") as fp:
+        fp.write(rows_to_records(make_rows(1)).tobytes()[:record_dtype.itemsize // 2])
+
+    header, records = read_recording(filename)
+    assert header.total_records == 100
+    assert np.array_equal(records["time"], rows[:,0])
+
+    _, records = map_recording(filename)
+    assert len(records) == 100
+    assert np.array_equal(records["accel"], rows[:,1:4])
+
+def test_header_only_recording(tmp_path):
+    filename = str(tmp_path / "recording.bin")
+    with open(filename, "wb") as fp:
+        fp.write(RecordingHeader().pack())
+    assert len(map_recording(filename)[1]) == 0
+    assert header_struct.size == 64
+
+def test_not_a_recording(tmp_path):
+    filename = tmp_path / "recording.bin"
+    filename.write_bytes(b"x"*header_struct.size)
+    with pytest.raises(ValueError):
+        read_recording(str(filename))
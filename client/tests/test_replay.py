@@ -0,0 +1,25 @@
+import numpy as np
+
+from src.CheckpointCache import CheckpointCache
+from src.Replay import Replay
+from src.Recording import RecordingHeader, rows_to_records, write_recording
+
+def make_recording(filename, total):
+    rng = np.random.default_rng(0)
+    rows = np.zeros((total, 7))
+    rows[:,0] = 2*np.arange(total)
+    rows[:,1] = 1 + 0.01*rng.normal(size=total)
+    rows[:,2:7] = 0.01*rng.normal(size=(total, 5))
+    write_recording(filename, rows_to_records(rows), RecordingHeader(sample_rate=500.0))
+
+def test_seek_back_past_cache_size(tmp_path):
+    filename = str(tmp_path / "recording.bin")
+    make_recording(filename, 20000)
+
+    replay = Replay(filename, checkpoint_interval=0.1, cache=CheckpointCache(max_entries=16))
+    end = replay.get_range(replay.end_time - 1000, replay.end_time)
+    start = replay.get_range(replay.start_time, replay.start_time + 1000)
+
+    reference = Replay(filename, checkpoint_interval=0.1)
+    assert np.allclose(start, reference.get_range(reference.start_time, reference.start_time + 1000))
+    assert np.allclose(end, reference.get_range(reference.end_time - 1000, reference.end_time))
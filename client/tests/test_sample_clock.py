@@ -0,0 +1,88 @@
+import os
+import numpy as np
+
+from src.Recording import load_sensor_data
+from src.Resampler import Resampler
+from src.SampleClock import SampleClock
+from src.TickUnwrapper import TickUnwrapper
+
+data_directory = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data")
+
+def make_ticks(start, period, total, phase=0.3):
+    return (np.floor(start + phase + period*np.arange(total)).astype(np.int64) % (1 << 32))
+
+def test_recorded_ticks_give_a_steady_clock():
+    ticks = load_sensor_data(os.path.join(data_directory, "data_1.csv"))[:,0]
+    clock = SampleClock()
+    times = clock.update_block(ticks)
+
+    assert clock.lost_samples == 0
+    assert abs(clock.rate - 497.76) < 0.01
+    assert np.all(np.abs(np.diff(times[1000:]) - 1000/clock.rate) < 0.2)
+
+def test_wraparound_lost_samples_and_reset():
+    period = 2.01
+    ticks = make_ticks((1 << 32) - 5000, period, 10000)
+    keep = np.ones(len(ticks), dtype=bool)
+    keep[[100, 5000, 5001, 7000]] = False
+    ticks = np.concatenate((ticks[keep], make_ticks(50, 2.0, 2000)))
+
+    clock = SampleClock()
+    times = np.concatenate([clock.update_block(ticks[i:i+64]) for i in range(0, len(ticks), 64)])
+
+    assert clock.lost_samples == 4
+    assert clock.total_resets == 1
+    assert np.all(np.diff(times[:9996]) > 0)
+    # times before the reset follow the true clock across the wraparound
+    true_times = 0.3 + period*np.flatnonzero(keep)
+    error = (times[:9996] - true_times)[500:]
+    assert np.abs(error - np.median(error)).max() < 0.1
+
+def test_update_matches_single_sample_blocks():
+    ticks = load_sensor_data(os.path.join(data_directory, "data_1.csv"))[:5000,0]
+    per_sample, blocks = SampleClock(window=200), SampleClock(window=200)
+    times = np.array([per_sample.update(tick) for tick in ticks])
+    assert np.array_equal(times, np.concatenate([blocks.update_block(ticks[i:i+1]) for i in range(len(ticks))]))
+
+def test_block_size_changes_times_little():
+    ticks = load_sensor_data(os.path.join(data_directory, "data_1.csv"))[:,0]
+    whole = SampleClock().update_block(ticks)
+    clock = SampleClock()
+    streamed = np.concatenate([clock.update_block(ticks[i:i+7]) for i in range(0, len(ticks), 7)])
+    assert np.abs(streamed - whole)[1000:].max() < 0.2
+
+def test_resampler_is_block_size_invariant():
+    rng = np.random.default_rng(0)
+    times = np.cumsum(rng.uniform(1.5, 2.5, 3000))
+    values = rng.normal(size=(3000, 6))
+
+    whole_times, whole_values = Resampler(500.0).resample(times, values)
+    for block_size in (1, 7, 256):
+        resampler = Resampler(500.0)
+        blocks = [resampler.resample(times[i:i+block_size], values[i:i+block_size]) for i in range(0, len(times), block_size)]
+        assert np.array_equal(np.concatenate([block[0] for block in blocks]), whole_times)
+        assert np.allclose(np.concatenate([block[1] for block in blocks]), whole_values)
+
+    assert np.allclose(np.diff(whole_times), 2.0)
+    assert np.allclose(whole_values[:,0], np.interp(whole_times, times, values[:,0]))
+
+def test_unwrap_blocks_match_single_ticks():
+    ticks = make_ticks((1 << 32) - 1000, 2.0, 1500)
+    expected = (1 << 32) - 1000 + np.floor(0.3 + 2.0*np.arange(1500))
+
+    unwrapper = TickUnwrapper()
+    blocks = np.concatenate([unwrapper.unwrap(ticks[i:i+64]) for i in range(0, 1500, 64)])
+    single_unwrapper = TickUnwrapper()
+    single = [single_unwrapper.unwrap_one(tick) for tick in ticks]
+
+    assert np.array_equal(blocks, expected)
+    assert np.array_equal(single, expected)
+
+def test_resampler_passes_empty_blocks():
+    resampler = Resampler(500)
+    times, accel, gyro = resampler.filter_block(np.empty(0), np.empty((0, 3)), np.empty((0, 3)))
+    assert len(times) == 0 and accel.shape == (0, 3) and gyro.shape == (0, 3)
+
+    resampler.filter_block(np.array([0.0, 2.0]), np.ones((2, 3)), np.ones((2, 3)))
+    times, accel, _ = resampler.filter_block(np.empty(0), np.empty((0, 3)), np.empty((0, 3)))
+    assert len(times) == 0 and accel.shape == (0, 3)
@@ -0,0 +1,77 @@
+import numpy as np
+import pytest
+
+from src.SpectrumAnalyser import SpectrumAnalyser
+
+sample_rate = 500.0
+frequencies = np.array([12.3, 50.0, 80.7, 5.0, 101.1, 200.4])
+amplitudes = np.array([0.1, 0.2, 0.05, 3.0, 1.5, 0.5])
+
+def make_rows(total):
+    times = 1000 * np.arange(total) / sample_rate
+    rows = np.empty((total, 7))
+    rows[:,0] = times
+    rows[:,1:] = amplitudes * np.sin(2*np.pi*frequencies*times[:,None]/1000) + np.arange(6)
+    return rows
+
+def add_blocks(analyser, rows, size):
+    results = []
+    analyser.add_listener(results.append)
+    for i in range(0, len(rows), size):
+        analyser.add_rows(rows[i:i+size])
+    return results
+
+def test_peak_frequency_and_rms():
+    analyser = SpectrumAnalyser(1024, 0.5, 4, publish_interval=0)
+    add_blocks(analyser, make_rows(4096), 100)
+    result = analyser.get_result()
+
+    assert result["sample_rate"] == pytest.approx(sample_rate)
+    # interpolated peaks are well within a bin of 0.49 Hz
+    assert np.allclose(result["peak_frequency"], frequencies, atol=0.1)
+    # the mean is removed so each channel is the rms of its sinusoid
+    assert np.allclose(result["rms"], amplitudes / np.sqrt(2), rtol=0.01)
+    # integrating the psd gives the variance back, less what the taper leaks
+    power = np.sum(result["psd"], axis=0) * result["frequencies"][1]
+    assert np.allclose(power, amplitudes**2 / 2, rtol=0.05)
+
+@pytest.mark.parametrize("size", [1, 37, 256, 1000])
+def test_welch_average_is_independent_of_blocks(size):
+    window_size, hop_size, averages = 256, 128, 4
+    rows = make_rows(2000)
+    rows[:,1:] += np.random.default_rng(0).normal(size=(2000, 6))
+
+    analyser = SpectrumAnalyser(window_size, 0.5, averages, sample_rate=sample_rate, publish_interval=0)
+    results = add_blocks(analyser, rows, size)
+
+    # one spectrum per hop once the first window is full
+    total_spectra = (len(rows) - window_size) // hop_size + 1
+    assert analyser.total_spectra == len(results) == total_spectra
+
+    # average of the last windows computed directly
+    taper = np.hanning(window_size)[:,None]
+    ends = [window_size + hop_size*i for i in range(total_spectra)][-averages:]
+    psds = []
+    for end in ends:
+        window = rows[end-window_size:end, 1:]
+        spectrum = np.fft.rfft((window - window.mean(axis=0)) * taper, axis=0)
+        psd = np.abs(spectrum)**2 / (sample_rate * np.sum(taper**2))
+        psd[1:-1] *= 2
+        psds.append(psd)
+
+    assert results[-1]["time"] == rows[ends[-1]-1, 0]
+    assert np.allclose(results[-1]["psd"], np.mean(psds, axis=0))
+
+def test_thread_matches_add_rows():
+    rows = make_rows(3000)
+    direct = SpectrumAnalyser(512, 0.5, 4, publish_interval=0)
+    add_blocks(direct, rows, 3000)
+
+    analyser = SpectrumAnalyser(512, 0.5, 4, publish_interval=0, max_queued=None)
+    analyser.start()
+    for i in range(0, len(rows), 64):
+        analyser.filter_block(rows[i:i+64,0], rows[i:i+64,1:4], rows[i:i+64,4:7])
+    analyser.stop()
+
+    assert analyser.total_spectra == direct.total_spectra
+    assert np.allclose(analyser.get_result()["psd"], direct.get_result()["psd"])
@@ -0,0 +1,121 @@
+import socket
+import threading
+import time
+import numpy as np
+import pytest
+
+from src.Telemetry import TelemetryPublisher, TelemetrySubscriber, encode_message, kind_fused, kind_raw
+
+def free_port(kind):
+    with socket.socket(socket.AF_INET, kind) as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+def make_url(scheme, tmp_path):
+    if scheme == "unix":
+        return f"unix://{tmp_path}/telemetry.sock"
+    kind = socket.SOCK_DGRAM if scheme == "udp" else socket.SOCK_STREAM
+    return f"{scheme}://127.0.0.1:{free_port(kind)}"
+
+def wait_for(condition, timeout=5.0):
+    end_time = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < end_time, "timed out"
+        time.sleep(0.01)
+
+def make_rows(total, width, start=0):
+    return start + np.arange(total*width, dtype=np.float64).reshape(total, width)
+
+# collects blocks of the given kind on a thread until total rows have arrived
+class Collector:
+    def __init__(self, subscriber, kind, total):
+        self.subscriber = subscriber
+        self.kind = kind
+        self.total = total
+        self.blocks = []
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def run(self):
+        for rows in self.subscriber.get_blocks(self.kind):
+            self.blocks.append(rows)
+            if sum(len(block) for block in self.blocks) >= self.total:
+                return
+
+    def join(self):
+        self.thread.join(5.0)
+        assert not self.thread.is_alive(), "timed out"
+        return np.concatenate(self.blocks)
+
+@pytest.mark.parametrize("scheme", ["tcp", "udp", "unix"])
+def test_publish_subscribe_loopback(scheme, tmp_path):
+    url = make_url(scheme, tmp_path)
+    publisher = TelemetryPublisher(url)
+    publisher.start()
+    subscriber = TelemetrySubscriber(url, read_timeout=0.05)
+    try:
+        subscriber.connect()
+        wait_for(lambda: publisher.get_stats()["subscribers"] == 1)
+
+        # udp splits a block this size over several datagrams
+        fused = make_rows(3000, 25)
+        collector = Collector(subscriber, kind_fused, len(fused))
+        publisher.publish_raw(make_rows(10, 7))
+        publisher.publish_fused(fused[:1000])
+        publisher.publish_fused(fused[1000:])
+
+        assert np.array_equal(collector.join(), fused)
+        assert subscriber.lost_messages == 0
+    finally:
+        subscriber.close()
+        publisher.stop()
+
+def test_corrupt_datagram_is_skipped(tmp_path):
+    url = make_url("udp", tmp_path)
+    publisher = TelemetryPublisher(url)
+    publisher.start()
+    subscriber = TelemetrySubscriber(url, read_timeout=0.05)
+    try:
+        subscriber.connect()
+        wait_for(lambda: publisher.get_stats()["subscribers"] == 1)
+        collector = Collector(subscriber, kind_raw, 20)
+
+        publisher.publish_raw(make_rows(10, 7))
+        wait_for(lambda: len(collector.blocks) == 1)
+        # a datagram that is not a telemetry message, then a message whose gap it fills
+        with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as sock:
+            sock.sendto(b"XXXX" + encode_message(kind_raw, make_rows(5, 7), 1)[4:], subscriber.sock.getsockname())
+        time.sleep(0.1)
+        publisher.sequences[kind_raw] += 1
+        publisher.publish_raw(make_rows(10, 7, 100))
+
+        rows = collector.join()
+        assert np.array_equal(rows[10:], make_rows(10, 7, 100))
+        assert subscriber.corrupt_messages == 1
+        assert subscriber.lost_messages == 1
+    finally:
+        subscriber.close()
+        publisher.stop()
+
+def test_stream_resyncs_after_corrupt_bytes(tmp_path):
+    url = make_url("tcp", tmp_path)
+    server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    server.bind(("127.0.0.1", int(url.rsplit(":", 1)[1])))
+    server.listen()
+    subscriber = TelemetrySubscriber(url, read_timeout=0.05)
+    try:
+        subscriber.connect()
+        connection, _ = server.accept()
+        collector = Collector(subscriber, kind_raw, 20)
+        with connection:
+            connection.sendall(
+                encode_message(kind_raw, make_rows(10, 7), 0) + b"garbage bytes" +
+                encode_message(kind_raw, make_rows(10, 7, 100), 1))
+            rows = collector.join()
+
+        assert np.array_equal(rows, np.concatenate((make_rows(10, 7), make_rows(10, 7, 100))))
+        assert subscriber.corrupt_messages == 1
+        assert subscriber.lost_messages == 1
+    finally:
+        subscriber.close()
+        server.close()
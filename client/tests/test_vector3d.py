@@ -0,0 +1,54 @@
+import numpy as np
+
+from src.Vector3D import Vector3D
+from src.Vector3DArray import Vector3DArray
+
+def make_vectors(total, seed=0):
+    rng = np.random.default_rng(seed)
+    return [Vector3D(*row) for row in rng.normal(size=(total, 3))]
+
+def test_in_place_operators_keep_the_vector():
+    v = Vector3D(1, 2, 3)
+    same = v
+    v += Vector3D(1, 1, 1)
+    v -= Vector3D(0, 1, 2)
+    v *= 2
+    v /= 4
+    assert v is same
+    assert list(v) == [1.0, 1.0, 1.0]
+
+def test_array_matches_vector_arithmetic():
+    a, b = make_vectors(10, 0), make_vectors(10, 1)
+    scales = np.arange(1, 11, dtype=np.float64)
+    array_a, array_b = Vector3DArray.from_vectors(a), Vector3DArray.from_vectors(b)
+
+    expected = [(u + v)*k - v/2 for u, v, k in zip(a, b, scales)]
+    result = (array_a + array_b)*scales - array_b/2
+
+    assert len(result) == 10
+    assert np.allclose(result.to_rows(), [list(v) for v in expected])
+    assert np.allclose(list(result[3]), list(expected[3]))
+
+def test_array_in_place_operators():
+    vectors = make_vectors(5)
+    array = Vector3DArray.from_vectors(vectors)
+    data = array.data
+    offset = Vector3D(1, 2, 3)
+
+    array -= offset
+    array *= 3
+    array += Vector3DArray.zeros(5)
+    array /= np.arange(1, 6)
+
+    assert array.data is data
+    expected = [(v - offset)*3/k for v, k in zip(vectors, range(1, 6))]
+    assert np.allclose(array.to_rows(), [list(v) for v in expected])
+
+def test_array_slices_and_assignment():
+    array = Vector3DArray.from_rows(np.arange(12).reshape(4, 3))
+    assert np.array_equal(array[1:3].to_rows(), [[3, 4, 5], [6, 7, 8]])
+    assert np.array_equal(array.y, [1, 4, 7, 10])
+
+    array[0] = Vector3D(-1, -2, -3)
+    array[2:] = 0
+    assert np.array_equal(array.to_rows(), [[-1, -2, -3], [3, 4, 5], [0, 0, 0], [0, 0, 0]])
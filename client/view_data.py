@@ -1,48 +1,141 @@
-import pandas as pd
 import numpy as np
-from matplotlib import pyplot as plt 
 import argparse
+import time
 
-from src import IMU, Calibrator, QtVisualiser, PyPlotVisualiser, Vector3D, Calibrator
+from src.IMU import IMU
+from src.Calibrator import Calibrator
+from src.Replay import Replay
+from src.SampleClock import SampleClock
+from src.Resampler import Resampler
+from src.Fusion import make_fusion
+from src.Recording import load_sensor_data
+from src.Telemetry import TelemetrySubscriber, kind_raw
 
 def main():
     parser = argparse.ArgumentParser()
-    parser.add_argument("--input", default="data/data_0.csv")
+    parser.add_argument("--input", default="data/data_0.csv", help="csv or binary recording")
     parser.add_argument("--mode", default='qt', const='qt', nargs='?', choices=['qt', 'pyplot'])
+    parser.add_argument("--fusion", default=None, choices=["madgwick", "mahony"], help="quaternion filter instead of the complementary filter")
+    parser.add_argument("--reconstruct-time", action='store_true', help="smooth the 1 ms tick timestamps with a fitted sample clock")
+    parser.add_argument("--resample-rate", default=None, type=float, help="Hz, interpolate calibrated readings onto a fixed rate")
+    parser.add_argument("--replay", action='store_true', help="memory map the recording and only process the visible window, only with --input, --fusion and the qt mode")
+    parser.add_argument("--window", default=10.0, type=float, help="initial replay window (s)")
+    parser.add_argument("--max-window", default=120.0, type=float, help="longest replay window processed at once (s)")
+    parser.add_argument("--checkpoint-interval", default=10.0, type=float, help="seconds between cached filter states")
+    parser.add_argument("--source", default=None, help="record raw readings from a publish_data.py stream, e.g. tcp://127.0.0.1:5760, instead of --input")
+    parser.add_argument("--duration", default=10.0, type=float, help="seconds recorded from --source")
+    parser.add_argument("--frames", default=None, help="render frames without a window to a directory of pngs, a .gif or a .mp4")
+    parser.add_argument("--frame-window", default=5.0, type=float, help="seconds shown in each rendered frame")
+    parser.add_argument("--frame-rate", default=30, type=int, help="rendered frames per second of recording")
 
     args = parser.parse_args()
+    # replay processes windows of the recording as they come into view in the qt viewer
+    if args.replay:
+        ignored = [
+            name for name, is_set in (
+                ("--reconstruct-time", args.reconstruct_time),
+                ("--resample-rate", args.resample_rate is not None),
+                ("--source", args.source is not None),
+                ("--frames", args.frames is not None),
+                ("--mode pyplot", args.mode != 'qt'),
+            ) if is_set
+        ]
+        if len(ignored) > 0:
+            parser.error(f"--replay cannot be used with {', '.join(ignored)}")
+        view_replay(args)
+        return
 
-    df = pd.read_csv(args.input, sep=' ')
-    sensor_data = df.to_numpy(dtype=np.float)
+    if args.source is not None:
+        sensor_data = record_source(args.source, args.duration)
+    else:
+        sensor_data = load_sensor_data(args.input)
 
     calibrator = Calibrator(200)
-    raw_data = get_reader_data(sensor_data)
-    calibrated_data = calibrator.filter_data(raw_data) 
-    
-    imu = IMU()
+    imu = IMU(fusion=None if args.fusion is None else make_fusion(args.fusion))
+
+    # process the whole recording as one block
+    times = sensor_data[:,0]
+    if args.reconstruct_time:
+        clock = SampleClock()
+        times = clock.update_block(times)
+        print(f"Sample clock {clock.rate:.3f} Hz, {clock.lost_samples} lost samples")
+    times, accel, gyro = calibrator.filter_block(times, sensor_data[:,1:4], sensor_data[:,4:7])
+    if args.resample_rate is not None:
+        times, accel, gyro = Resampler(args.resample_rate).filter_block(times, accel, gyro)
+    imu_data = imu.update_block(times, accel, gyro)
+
+    # visualisers are imported when used so only the chosen gui library is loaded
+    if args.frames is not None:
+        from src.PyPlotVisualiser import PyPlotVisualiser
+        visualiser = PyPlotVisualiser(imu_data, offscreen=True, figsize=(15, 5))
+        total = visualiser.save_frames(args.frames, window=args.frame_window, fps=args.frame_rate)
+        print(f"Rendered {total} frames to {args.frames}")
+        return
 
     if args.mode == 'qt':
-        visualiser = QtVisualiser()
+        from src.QtVisualiser import QtVisualiser
+        visualiser = QtVisualiser(imu_data)
     else:
-        visualiser = PyPlotVisualiser()
+        from src.PyPlotVisualiser import PyPlotVisualiser
+        visualiser = PyPlotVisualiser(imu_data)
 
-    for data in calibrated_data:
-        imu.update(data)
-        for imu_data in imu.read_data():
-            visualiser.push_data(imu_data)
-    
     visualiser.start()
 
-def get_reader_data(sensor_data):
-    for data in sensor_data:
-        time = data[0]
-        accel = data[1:4]
-        gyro = data[4:7]
-        
-        accel_vec = Vector3D(*accel)
-        gyro_vec = Vector3D(*gyro)
+# raw rows from a telemetry stream are processed like a recording
+def record_source(url, duration):
+    subscriber = TelemetrySubscriber(url)
+    subscriber.connect()
+
+    blocks = []
+    end_time = time.monotonic() + duration
+    try:
+        for rows in subscriber.get_blocks(kind_raw):
+            blocks.append(rows)
+            if time.monotonic() > end_time:
+                break
+    except KeyboardInterrupt as ex:
+        print(ex)
+    finally:
+        subscriber.close()
+
+    if len(blocks) == 0:
+        return np.empty((0, 7))
+    return np.concatenate(blocks)
+
+# panning or zooming any plot recomputes the visible window
+def view_replay(args):
+    imu = IMU(fusion=None if args.fusion is None else make_fusion(args.fusion))
+    replay = Replay(args.input, checkpoint_interval=args.checkpoint_interval, imu=imu)
+    from src.QtVisualiser import QtVisualiser
+    visualiser = QtVisualiser([], decimate=False)
 
-        yield (time, accel_vec, gyro_vec)
+    plots = [subplot.plot for subplot in visualiser.subplots]
+    for plot in plots:
+        plot.setDownsampling(auto=True, mode='peak')
+        plot.enableAutoRange(x=False)
+        if plot is not plots[0]:
+            plot.setXLink(plots[0])
+
+    # x axis is ms since the first processed sample
+    last_range = None
+    def on_range_changed(_, x_range):
+        nonlocal last_range
+        start, end = x_range
+        end = min(end, start + args.max_window*1000)
+        x_range = (int(start), int(end))
+        if x_range == last_range:
+            return
+        last_range = x_range
+
+        start_time = replay.start_time + max(start, 0)
+        end_time = replay.start_time + max(end, 0)
+        visualiser.set_data(replay.get_range(start_time, end_time))
+
+    plots[0].sigXRangeChanged.connect(on_range_changed)
+    plots[0].setXRange(0, args.window*1000, padding=0)
+    on_range_changed(None, (0, args.window*1000))
+
+    visualiser.start()
 
 if __name__ == '__main__':
     main()
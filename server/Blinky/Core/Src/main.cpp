@@ -61,8 +61,17 @@ void SystemClock_Config(void);
 
 /* Private user code ---------------------------------------------------------*/
 /* USER CODE BEGIN 0 */
+// version 2 framing, big endian
+// header (2) version (1) flags (1) sequence (4) time (4) accel (12) gyro (12) crc (4)
+#define PACKET_VERSION 2
+#define PACKET_SIZE 40
+#define PACKET_CRC_WORDS ((PACKET_SIZE-4)/4)
+
 struct Packet {
   uint16_t id;
+  uint8_t version;
+  uint8_t flags;
+  uint32_t sequence;
   uint32_t time;
   MPU6050::SensorData data;
 };
@@ -74,10 +83,24 @@ void WriteBytes(uint8_t *dest, uint8_t *src, int size) {
 	}
 }
 
+// the crc unit takes 32bit words msb first, so feed it the big endian bytes
+// as words in stream order. this is CRC-32/MPEG-2 over the packet bytes
+uint32_t CalculatePacketCRC(uint8_t *buffer) {
+	static uint32_t words[PACKET_CRC_WORDS] = {0};
+	for (int i = 0; i < PACKET_CRC_WORDS; i++) {
+		words[i] = ((uint32_t)buffer[4*i] << 24) | ((uint32_t)buffer[4*i+1] << 16) |
+		           ((uint32_t)buffer[4*i+2] << 8) | (uint32_t)buffer[4*i+3];
+	}
+	return HAL_CRC_Calculate(&hcrc, words, PACKET_CRC_WORDS);
+}
+
 void TransmitPacket(Packet &packet) {
-	static uint8_t buffer[30] = {0};
+	static uint8_t buffer[PACKET_SIZE] = {0};
 	int i = 0;
 	WriteBytes(&buffer[i], (uint8_t*)&packet.id, 2); 	i += 2;
+	buffer[i] = packet.version;							i += 1;
+	buffer[i] = packet.flags;							i += 1;
+	WriteBytes(&buffer[i], (uint8_t*)&packet.sequence, 4);	i += 4;
 	WriteBytes(&buffer[i], (uint8_t*)&packet.time, 4);	i += 4;
 
 	WriteBytes(&buffer[i], (uint8_t*)&packet.data.accel.x, 4);	i += 4;
@@ -86,9 +109,14 @@ void TransmitPacket(Packet &packet) {
 
 	WriteBytes(&buffer[i], (uint8_t*)&packet.data.gyro.x, 4);	i += 4;
 	WriteBytes(&buffer[i], (uint8_t*)&packet.data.gyro.y, 4);	i += 4;
-	WriteBytes(&buffer[i], (uint8_t*)&packet.data.gyro.z, 4);
+	WriteBytes(&buffer[i], (uint8_t*)&packet.data.gyro.z, 4);	i += 4;
+
+	uint32_t crc = CalculatePacketCRC(buffer);
+	WriteBytes(&buffer[i], (uint8_t*)&crc, 4);
 
 	CDC_Transmit_FS(buffer, sizeof(buffer));
+	// the client counts gaps in the sequence as lost packets
+	packet.sequence++;
 }
 
 /* USER CODE END 0 */
@@ -144,6 +172,9 @@ int main(void)
   Packet packet = {0};
 
   packet.id = 0xba41;
+  packet.version = PACKET_VERSION;
+  packet.flags = 0u;
+  packet.sequence = 0u;
   packet.time = 0u;
 
   HAL_Delay(1000);